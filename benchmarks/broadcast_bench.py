@@ -0,0 +1,129 @@
+"""Tarqatish (broadcast) benchmarki: soxta foydalanuvchilar va lokal stub.
+
+Vaqtinchalik SQLite state'ga ``--users`` ta foydalanuvchi yoziladi (bir qismi
+botni bloklagan), stub har ``--rate-limit-every`` -chi yuborishga 429 qaytaradi.
+Tarqatish ``--stop-at`` ulushida to'xtatiladi (ishchi qayta ishga tushgandek),
+keyin yangi ``Broadcaster`` saqlangan joydan davom ettiradi. Oxirida:
+
+* har bir (bloklamagan) foydalanuvchi xabar oldimi, nechtasi ikki marta oldi;
+* o'rtacha tezlik va istalgan 1 soniyalik oynadagi eng ko'p xabar
+  (``--rate`` dan oshmasligi kerak, boshidagi ``burst`` bundan mustasno);
+* tugash vaqti va ``--rate`` bo'yicha nazariy vaqt.
+
+Ishga tushirish:  python benchmarks/broadcast_bench.py --users 20000 --rate 200
+Haqiqiy cheklov bilan (uzoqroq):  python benchmarks/broadcast_bench.py --users 3000 --rate 25
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Bot  # noqa: E402
+
+from broadcast import Broadcaster, BroadcastStore, summary  # noqa: E402
+from http_client import BotHTTPClient  # noqa: E402
+from outbox import TokenBucket  # noqa: E402
+from state import SQLiteBackend  # noqa: E402
+from stub_api import start_stub  # noqa: E402
+
+FIRST_USER_ID = 100_000
+
+
+def max_window(times: list, window: float = 1.0) -> int:
+    """Istalgan ``window`` soniyalik oynaga tushgan eng ko'p chaqiruv."""
+    best = start = 0
+    for end in range(len(times)):
+        while times[end] - times[start] >= window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+async def run_until(broadcaster: Broadcaster, done: asyncio.Event, stop_after: int | None) -> None:
+    broadcaster.start()
+    while not done.is_set():
+        if stop_after is not None and broadcaster.sent + broadcaster.blocked >= stop_after:
+            break
+        await asyncio.sleep(0.05)
+    await broadcaster.stop()
+
+
+async def bench(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="broadcast_bench_")
+    backend = SQLiteBackend(os.path.join(workdir, "state.db"))
+    rng = random.Random(args.seed)
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+    backend.set_users({user_id: {"phone": f"+998{user_id}", "name": "Test"} for user_id in user_ids})
+    blocked = set(rng.sample(user_ids, int(args.users * args.blocked)))
+
+    stub, runner, stub_url = await start_stub(rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    stub.blocked_chats.update(blocked)
+    bot = Bot("123:abc", base_url=f"{stub_url}/bot", request=BotHTTPClient(pool_size=args.concurrency))
+    await bot.initialize()
+    stub.reset()
+
+    store = BroadcastStore(os.path.join(workdir, "broadcast.db"))
+    broadcast_id = store.create("📣 Yangi menyu!", backend.user_count())
+    done = asyncio.Event()
+    bucket = TokenBucket(args.rate)
+
+    def make():
+        return Broadcaster(store, backend, bot, bucket, concurrency=args.concurrency, page_size=args.page_size,
+                           poll_interval=0.1, on_finish=lambda job: done.set())
+
+    started = time.monotonic()
+    await run_until(make(), done, int(args.users * args.stop_at) if args.stop_at else None)
+    job = store.get(broadcast_id)
+    print(f"To'xtatildi: cursor={job['cursor']}, yuborildi={job['sent']}, bloklagan={job['blocked']} - davom ettiriladi")
+    await run_until(make(), done, None)
+    elapsed = time.monotonic() - started
+
+    await bot.shutdown()
+    await runner.cleanup()
+
+    job = store.get(broadcast_id)
+    received = Counter(chat_id for _, method, chat_id in stub.calls if method == "sendMessage")
+    expected = set(user_ids) - blocked
+    missing = expected - received.keys()
+    duplicates = sum(count - 1 for count in received.values() if count > 1)
+    times = sorted(t for t, method, _ in stub.calls if method == "sendMessage")
+    info = summary(job)
+
+    print(f"\nFoydalanuvchilar: {args.users}, bloklagan: {len(blocked)}, 429 har {args.rate_limit_every} -chida")
+    print(f"Holat: {job['status']}, yuborildi: {job['sent']}, bloklagan: {job['blocked']}, "
+          f"xato: {job['failed']}, qayta urinish: {job['retried']}")
+    print(f"Yetib bormadi: {len(missing)}, takroriy: {duplicates} "
+          f"(chegara: {args.concurrency * 2 + args.concurrency} - navbat + jo'natuvchilar)")
+    print(f"Vaqt: {elapsed:.1f} s (nazariy {len(expected) / args.rate:.1f} s), tezlik: {info['rate']} xabar/s")
+    steady = [t for t in times if t >= times[0] + 1.0]
+    print(f"Eng ko'p xabar 1 soniyada: {max_window(times)} (cheklov {args.rate:g} + boshida burst {bucket.burst:g}), "
+          f"birinchi soniyadan keyin: {max_window(steady)}")
+    assert job["status"] == "done", job
+    assert not missing, sorted(missing)[:10]
+    assert job["sent"] == len(expected) and job["blocked"] == len(blocked), job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tarqatish benchmarki")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=200, help="xabar/s (botda OUTBOX_GLOBAL_RATE)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--blocked", type=float, default=0.05, help="botni bloklagan foydalanuvchilar ulushi")
+    parser.add_argument("--rate-limit-every", type=int, default=2000, help="har N-chi yuborishga 429 (0 - hech qachon)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--stop-at", type=float, default=0.4, help="shu ulushda to'xtatib qayta ishga tushirish (0 - yo'q)")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Namuna oluvchi (sampling) profiler va flamegraph chizish (replay.py uchun).
+
+Alohida oqim har ``interval`` soniyada event loop oqimining stekini oladi
+(``sys._current_frames``) - py-spy kabi, lekin jarayon ichida. Stek qaysi
+handlerga tegishli ekani ``metrics.instrument`` o'ramidan topiladi: o'ram
+chaqirgan kadr - handlerning o'zi. Loop bo'sh turgan (``select`` da
+kutayotgan) namunalar sanaladi, lekin grafikka kirmaydi.
+
+Natija har bir handler uchun (va hammasi uchun ``all``):
+
+* ``<handler>.folded`` - "kadr;kadr;kadr soni" qatorlari (flamegraph.pl,
+  speedscope, inferno o'qiydi; ``py-spy record --format raw`` bilan bir xil);
+* ``<handler>.svg`` - oddiy flamegraph (kadr ustiga olib borilsa nomi va ulushi).
+"""
+
+import html
+import os
+import sys
+import threading
+import zlib
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import metrics  # noqa: E402
+
+OTHER = "(handlerdan_tashqari)"
+_WRAPPER_FILE = metrics.__file__
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """Bitta oqim steklarini davriy yig'adi: {handler: Counter(folded stek)}."""
+
+    def __init__(self, interval: float = 0.002, thread_id: int | None = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.stacks = {}
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        self.samples += 1
+        code = frame.f_code
+        if code.co_name == "select" and code.co_filename.endswith("selectors.py"):
+            self.idle += 1
+            return
+        labels = []
+        handler = OTHER
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name == "wrapper" and code.co_filename == _WRAPPER_FILE and labels:
+                # Oxirgi qo'shilgan kadr (o'ram chaqirgan) - handler
+                handler = labels[-1].split(" ", 1)[0]
+            labels.append(frame_label(code))
+            frame = frame.f_back
+        folded = ";".join(reversed(labels))
+        self.stacks.setdefault(handler, Counter())[folded] += 1
+
+    def by_handler(self) -> list:
+        """[(handler, namunalar)], ko'pidan kamiga."""
+        return sorted(((name, sum(counts.values())) for name, counts in self.stacks.items()), key=lambda item: -item[1])
+
+    def write(self, directory: str) -> list:
+        """Har handler uchun .folded va .svg yozadi. Yozilgan fayllar ro'yxati."""
+        os.makedirs(directory, exist_ok=True)
+        total = Counter()
+        for counts in self.stacks.values():
+            total.update(counts)
+        written = []
+        for name, counts in [("all", total)] + sorted(self.stacks.items()):
+            base = os.path.join(directory, name)
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in counts.most_common())
+            with open(base + ".svg", "w", encoding="utf-8") as f:
+                f.write(render_svg(counts, f"{name}: {sum(counts.values())} ta namuna"))
+            written += [base + ".folded", base + ".svg"]
+        return written
+
+
+def _tree(counts: Counter) -> dict:
+    root = {"name": "all", "value": 0, "children": {}}
+    for stack, count in counts.items():
+        root["value"] += count
+        node = root
+        for label in stack.split(";"):
+            node = node["children"].setdefault(label, {"name": label, "value": 0, "children": {}})
+            node["value"] += count
+    return root
+
+
+def _color(name: str) -> str:
+    h = zlib.crc32(name.encode())
+    return f"rgb({205 + h % 50},{80 + (h >> 8) % 120},{(h >> 16) % 60})"
+
+
+def render_svg(counts: Counter, title: str, width: int = 1200, row: int = 16) -> str:
+    """Folded steklardan flamegraph (ildiz pastda)."""
+    root = _tree(counts)
+    total = root["value"] or 1
+    rects = []
+    depth_max = 0
+
+    def walk(node, x, depth):
+        nonlocal depth_max
+        depth_max = max(depth_max, depth)
+        w = node["value"] / total * width
+        if w < 0.3:
+            return
+        rects.append((x, depth, w, node["name"], node["value"]))
+        for child in sorted(node["children"].values(), key=lambda child: child["name"]):
+            walk(child, x, depth + 1)
+            x += child["value"] / total * width
+
+    walk(root, 0.0, 0)
+    height = (depth_max + 1) * row + 30
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="14">{html.escape(title)}</text>',
+    ]
+    for x, depth, w, name, value in rects:
+        y = height - (depth + 1) * row
+        label = html.escape(name)
+        tip = f"{label} ({value} ta, {value / total:.1%})"
+        parts.append(f'<g><title>{tip}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="{_color(name)}"/>')
+        chars = int(w / 7)
+        if chars >= 3:
+            text = name if len(name) <= chars else name[:chars - 2] + ".."
+            parts.append(f'<text x="{x + 2:.1f}" y="{y + row - 4}">{html.escape(text)}</text>')
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "\n".join(parts)
@@ -0,0 +1,96 @@
+"""Bot API ga chiquvchi HTTP qatlami benchmarki.
+
+Tushlik to'lqinini taqlid qiladi: bir vaqtning o'zida ``--burst`` ta
+``edit_message_text`` / ``send_message`` / ``answer_callback_query`` chaqiruvi,
+``--rounds`` marta. Har bir sozlama uchun chiqaradi:
+
+* to'lqin qancha vaqtda tugadi (devor vaqti) va bitta so'rovga ketgan CPU;
+* stub qabul qilgan TCP ulanishlar soni (``/__stats`` -> ``connections``);
+* ``BotHTTPClient`` uchun qayta ishlatilgan ulanishlar ulushi.
+
+Stub alohida jarayonda, haqiqiy tarmoq kechikishi bilan ishga tushiriladi
+(aks holda stubning CPU'si ham o'lchovga qo'shilib ketadi):
+
+    python benchmarks/stub_api.py --port 8081 --latency-ms 50 &
+    python benchmarks/http_bench.py --stub-url http://127.0.0.1:8081 --burst 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram import Bot  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+from http_client import BotHTTPClient  # noqa: E402
+
+
+def stub_call(stub_url: str, path: str, method: str = "GET") -> dict:
+    with urllib.request.urlopen(urllib.request.Request(stub_url + path, method=method)) as response:
+        return json.load(response)
+
+
+def burst_calls(bot: Bot, size: int, round_no: int) -> list:
+    calls = []
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            calls.append(bot.send_message(chat_id=1000 + i, text=f"Savatcha {round_no}"))
+        elif kind == 1:
+            calls.append(bot.answer_callback_query(f"{round_no}-{i}"))
+        else:
+            calls.append(bot.edit_message_text(chat_id=1000 + i, message_id=1, text=f"Miqdor {round_no}"))
+    return calls
+
+
+async def run(name: str, request, stub_url: str, token: str, burst: int, rounds: int, pause: float) -> None:
+    stub_call(stub_url, "/__reset", "POST")
+    bot = Bot(token, base_url=f"{stub_url}/bot", request=request)
+    await bot.initialize()
+    # Birinchi to'lqin ulanishlarni ochadi, o'lchovga kirmaydi
+    await asyncio.gather(*burst_calls(bot, burst, 0))
+    errors = 0
+    wall = cpu = 0.0
+    for round_no in range(1, rounds + 1):
+        await asyncio.sleep(pause)
+        start, start_cpu = time.perf_counter(), time.process_time()
+        results = await asyncio.gather(*burst_calls(bot, burst, round_no), return_exceptions=True)
+        wall += time.perf_counter() - start
+        cpu += time.process_time() - start_cpu
+        errors += sum(isinstance(result, Exception) for result in results)
+    await bot.shutdown()
+    connections = stub_call(stub_url, "/__stats")["connections"]
+    reuse = request.stats()["reuse_ratio"] if isinstance(request, BotHTTPClient) else None
+    print(
+        f"{name:<28} {wall / rounds * 1000:9.0f} {cpu / (rounds * burst) * 1000:9.2f} "
+        f"{connections:7d} {'-' if reuse is None else reuse:>7} {errors:6d}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chiquvchi HTTP qatlami benchmarki")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8081")
+    parser.add_argument("--token", default="123:abc")
+    parser.add_argument("--burst", type=int, default=200, help="bir to'lqindagi parallel chaqiruvlar")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--pause", type=float, default=1.0, help="to'lqinlar orasidagi tanaffus, soniya")
+    parser.add_argument("--pool-sizes", default="8,16,32", help="BotHTTPClient uchun sinaladigan hovuz hajmlari")
+    parser.add_argument("--http2", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'sozlama':<28} {'to`lqin ms':>9} {'CPU ms/so`rov':>9} {'ulanish':>7} {'reuse':>7} {'xato':>6}")
+    configs = [("HTTPXRequest(256) (eski)", lambda: HTTPXRequest(connection_pool_size=256))]
+    for size in (int(value) for value in args.pool_sizes.split(",")):
+        configs.append((f"BotHTTPClient(pool={size})", lambda size=size: BotHTTPClient(pool_size=size, http2=args.http2)))
+    for name, factory in configs:
+        asyncio.run(run(name, factory(), args.stub_url, args.token, args.burst, args.rounds, args.pause))
+
+
+if __name__ == "__main__":
+    main()
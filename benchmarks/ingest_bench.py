@@ -0,0 +1,199 @@
+"""Webhook qabul qilish yo'li uchun mikrobenchmark.
+
+Bitta yangilanishga ketadigan CPU vaqtini solishtiradi:
+
+* eski yo'l - ``json.loads`` + ``Update.de_json`` + 13 ta handlerni ketma-ket
+  regex bilan tekshirish;
+* yangi yo'l - ``orjson`` + ``ignore`` tugmalarini Update yaratmasdan
+  javoblash + ``CallbackRouter`` lug'ati.
+
+Yangilanishlar aralashmasi yuklama testidagi mijoz sessiyalaridan olinadi
+(ma'lumot tugmalariga tasodifiy bosishlar qo'shiladi). Ikkala yo'l bir xil
+handlerga yo'naltirishi ham tekshiriladi.
+
+Oddiy xabarlar (matn, kontakt, lokatsiya) uchun vaqtning ~95% i
+``Update.de_json`` ga ketadi va u ikkala yo'lda bir xil, shuning uchun
+``message`` qatorida farq o'lchash shovqini ichida (~1.0x) bo'ladi. Yutuq
+``ignore`` tugmalarida (Update yaratilmaydi) va callback yo'naltirishda.
+
+Ishga tushirish:  python benchmarks/ingest_bench.py --users 300
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("STATE_BACKEND", "memory")
+os.environ.setdefault("BOT_TOKEN", "123:abc")
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import bot  # noqa: E402
+import ingest  # noqa: E402
+from loadtest import callback_update, user_session  # noqa: E402
+
+
+class OfflineRequest(BaseRequest):
+    """Faqat getMe ga javob beradi - CommandHandler bot username'ini talab qiladi."""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        me = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        return 200, json.dumps({"ok": True, "result": me}).encode()
+
+
+def legacy_handlers():
+    """Optimallashtirishdan oldingi handlerlar ro'yxati (guruh 0)."""
+    return [
+        CommandHandler("start", bot.start_command),
+        MessageHandler(filters.CONTACT, bot.contact_handler),
+        MessageHandler(filters.LOCATION, bot.location_handler),
+        MessageHandler(filters.TEXT & ~filters.COMMAND, bot.text_handler),
+        CallbackQueryHandler(bot.show_categories, pattern="^back:categories"),
+        CallbackQueryHandler(bot.category_handler, pattern="^cat:"),
+        CallbackQueryHandler(bot.quantity_handler, pattern="^qty_(inc|dec):"),
+        CallbackQueryHandler(bot.cart_view_handler, pattern="^cart:view"),
+        CallbackQueryHandler(bot.cart_clear_handler, pattern="^cart:clear"),
+        CallbackQueryHandler(bot.checkout_start_handler, pattern="^checkout:start"),
+        CallbackQueryHandler(bot.delivery_handler, pattern="^delivery:"),
+        CallbackQueryHandler(bot.confirm_handler, pattern="^confirm:"),
+        CallbackQueryHandler(bot.ignore_handler, pattern="^ignore"),
+    ]
+
+
+def legacy_route(body, ptb_bot, handlers):
+    update = Update.de_json(json.loads(body), ptb_bot)
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return handler.callback.__name__
+    return None
+
+
+def fast_route(body, ptb_bot, handlers):
+    data = ingest.loads(body)
+    if ingest.trivial_callback_id(data) is not None:
+        return "ignore_handler"
+    update = Update.de_json(data, ptb_bot)
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            # CallbackRouter topilgan callbackni qaytaradi
+            return check.__name__ if callable(check) else handler.callback.__name__
+    return None
+
+
+def scan(update, handlers):
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return check
+
+
+def build_workload(users: int, ignore_ratio: float, seed: int) -> list:
+    rng = random.Random(seed)
+    updates = []
+    for user_id in range(1, users + 1):
+        session, _ = user_session(100_000 + user_id, rng)
+        for update in session:
+            updates.append(update)
+            if "callback_query" in update and rng.random() < ignore_ratio:
+                updates.append(callback_update(100_000 + user_id, "ignore", update["callback_query"]["message"]["message_id"]))
+    return [json.dumps(update, ensure_ascii=False).encode() for update in updates]
+
+
+def kind(body: bytes) -> str:
+    data = json.loads(body)
+    if "callback_query" in data:
+        return "ignore" if data["callback_query"]["data"] == "ignore" else "callback"
+    return "message"
+
+
+def measure(route, bodies, ptb_bot, handlers, rounds: int) -> float:
+    for body in bodies:
+        route(body, ptb_bot, handlers)
+    # timeit kabi: GC to'plashlari qaysi o'lchashga tushishi tasodifiy, natijani buzmasin
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.process_time()
+        for _ in range(rounds):
+            for body in bodies:
+                route(body, ptb_bot, handlers)
+        return (time.process_time() - start) / (rounds * len(bodies)) * 1e6
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook qabul qilish yo'li benchmarki")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--ignore-ratio", type=float, default=0.1, help="callbacklardan keyin ma'lumot tugmasiga bosish ehtimoli")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5, help="eski/yangi o'lchashlar necha marta takrorlanadi")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    application = Application.builder().token(os.environ["BOT_TOKEN"]).request(OfflineRequest()).build()
+    bot.init_handlers(application)
+    ptb_bot = application.bot
+    asyncio.run(ptb_bot.initialize())
+    old_handlers = legacy_handlers()
+    new_handlers = application.handlers[0]
+
+    bodies = build_workload(args.users, args.ignore_ratio, args.seed)
+    kinds = Counter(kind(body) for body in bodies)
+    print(f"Yangilanishlar: {len(bodies)} ({dict(kinds)}), orjson: {ingest.loads is not json.loads}")
+
+    # Ikkala yo'l ham bir xil handlerni tanlashi shart
+    for body in bodies:
+        assert legacy_route(body, ptb_bot, old_handlers) == fast_route(body, ptb_bot, new_handlers), body
+    print("Yo'naltirish bir xil ✅\n")
+
+    # Bitta o'lchash shovqinli (GC, boshqa jarayonlar): eski va yangi yo'l navbatma-navbat
+    # --repeats marta o'lchanadi, mediana va tezlashishning eng kichik..eng katta qiymati chiqariladi
+    subsets = {name: [body for body in bodies if kind(body) == name] for name in ("callback", "ignore", "message")}
+    subsets["aralash"] = bodies
+    print(f"{'turi':<10} {'eski us':>9} {'yangi us':>9} {'tezlashish':>10} {'oraliq':>12}")
+    for name, subset in subsets.items():
+        if not subset:
+            continue
+        olds, news = [], []
+        for _ in range(args.repeats):
+            olds.append(measure(legacy_route, subset, ptb_bot, old_handlers, args.rounds))
+            news.append(measure(fast_route, subset, ptb_bot, new_handlers, args.rounds))
+        ratios = sorted(old / new for old, new in zip(olds, news))
+        old, new = statistics.median(olds), statistics.median(news)
+        print(f"{name:<10} {old:9.2f} {new:9.2f} {old / new:9.2f}x {ratios[0]:5.2f}..{ratios[-1]:.2f}x")
+
+    # Faqat handler tanlash (Update tayyor): regexlar ro'yxati va lug'at
+    updates = [Update.de_json(json.loads(body), ptb_bot) for body in bodies if kind(body) == "callback"]
+    old = measure(lambda update, _, handlers: scan(update, handlers), updates, None, old_handlers, args.rounds * 4)
+    new = measure(lambda update, _, handlers: scan(update, handlers), updates, None, new_handlers, args.rounds * 4)
+    print(f"\nFaqat callback yo'naltirish: {old:.2f} us -> {new:.2f} us ({old / new:.1f}x)")
+    print("Qolgan vaqtning asosiy qismi Update.de_json (PTB Message obyektini yaratish).")
+
+
+if __name__ == "__main__":
+    main()
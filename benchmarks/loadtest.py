@@ -0,0 +1,369 @@
+"""Quart webhookiga sintetik Telegram yangilanishlarini yuboruvchi yuklama testi.
+
+Har bir sintetik foydalanuvchi haqiqiy mijozdek harakat qiladi: /start,
+kontakt yuborish, kategoriyalarni ko'rish, ➕/➖ bosishlar seriyasi, savatcha,
+rasmiylashtirish va lokatsiya. Barcha tashqi Bot API chaqiruvlari lokal stub
+serverga (benchmarks/stub_api.py) boradi va u yerda sanaladi.
+
+Natija: webhook kechikishi (p50/p95/p99), o'tkazuvchanlik, har bir buyurtma
+uchun Bot API chaqiruvlari soni va bitta faol foydalanuvchiga to'g'ri
+keladigan xotira.
+
+Ilova ichida (Quart test client orqali):
+    python benchmarks/loadtest.py --users 200 --concurrency 50 --memory
+
+Tashqi server bilan (ishchilar sonini solishtirish uchun):
+    python benchmarks/stub_api.py --port 8081 &
+    BOT_TOKEN=123:abc ADMIN_ID=1 WEB_HOST=http://127.0.0.1:8000 BOT_API_BASE_URL=http://127.0.0.1:8081 \\
+        gunicorn -b 127.0.0.1:8000 -w 4 -k uvicorn.workers.UvicornWorker 'bot:main()' &
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --stub-url http://127.0.0.1:8081 --token 123:abc
+
+Bir nechta filial (serverga ham BRANCHES_FILE berilishi kerak):
+    python benchmarks/loadtest.py --users 300 --branches branches.example.json --admin-interval 1
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import aiohttp
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_api import start_stub  # noqa: E402
+
+ADMIN_CHAT_ID = 1
+DEFAULT_TOKEN = "123456:LOADTEST"
+CATEGORIES = ["🍔 Fast Food", "🥤 Ichimliklar", "🍰 Desertlar"]
+ITEMS = {
+    "🍔 Fast Food": ["item_h", "item_l", "item_b"],
+    "🥤 Ichimliklar": ["item_p", "item_c", "item_f"],
+    "🍰 Desertlar": ["item_ch", "item_t", "item_d"],
+}
+
+_update_ids = itertools.count(1)
+
+
+# -----------------
+# SINTETIK YANGILANISHLAR
+# -----------------
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"Mijoz {user_id}"}
+
+
+def message_update(user_id, text=None, **extra):
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+    }
+    if text is not None:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    message.update(extra)
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def callback_update(user_id, data, message_id):
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "...",
+            },
+        },
+    }
+
+
+def user_session(user_id: int, rng: random.Random, burst: tuple = (3, 10), pickup_branches: tuple = ()):
+    """Bitta mijozning to'liq buyurtma oqimi. (yangilanishlar, yetkazib berishmi) qaytaradi.
+
+    ``pickup_branches`` - bir nechta filial bo'lsa borib olishda tanlanadigan filial raqamlari.
+    """
+    menu_message = 10_000_000 + user_id
+    updates = [
+        message_update(user_id, "/start"),
+        message_update(user_id, contact={"phone_number": f"99890{user_id:07d}", "first_name": "Mijoz", "user_id": user_id}),
+        message_update(user_id, "🛍 Buyurtma berish"),
+    ]
+    for category in rng.sample(CATEGORIES, rng.randint(1, len(CATEGORIES))):
+        updates.append(callback_update(user_id, f"cat:{category}", menu_message))
+        items = ITEMS[category]
+        for _ in range(rng.randint(*burst)):
+            action = "qty_inc" if rng.random() < 0.8 else "qty_dec"
+            updates.append(callback_update(user_id, f"{action}:{rng.choice(items)}", menu_message))
+        updates.append(callback_update(user_id, "back:categories", menu_message))
+    # Savatcha bo'sh qolmasligi uchun kamida bitta mahsulot
+    updates.append(callback_update(user_id, f"cat:{CATEGORIES[0]}", menu_message))
+    updates.append(callback_update(user_id, "qty_inc:item_b", menu_message))
+    updates.append(callback_update(user_id, "cart:view", menu_message))
+    updates.append(callback_update(user_id, "checkout:start", menu_message))
+    delivery = rng.random() < 0.7
+    if delivery:
+        updates.append(callback_update(user_id, "delivery:yes", menu_message))
+        lat, lon = 41.31 + rng.uniform(-0.05, 0.05), 69.28 + rng.uniform(-0.05, 0.05)
+        updates.append(message_update(user_id, location={"latitude": lat, "longitude": lon}))
+        updates.append(callback_update(user_id, "confirm:yes", menu_message + 1))
+    else:
+        updates.append(callback_update(user_id, "delivery:no", menu_message))
+        if len(pickup_branches) > 1:
+            updates.append(callback_update(user_id, f"pickup:{rng.choice(pickup_branches)}", menu_message))
+    return updates, delivery
+
+
+def load_branches(path: str | None) -> tuple:
+    """branches.json dan (barcha filial chatlari, borib olish filiallari raqamlari)."""
+    if not path:
+        return (ADMIN_CHAT_ID,), ()
+    with open(path, encoding="utf-8") as f:
+        branches = json.load(f)["branches"]
+    chats = tuple(chat_id for branch in branches for chat_id in branch["chats"])
+    pickup = tuple(index for index, branch in enumerate(branches) if branch.get("pickup", True))
+    return chats, pickup
+
+
+# -----------------
+# NISHONLAR (ilova ichida yoki tashqi server)
+# -----------------
+
+class InProcessTarget:
+    """bot:app ni Quart test client orqali chaqiradi."""
+
+    def __init__(self, stub_url: str, token: str, workdir: str):
+        os.chdir(workdir)
+        os.environ.update({
+            "BOT_TOKEN": token,
+            "ADMIN_ID": str(ADMIN_CHAT_ID),
+            "WEB_HOST": "https://loadtest.invalid",
+            "BOT_API_BASE_URL": stub_url,
+            "STATE_DB_PATH": os.path.join(workdir, "state.db"),
+            "OUTBOX_DB_PATH": os.path.join(workdir, "outbox.db"),
+        })
+        import bot
+        self.bot = bot
+        self.app = bot.main()
+        self.path = bot.WEBHOOK_PATH
+        self._ctx = None
+        self._client = None
+
+    async def __aenter__(self):
+        self._ctx = self.app.test_app()
+        test_app = await self._ctx.__aenter__()
+        self._client = test_app.test_client()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._ctx.__aexit__(*exc)
+
+    async def post(self, payload) -> int:
+        response = await self._client.post(self.path, json=payload)
+        return response.status_code
+
+
+class HttpTarget:
+    """Tashqi (uvicorn/gunicorn) serverga HTTP orqali yuboradi."""
+
+    def __init__(self, url: str, token: str):
+        self.url = f"{url.rstrip('/')}/{token}"
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def post(self, payload) -> int:
+        async with self._session.post(self.url, json=payload) as response:
+            await response.read()
+            return response.status
+
+
+# -----------------
+# YUKLAMA
+# -----------------
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+async def run_load(target, sessions, concurrency: int, think_ms: float, rng: random.Random):
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_session(updates):
+        async with semaphore:
+            for payload in updates:
+                start = time.perf_counter()
+                status = await target.post(payload)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+                if think_ms:
+                    await asyncio.sleep(rng.uniform(0, think_ms) / 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(updates) for updates, _ in sessions))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def wait_for_admin_messages(count_fn, expected: int, timeout: float):
+    """Outbox orqali adminga ketadigan xabarlar yetib kelishini kutadi."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await count_fn() >= expected:
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    admin_chats, pickup_branches = load_branches(args.branches)
+    sessions = [user_session(100_000 + i, rng, pickup_branches=pickup_branches) for i in range(args.users)]
+    total_updates = sum(len(updates) for updates, _ in sessions)
+    orders = len(sessions)
+    deliveries = sum(1 for _, delivery in sessions if delivery)
+    expected_admin = orders + (0 if args.merge_location else deliveries)
+
+    stub = runner = None
+    if args.stub_url:
+        stub_url = args.stub_url
+    else:
+        stub, runner, stub_url = await start_stub(latency_ms=args.api_latency_ms)
+
+    if args.url:
+        target = HttpTarget(args.url, args.token)
+    else:
+        if args.merge_location:
+            os.environ["OUTBOX_MERGE_LOCATION"] = "1"
+        # Haqiqiy Telegram bitta chatga ~1 xabar/s beradi. Testda barcha buyurtmalar bitta admin chatga
+        # tushgani uchun oraliq kamaytiriladi, aks holda natija faqat shu cheklovni o'lchaydi
+        os.environ.setdefault("OUTBOX_CHAT_INTERVAL", str(args.admin_interval))
+        if args.branches:
+            os.environ["BRANCHES_FILE"] = os.path.abspath(args.branches)
+        target = InProcessTarget(stub_url, args.token, tempfile.mkdtemp(prefix="loadtest-"))
+
+    async def stub_stats():
+        if stub is not None:
+            by_chat = stub.by_chat(admin_chats)
+            return {"calls": len(stub.calls), "by_method": stub.by_method(), "chat_calls": sum(by_chat.values()), "by_chat": by_chat}
+        async with aiohttp.ClientSession() as session:
+            params = {"chat_id": ",".join(str(chat_id) for chat_id in admin_chats)}
+            async with session.get(f"{stub_url}/__stats", params=params) as response:
+                return await response.json()
+
+    async def admin_count():
+        return (await stub_stats())["chat_calls"]
+
+    async with target:
+        if stub is not None:
+            stub.reset()
+        if args.memory:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        latencies, statuses, elapsed = await run_load(target, sessions, args.concurrency, args.think_ms, rng)
+        memory_per_user = None
+        if args.memory:
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            grown = sum(s.size_diff for s in after.compare_to(before, "filename"))
+            memory_per_user = grown / args.users
+        drained = await wait_for_admin_messages(admin_count, expected_admin, args.drain_timeout)
+        outbound = await stub_stats()
+
+    if runner is not None:
+        await runner.cleanup()
+
+    report = {
+        "users": args.users,
+        "updates": total_updates,
+        "orders": orders,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_updates_per_s": round(total_updates / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        },
+        "http_statuses": statuses,
+        "outbound_calls": outbound.get("calls"),
+        "outbound_by_method": outbound.get("by_method"),
+        "outbound_calls_per_order": round(outbound.get("calls", 0) / orders, 2),
+        "admin_messages_delivered": drained,
+        "admin_messages_by_chat": {str(chat_id): count for chat_id, count in outbound.get("by_chat", {}).items()},
+        "memory_per_user_bytes": round(memory_per_user) if memory_per_user is not None else None,
+    }
+    return report
+
+
+def print_report(report):
+    lat = report["latency_ms"]
+    print(f"Foydalanuvchilar: {report['users']}, yangilanishlar: {report['updates']}, buyurtmalar: {report['orders']}")
+    print(f"Vaqt: {report['elapsed_s']} s, o'tkazuvchanlik: {report['throughput_updates_per_s']} yangilanish/s")
+    print(f"Webhook kechikishi (ms): p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+    print(f"HTTP javoblar: {report['http_statuses']}")
+    print(f"Bot API chaqiruvlari: {report['outbound_calls']} ({report['outbound_calls_per_order']} / buyurtma)")
+    print(f"  metodlar bo'yicha: {report['outbound_by_method']}")
+    print(f"Admin xabarlari to'liq yetkazildi: {report['admin_messages_delivered']}")
+    if len(report["admin_messages_by_chat"]) > 1:
+        print(f"  filial chatlari bo'yicha: {report['admin_messages_by_chat']}")
+    if report["memory_per_user_bytes"] is not None:
+        print(f"Xotira / faol foydalanuvchi: {report['memory_per_user_bytes']} bayt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot webhooki uchun yuklama testi")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50, help="bir vaqtda faol foydalanuvchilar")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="bosishlar orasidagi tasodifiy pauza (ms)")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="stub Bot API javob kechikishi")
+    parser.add_argument("--url", help="tashqi server manzili (berilmasa ilova ichida test qilinadi)")
+    parser.add_argument("--stub-url", help="tashqi stub server manzili")
+    parser.add_argument("--token", default=DEFAULT_TOKEN)
+    parser.add_argument("--merge-location", action="store_true", help="OUTBOX_MERGE_LOCATION=1 rejimi")
+    parser.add_argument("--memory", action="store_true", help="tracemalloc bilan xotirani o'lchash (sekinlashtiradi)")
+    parser.add_argument("--branches", help="filiallar fayli (BRANCHES_FILE, masalan branches.example.json)")
+    parser.add_argument("--admin-interval", type=float, default=0.0, help="ilova ichida: OUTBOX_CHAT_INTERVAL qiymati")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="natijani JSON ko'rinishida chiqarish")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
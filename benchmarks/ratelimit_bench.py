@@ -0,0 +1,144 @@
+"""Tezlik cheklovi (ratelimit.py) uchun benchmark.
+
+``--workers`` ta jarayon (gunicorn ishchilaridek) bitta SQLite faylga
+murojaat qiladi. Har biri ``--updates`` ta xom yangilanishni tekshiradi:
+``--spam`` ulushi - bir nechta spamerning ``qty_inc`` bosishlari, qolgani -
+oddiy foydalanuvchilarning xabarlari va tugmalari. Natija:
+
+* har bir yangilanishga ketgan vaqt (o'tkazilgan va tashlangan alohida):
+  p50/p99/max, mikrosoniyada;
+* spamerlarga jami nechta yangilanish o'tgani - cheklov (burst + tezlik x
+  vaqt) bilan solishtiriladi: hisoblagichlar ishchilar orasida umumiy
+  bo'lmasa, bu son ishchilar soniga ko'payadi;
+* taqqoslash uchun ``Update.de_json`` narxi (tashlangan yangilanish shuni
+  tejaydi, handler va Bot API chaqiruvi bundan tashqari).
+
+``--pace`` bilan har ishchi yangilanishlarni shu tezlikda tekshiradi (haqiqiy
+yuklamadagidek); usiz ishchilar bir-birini faqat shu tekshiruv bilan band
+qiladi va SQLite yozish qulfi uchun raqobat eng og'ir holatda o'lchanadi.
+
+Ishga tushirish:  python benchmarks/ratelimit_bench.py --workers 4 --updates 20000
+                  python benchmarks/ratelimit_bench.py --workers 4 --updates 5000 --pace 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ratelimit import RateLimiter, classify, parse_limits  # noqa: E402
+
+SPAMMERS = (900_001, 900_002, 900_003)
+
+
+def make_update(rng: random.Random, update_id: int, spam: float) -> dict:
+    if rng.random() < spam:
+        user = {"id": rng.choice(SPAMMERS), "is_bot": False, "first_name": "Spam"}
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": user, "chat_instance": "1", "data": "qty_inc:item_h",
+            "message": {"message_id": 5, "date": 0, "chat": {"id": user["id"], "type": "private"}},
+        }}
+    user = {"id": rng.randrange(100_000, 200_000), "is_bot": False, "first_name": "Test"}
+    if rng.random() < 0.5:
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": 0, "from": user, "text": "🍔 Menyu",
+            "chat": {"id": user["id"], "type": "private"},
+        }}
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": user, "chat_instance": "1", "data": "cat:Burgerlar",
+        "message": {"message_id": 5, "date": 0, "chat": {"id": user["id"], "type": "private"}},
+    }}
+
+
+def worker(path: str, limits: str, updates: int, spam: float, pace: float, seed: int, start_at: float, results) -> None:
+    limiter = RateLimiter(path, parse_limits(limits))
+    rng = random.Random(seed)
+    batch = [make_update(rng, seed * updates + i, spam) for i in range(updates)]
+    while time.time() < start_at:
+        time.sleep(0.001)
+    allowed, dropped, spam_allowed = [], [], 0
+    for index, data in enumerate(batch):
+        if pace:
+            delay = start_at + index / pace - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        started = time.perf_counter()
+        kind, user_id = classify(data)
+        ok = limiter.allow(kind, user_id)
+        elapsed = time.perf_counter() - started
+        (allowed if ok else dropped).append(elapsed)
+        if ok and user_id in SPAMMERS:
+            spam_allowed += 1
+    results.put((allowed, dropped, spam_allowed, limiter.errors))
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return "-"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))] * 1e6  # noqa: E731
+    return f"p50={pick(0.5):.1f} p99={pick(0.99):.1f} max={values[-1] * 1e6:.1f} us (n={len(values)})"
+
+
+def de_json_cost(samples: int) -> float:
+    from telegram import Bot, Update
+
+    bot = Bot("123:abc")
+    rng = random.Random(0)
+    batch = [make_update(rng, i, 1.0) for i in range(samples)]
+    started = time.perf_counter()
+    for data in batch:
+        Update.de_json(data, bot)
+    return (time.perf_counter() - started) / samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tezlik cheklovi benchmarki")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--updates", type=int, default=20000, help="har ishchida")
+    parser.add_argument("--spam", type=float, default=0.5, help="spamer yangilanishlari ulushi")
+    parser.add_argument("--pace", type=float, default=0, help="har ishchida yangilanish/s (0 - cheklovsiz, eng og'ir holat)")
+    parser.add_argument("--limits", default="callback=5:20,command=1:5,message=2:10,other=2:10,global=100000:100000")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="ratelimit_bench_"), "ratelimit.db")
+    RateLimiter(path, parse_limits(args.limits))
+    results = multiprocessing.Queue()
+    start_at = time.time() + 0.5
+    processes = [
+        multiprocessing.Process(target=worker, args=(path, args.limits, args.updates, args.spam, args.pace, seed, start_at, results))
+        for seed in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.time() - start_at
+
+    allowed = [t for result in collected for t in result[0]]
+    dropped = [t for result in collected for t in result[1]]
+    spam_allowed = sum(result[2] for result in collected)
+    errors = sum(result[3] for result in collected)
+    rate, burst = parse_limits(args.limits)["callback"]
+    ceiling = len(SPAMMERS) * (burst + rate * elapsed)
+
+    print(f"Ishchilar: {args.workers}, yangilanishlar: {args.workers * args.updates}, spam ulushi: {args.spam:g}, "
+          f"vaqt: {elapsed:.2f} s")
+    print(f"O'tkazilgan: {percentiles(allowed)}")
+    print(f"Tashlangan:  {percentiles(dropped)}")
+    print(f"O'rtacha: {statistics.fmean(allowed + dropped) * 1e6:.1f} us/yangilanish, baza xatolari: {errors}")
+    print(f"Spamerlarga o'tgan: {spam_allowed} (umumiy cheklov bo'yicha ko'pi bilan {ceiling:.0f}, "
+          f"har ishchida alohida bo'lsa {ceiling * args.workers:.0f})")
+    print(f"Taqqoslash: Update.de_json = {de_json_cost(2000):.1f} us/yangilanish")
+    assert spam_allowed <= ceiling + args.workers, spam_allowed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Klaviatura render keshi uchun mikrobenchmark.
+
+Eski usul (har callbackda barcha tugmalarni yaratish) va ``MenuRenderCache``
+ni solishtiradi: bitta chaqiruvdagi vaqt va xotira ajratishlari (tracemalloc).
+Natijalar baytma-bayt bir xilligi ham tekshiriladi.
+
+Ishga tushirish:  python benchmarks/render_bench.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+import bot  # noqa: E402
+from keyboards import MenuRenderCache  # noqa: E402
+
+
+def legacy_categories_markup(menu):
+    buttons = [[InlineKeyboardButton(f"🍱 {cat}", callback_data=f"cat:{cat}")] for cat in menu.keys()]
+    buttons.append([InlineKeyboardButton("🛒 Savatcha | Tasdiqlash", callback_data="cart:view")])
+    return InlineKeyboardMarkup(buttons)
+
+
+def legacy_item_markup(menu, category_name, orders):
+    buttons = []
+    for item_id, (name, price) in menu[category_name].items():
+        count = orders.get(item_id, 0)
+        row1 = [
+            InlineKeyboardButton("➖", callback_data=f"qty_dec:{item_id}"),
+            InlineKeyboardButton(f" {count} ", callback_data="ignore"),
+            InlineKeyboardButton("➕", callback_data=f"qty_inc:{item_id}")
+        ]
+        row2 = [InlineKeyboardButton(f"{name} - {price:,} so'm".replace(",", " "), callback_data="ignore")]
+        buttons.extend([row2, row1])
+    buttons.append([InlineKeyboardButton("⬅️ Barcha kategoriyalar", callback_data="back:categories")])
+    return InlineKeyboardMarkup(buttons)
+
+
+def measure(name, fn, rounds=20000):
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    per_call_us = (time.perf_counter() - start) / rounds * 1e6
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [fn() for _ in range(1000)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocated = sum(s.size_diff for s in stats if s.size_diff > 0) / len(keep)
+    blocks = sum(s.count_diff for s in stats if s.count_diff > 0) / len(keep)
+    print(f"{name:<28} {per_call_us:8.2f} us/chaqiruv  {allocated:9.0f} bayt  {blocks:6.0f} blok")
+    return per_call_us, allocated
+
+
+def by_index(counts):
+    """{item_id: soni} -> {indeks: soni} (Cart.counts ko'rinishi)."""
+    return {bot.catalog.index[item_id]: count for item_id, count in counts.items()}
+
+
+def main():
+    menu = bot.catalog.menu
+    cache = MenuRenderCache(menu, bot.catalog.index)
+    category = next(iter(menu))
+    orders = {item_id: i + 1 for i, item_id in enumerate(menu[category])}
+    indexed_orders = by_index(orders)
+
+    # Natijalar baytma-bayt bir xil bo'lishi shart
+    assert cache.categories_markup.to_json() == legacy_categories_markup(menu).to_json()
+    for cat in menu:
+        for counts in ({}, orders, {item_id: 250 for item_id in menu[cat]}):
+            assert cache.item_markup(cat, by_index(counts)).to_json() == legacy_item_markup(menu, cat, counts).to_json()
+    print("Klaviaturalar baytma-bayt bir xil ✅\n")
+
+    old_c, old_c_mem = measure("kategoriyalar (eski)", lambda: legacy_categories_markup(menu))
+    new_c, new_c_mem = measure("kategoriyalar (kesh)", lambda: cache.categories_markup)
+    old_i, old_i_mem = measure("mahsulotlar (eski)", lambda: legacy_item_markup(menu, category, orders))
+    new_i, new_i_mem = measure("mahsulotlar (kesh)", lambda: cache.item_markup(category, indexed_orders))
+
+    print()
+    print(f"Kategoriyalar: {old_c / max(new_c, 1e-9):.1f}x tezroq, {old_c_mem - new_c_mem:.0f} bayt kam ajratish")
+    print(f"Mahsulotlar:   {old_i / new_i:.1f}x tezroq, {old_i_mem - new_i_mem:.0f} bayt kam ajratish")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Yozib olingan yangilanishlarni (recorder.py, ``RECORD_UPDATES_DIR``) qayta o'ynash va profillash.
+
+Bot ilova ichida, vaqtinchalik papkada (toza SQLite fayllar) va alohida
+jarayondagi Bot API stubiga qarshi ishga tushiriladi - ``startup()`` dan
+o'tadi, xuddi webhook rejimidagidek. Yangilanishlar barcha ishchilar
+fayllaridan vaqt bo'yicha birlashtirilib ``application.process_update`` ga
+beriladi:
+
+* ``--speed 1`` - asl vaqt oraliqlari bilan, ``--speed 10`` - 10 barobar tez;
+* ``--speed 0`` - kutmasdan, ``--concurrency`` tadan parallel. ``--concurrency 1``
+  (standart) bilan har yangilanish oldingisi tugagach beriladi - natija
+  deterministik, ikki o'ynashni solishtirish mumkin.
+
+Yozuv boshlanishidan oldin ro'yxatdan o'tgan foydalanuvchilar logda yo'q,
+shuning uchun logdagi har bir foydalanuvchi state'ga soxta telefon bilan
+qo'shiladi (``--no-register`` - qo'shilmaydi).
+
+Profillash (``--profile``):
+
+* ``sample`` - flame.StackSampler: har handler uchun flamegraph (``--out`` papkada);
+* ``cprofile`` - cProfile, ``--out/replay.prof`` va eng og'ir funksiyalar ro'yxati.
+
+Ishga tushirish:
+    python benchmarks/replay.py /var/lib/bot/updates --speed 10 --profile sample --out replay-out
+"""
+
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flame import StackSampler  # noqa: E402
+from ratelimit import classify  # noqa: E402
+from recorder import read_records  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_process(latency_ms: float) -> tuple:
+    """Stub alohida jarayonda: uning ishi profilga aralashmaydi."""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_api.py"),
+         "--port", str(port), "--latency-ms", str(latency_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/__stats", timeout=1).read()
+            return process, url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("Stub ishga tushmadi")
+
+
+def stub_stats(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/__stats", timeout=5) as response:
+        return json.load(response)
+
+
+def seed_users(bot, records: list) -> int:
+    """Logdagi foydalanuvchilarni ro'yxatdan o'tgan deb qo'shadi (mavjudlari o'zgarmaydi)."""
+    users = {}
+    for _, data in records:
+        source = classify(data)
+        if source is not None:
+            user_id = source[1]
+            users.setdefault(user_id, {"id": user_id, "phone": "+998000000000", "username": f"replay{user_id}"})
+    bot.state.set_users(users, replace=False)
+    return len(users)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def replay(bot, records: list, speed: float, concurrency: int) -> dict:
+    from telegram import Update
+
+    application = bot.application
+    loop = asyncio.get_running_loop()
+    latencies, lags, tasks = [], [], []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def process(data):
+        started = loop.time()
+        try:
+            await application.process_update(Update.de_json(data, application.bot))
+        finally:
+            latencies.append(loop.time() - started)
+            slots.release()
+
+    t0 = records[0][0]
+    started = loop.time()
+    for t, data in records:
+        if speed > 0:
+            delay = started + (t - t0) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lags.append(-delay)
+        await slots.acquire()
+        tasks.append(asyncio.create_task(process(data)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {"elapsed": loop.time() - started, "latencies": latencies, "lags": lags}
+
+
+async def main_async(args) -> None:
+    out = os.path.abspath(args.out) if args.out else ""
+    records = list(read_records(args.paths))
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("Yozuvlar topilmadi")
+    span = records[-1][0] - records[0][0]
+
+    stub_process, stub_url = start_stub_process(args.api_latency_ms)
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    os.chdir(workdir)
+    os.environ.update({
+        "BOT_TOKEN": "123:abc",
+        "ADMIN_ID": str(args.admin_id),
+        "WEB_HOST": "https://replay.invalid",
+        "BOT_API_BASE_URL": stub_url,
+        "RECORD_UPDATES_DIR": "",
+    })
+    import bot
+
+    app = bot.main()
+    profiler = sampler = None
+    try:
+        async with app.test_app():
+            await bot.users_loaded.wait()
+            if not args.no_register:
+                print(f"Ro'yxatdan o'tgan deb qo'shildi: {seed_users(bot, records)} ta foydalanuvchi")
+            if args.profile == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            elif args.profile == "sample":
+                sampler = StackSampler(interval=args.interval)
+                sampler.start()
+            result = await replay(bot, records, args.speed, args.concurrency if args.speed == 0 else 1_000_000)
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            await asyncio.sleep(args.settle)
+        outbound = stub_stats(stub_url)
+    finally:
+        stub_process.terminate()
+        stub_process.wait()
+
+    latencies, lags = result["latencies"], result["lags"]
+    print(f"\nYangilanishlar: {len(records)}, yozuvdagi davomiylik: {span:.1f} s, "
+          f"o'ynash: {result['elapsed']:.2f} s (tezlik {args.speed:g}, haqiqiy {span / max(result['elapsed'], 1e-9):.1f}x)")
+    print(f"process_update (ms): p50={percentile(latencies, 0.5) * 1000:.2f} "
+          f"p99={percentile(latencies, 0.99) * 1000:.2f} max={max(latencies) * 1000:.2f}")
+    if args.speed > 0:
+        print(f"Jadvaldan kechikish: {len(lags)} ta, p99={percentile(lags, 0.99) * 1000:.1f} ms "
+              f"max={max(lags, default=0) * 1000:.1f} ms")
+    print(f"Bot API chaqiruvlari: {outbound['calls']} {json.dumps(outbound['by_method'], sort_keys=True)}")
+
+    if out:
+        os.makedirs(out, exist_ok=True)
+    if profiler is not None:
+        path = os.path.join(out or workdir, "replay.prof")
+        profiler.dump_stats(path)
+        print(f"\ncProfile: {path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+    if sampler is not None:
+        busy = sampler.samples - sampler.idle
+        print(f"\nNamunalar: {sampler.samples} (band: {busy}, loop bo'sh: {sampler.idle}), har {args.interval * 1000:g} ms")
+        for name, count in sampler.by_handler():
+            print(f"  {name:<28} {count:>7} {count / max(busy, 1):7.1%}")
+        written = sampler.write(out or os.path.join(workdir, "flame"))
+        print(f"Flamegraphlar: {os.path.dirname(written[0])} ({len(written) // 2} ta)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yozib olingan yangilanishlarni qayta o'ynash")
+    parser.add_argument("paths", nargs="+", help="updates-*.jsonl.gz fayllar yoki ular turgan papka")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 - asl tezlik, 10 - 10x, 0 - kutmasdan")
+    parser.add_argument("--concurrency", type=int, default=1, help="--speed 0 da parallel yangilanishlar")
+    parser.add_argument("--limit", type=int, default=0, help="faqat birinchi N ta yangilanish")
+    parser.add_argument("--api-latency-ms", type=float, default=30)
+    parser.add_argument("--admin-id", type=int, default=1)
+    parser.add_argument("--no-register", action="store_true", help="logdagi foydalanuvchilarni oldindan qo'shmaslik")
+    parser.add_argument("--profile", choices=("none", "sample", "cprofile"), default="none")
+    parser.add_argument("--interval", type=float, default=0.002, help="sample: namuna oralig'i, soniya")
+    parser.add_argument("--top", type=int, default=25, help="cprofile: ko'rsatiladigan funksiyalar")
+    parser.add_argument("--out", default="", help="profil natijalari papkasi")
+    parser.add_argument("--settle", type=float, default=0.5, help="oxirida fon vazifalarini kutish, soniya")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
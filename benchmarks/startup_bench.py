@@ -0,0 +1,144 @@
+"""Ishga tushish benchmarki: gunicorn ishchilari qancha vaqtda birinchi so'rovga javob beradi.
+
+Vaqtinchalik papkada ``--users`` ta foydalanuvchili ``user_data_cache.json``
+yaratiladi, Bot API o'rniga ``--latency-ms`` kechikishli lokal stub ishlaydi
+(getMe va setWebhook haqiqiy tarmoqdagidek vaqt oladi). Gunicorn ``--workers``
+ta ishchi bilan ishga tushiriladi va ``/stats`` ga har safar yangi ulanish
+bilan so'rov yuboriladi - har bir ishchi kamida bir marta javob berguncha.
+Har ishchi uchun (fork vaqtidan boshlab, ``/stats`` -> worker.boot):
+
+* ``imported`` - bot.py import qilinib, ``main()`` chaqirilgan vaqt;
+* ``ready`` - ``initialize()``/``start()`` tugab, so'rov qabul qilishga tayyor;
+* ``first_request`` - birinchi javob berilgan so'rov;
+* ``users`` - foydalanuvchilar fonda yuklanib bo'lgan-bo'lmagani.
+
+``--boots`` marta ketma-ket ishga tushiriladi (bir xil papka): ikkinchisida
+SQLite state'da foydalanuvchilar bor va fayllar o'zgarmagani uchun import
+o'tkazib yuboriladi.
+
+Ishga tushirish:  python benchmarks/startup_bench.py --workers 4 --users 50000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_api import start_stub  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def write_users(workdir: str, count: int) -> None:
+    users = {
+        str(user_id): {"id": user_id, "name": "Test", "phone": f"+998{user_id}", "username": f"user{user_id}"}
+        for user_id in range(100_000, 100_000 + count)
+    }
+    with open(os.path.join(workdir, "user_data_cache.json"), "w", encoding="utf-8") as f:
+        json.dump(users, f)
+
+
+async def poll(session: aiohttp.ClientSession, url: str, workers: dict, deadline: float, wanted: int) -> None:
+    """/stats ni so'raydi: har bir pid ning birinchi javobi va foydalanuvchilar yuklangan vaqti yoziladi."""
+    while time.monotonic() < deadline:
+        if len(workers) >= wanted and all(info.get("users_at") for info in workers.values()):
+            return
+        try:
+            async with session.get(url) as response:
+                data = await response.json()
+        except (aiohttp.ClientError, ValueError):
+            await asyncio.sleep(0.01)
+            continue
+        worker = data["worker"]
+        now = time.monotonic()
+        info = workers.setdefault(worker["pid"], {"seen_at": now})
+        info["boot"] = worker.get("boot")
+        if worker.get("users_loaded", True) and "users_at" not in info:
+            info["users_at"] = now
+        await asyncio.sleep(0.005)
+
+
+async def boot(args, workdir: str, stub_url: str, number: int) -> None:
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123:abc",
+        ADMIN_ID="1",
+        WEB_HOST=f"http://127.0.0.1:{args.port}",
+        BOT_API_BASE_URL=stub_url,
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, "metrics"),
+    )
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+        "--pythonpath", ROOT,
+        "-b", f"127.0.0.1:{args.port}",
+        "-w", str(args.workers),
+        "-k", "uvicorn.workers.UvicornWorker",
+        "bot:main()",
+    ]
+    log = open(os.path.join(workdir, f"gunicorn-{number}.log"), "w")
+    started = time.monotonic()
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    workers = {}
+    deadline = started + args.timeout
+    try:
+        # Har so'rov yangi ulanishda: yadro ulanishlarni ishchilarga taqsimlaydi
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True)) as session:
+            url = f"http://127.0.0.1:{args.port}/stats"
+            await asyncio.gather(*(poll(session, url, workers, deadline, args.workers) for _ in range(args.workers * 2)))
+    finally:
+        process.terminate()
+        await asyncio.to_thread(process.wait, 30)
+        log.close()
+
+    print(f"\n#{number}: {len(workers)}/{args.workers} ishchi javob berdi")
+    print(f"{'pid':>8} {'import':>8} {'tayyor':>8} {'1-so`rov':>9} {'ko`rildi':>9} {'users':>8}")
+    for pid, info in sorted(workers.items(), key=lambda item: item[1]["seen_at"]):
+        boot_times = info.get("boot") or {}
+
+        def cell(key):
+            value = boot_times.get(key)
+            return f"{value:8.3f}" if value is not None else f"{'-':>8}"
+
+        users_at = f"{info['users_at'] - started:8.3f}" if info.get("users_at") else f"{'-':>8}"
+        print(f"{pid:>8} {cell('imported')} {cell('ready')} {cell('first_request'):>9} "
+              f"{info['seen_at'] - started:9.3f} {users_at}")
+    if workers:
+        print(f"Ishga tushirishdan barcha ishchilar javob berguncha: "
+              f"{max(info['seen_at'] for info in workers.values()) - started:.3f} s")
+    print("(import/tayyor/1-so'rov - ishchi fork qilingandan; ko'rildi/users - gunicorn ishga tushirilgandan)")
+
+
+async def bench(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    write_users(workdir, args.users)
+    stub, runner, stub_url = await start_stub(latency_ms=args.latency_ms)
+    print(f"Papka: {workdir}, foydalanuvchilar: {args.users}, Bot API kechikishi: {args.latency_ms:g} ms")
+    try:
+        for number in range(1, args.boots + 1):
+            await boot(args, workdir, stub_url, number)
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ishga tushish benchmarki")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Bot API javob kechikishi (getMe, setWebhook)")
+    parser.add_argument("--boots", type=int, default=2, help="ketma-ket ishga tushirishlar soni")
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
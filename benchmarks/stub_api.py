@@ -0,0 +1,171 @@
+"""Lokal Bot API stub serveri (yuklama testlari uchun).
+
+Telegram Bot API'ga o'xshab javob beradi va har bir chaqiruvni yozib boradi.
+Bot ``BOT_API_BASE_URL=http://127.0.0.1:8081`` bilan ishga tushirilsa, barcha
+tashqi so'rovlar shu yerga keladi.
+
+Alohida ishga tushirish:
+    python benchmarks/stub_api.py --port 8081 --latency-ms 30
+
+Xizmat endpointlari:
+    GET  /__stats  - metodlar bo'yicha chaqiruvlar soni (JSON), ?chat_id=N[,M...] - shu chatlarga chaqiruvlar
+    POST /__reset  - yozuvlarni tozalash
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+
+class StubBotAPI:
+    """Chaqiruvlarni yozib boruvchi soxta Bot API."""
+
+    def __init__(self, latency_ms: float = 0.0, rate_limit_every: int = 0, retry_after: int = 1):
+        self.latency = latency_ms / 1000
+        # Har N-chi yuborish chaqiruviga 429 qaytarish (0 - hech qachon)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.calls = []
+        self.blocked_chats = set()
+        self._message_ids = itertools.count(1000)
+        self._send_counter = itertools.count(1)
+        self.started_at = time.monotonic()
+        # HTTP ulanishlari (keep-alive qayta ishlatilishini ko'rish uchun)
+        self.connections = set()
+
+    def reset(self):
+        self.calls.clear()
+        self.connections.clear()
+        self.started_at = time.monotonic()
+
+    def count(self, method: str | None = None, chat_id: int | None = None) -> int:
+        return sum(
+            1 for _, m, c in self.calls
+            if (method is None or m == method) and (chat_id is None or c == chat_id)
+        )
+
+    def by_chat(self, chat_ids) -> dict:
+        """Berilgan chatlarning har biriga chaqiruvlar soni."""
+        counts = Counter(c for _, _, c in self.calls if c in chat_ids)
+        return {chat_id: counts.get(chat_id, 0) for chat_id in chat_ids}
+
+    def by_method(self) -> dict:
+        return dict(Counter(m for _, m, _ in self.calls))
+
+    @staticmethod
+    async def _params(request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    def _message(self, chat_id, params):
+        message = {
+            "message_id": params.get("message_id") or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id or 0, "type": "private"},
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if "latitude" in params:
+            message["location"] = {"latitude": params["latitude"], "longitude": params["longitude"]}
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        chat_id = params.get("chat_id")
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if peer:
+            self.connections.add(peer)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.startswith("send") or method.startswith("copy"):
+            if chat_id in self.blocked_chats:
+                return web.json_response(
+                    {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}, status=403
+                )
+            if self.rate_limit_every and next(self._send_counter) % self.rate_limit_every == 0:
+                return web.json_response(
+                    {"ok": False, "error_code": 429, "description": "Too Many Requests: retry later",
+                     "parameters": {"retry_after": self.retry_after}},
+                    status=429,
+                )
+
+        self.calls.append((time.monotonic(), method, chat_id))
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        elif method in ("sendMessage", "sendLocation", "sendVenue", "editMessageText", "sendPhoto"):
+            result = self._message(chat_id, params)
+        elif method == "copyMessage":
+            result = {"message_id": next(self._message_ids)}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        elapsed = time.monotonic() - self.started_at
+        chat_id = request.query.get("chat_id")
+        # ?chat_id=1 yoki ?chat_id=-100,-200 (bir nechta filial chati)
+        by_chat = self.by_chat([int(value) for value in chat_id.split(",")]) if chat_id else None
+        return web.json_response({
+            "calls": len(self.calls),
+            "chat_calls": sum(by_chat.values()) if by_chat else None,
+            "by_chat": {str(key): value for key, value in by_chat.items()} if by_chat else None,
+            "by_method": self.by_method(),
+            "connections": len(self.connections),
+            "calls_per_second": round(len(self.calls) / elapsed, 2) if elapsed else 0,
+        })
+
+    async def reset_handler(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/__stats", self.stats)
+        app.router.add_post("/__reset", self.reset_handler)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+
+async def start_stub(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """Stubni fon rejimida ishga tushiradi. (stub, runner, base_url) qaytaradi."""
+    stub = StubBotAPI(**kwargs)
+    runner = web.AppRunner(stub.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    actual_port = site._server.sockets[0].getsockname()[1]
+    return stub, runner, f"http://{host}:{actual_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokal Bot API stub serveri")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="har N-chi yuborishga 429 qaytarish")
+    args = parser.parse_args()
+    stub = StubBotAPI(latency_ms=args.latency_ms, rate_limit_every=args.rate_limit_every)
+    web.run_app(stub.make_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,40 @@ import os
 import logging
 import json
 import asyncio
-import aiohttp
-from quart import Quart, request, jsonify
+import time
+from datetime import datetime
+
+# Ishchi jarayon boshlangan vaqt: gunicorn.conf.py fork paytida belgilaydi, aks holda import boshlanishi
+BOOT_STARTED_AT = float(os.getenv('BOT_WORKER_STARTED_AT') or time.time())
+
+from quart import Quart, Response, request, jsonify
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
+from telegram.ext import Application, ApplicationHandlerStop, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes, CallbackQueryHandler
 from dotenv import load_dotenv
 
+from broadcast import Broadcaster, BroadcastStore, summary as broadcast_summary
+from cart import Cart, CartBook
+from catalog import Catalog, CatalogWatcher
+from edits import EditCoalescer, EditGuard
+from geo import NominatimProvider, ReverseGeocoder, ZoneIndex
+from janitor import ActivityTracker, Janitor, rss_bytes
+from ingest import CallbackRouter, loads, spawn, trivial_callback_id
+from journal import UserJournal
+from keyboards import MenuRenderCache, format_price
+from http_client import BotHTTPClient, shared_ssl_context
+from leader import LeaderLock, boot_id
+from orders import OrderHistory, OrderStore, local_timezone
+from persistence import SQLitePersistence
+from ratelimit import DEFAULT_LIMITS, RateLimiter, classify, parse_limits
+from recorder import UpdateRecorder
+from routing import OrderRouter
+from metrics import CART_CACHE_SIZE, EVICTIONS, INGEST_SHORTCUTS, ORDERS, ORDERS_FAILED, ORDERS_ROUTED, STARTUP, USER_DATA_SIZE, WORKER_RSS, StateCollector, build_registry, instrument, render
+from outbox import Outbox, OutboxSender
+from state import create_backend
+from workqueue import UpdateQueue
+
 # .env faylini yuklaymiz (faqat lokal ishlatish uchun)
 load_dotenv()
 
@@ -17,6 +45,91 @@ TOKEN = os.getenv('BOT_TOKEN')
 # ADMIN_ID ni int ga o'tkazish
 ADMIN_ID = int(os.getenv('ADMIN_ID', 0)) 
 WEB_HOST = os.getenv('WEB_HOST')
+# Bot API manzili. Yuklama testlarida lokal stub serverga yo'naltirish uchun (benchmarks/stub_api.py)
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL', 'https://api.telegram.org')
+# Holat backendi: "sqlite" (barcha gunicorn ishchilari uchun umumiy) yoki "memory" (testlar uchun)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'bot_state.db')
+# Foydalanuvchilar jurnali: fsync oralig'i (0 - har paketda, < 0 - hech qachon) va siqish chegarasi
+USER_JOURNAL_FSYNC_INTERVAL = float(os.getenv('USER_JOURNAL_FSYNC_INTERVAL', 0))
+USER_JOURNAL_COMPACT_BYTES = int(os.getenv('USER_JOURNAL_COMPACT_BYTES', 4 * 1024 * 1024))
+# Webhook rejimi: "queue" - yangilanish navbatga qo'yilib darhol 200 qaytariladi, "inline" - javobdan oldin qayta ishlanadi
+WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', 'queue')
+UPDATE_QUEUE_WORKERS = int(os.getenv('UPDATE_QUEUE_WORKERS', 8))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', 1000))
+UPDATE_QUEUE_PUT_TIMEOUT = float(os.getenv('UPDATE_QUEUE_PUT_TIMEOUT', 5))
+# ➕/➖ bosishlaridan keyingi tahrirlarni birlashtirish oynasi (ms). 0 - har bosishda darhol tahrirlash
+EDIT_COALESCE_MS = int(os.getenv('EDIT_COALESCE_MS', 300))
+# Xabar ko'rinishi izlari shuncha vaqt saqlanadi (o'zgarmagan tahrirlarni aniqlash uchun)
+RENDER_FINGERPRINT_TTL = float(os.getenv('RENDER_FINGERPRINT_TTL', 24 * 3600))
+# Adminga xabarlar navbati (outbox): fayl, tezlik cheklovlari va matn+lokatsiyani bitta xabarga birlashtirish
+OUTBOX_DB_PATH = os.getenv('OUTBOX_DB_PATH', 'bot_outbox.db')
+OUTBOX_GLOBAL_RATE = float(os.getenv('OUTBOX_GLOBAL_RATE', 25))
+OUTBOX_CHAT_INTERVAL = float(os.getenv('OUTBOX_CHAT_INTERVAL', 1))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_MERGE_LOCATION = os.getenv('OUTBOX_MERGE_LOCATION', '0') == '1'
+# Jo'natilgan xabarlar shuncha vaqt saqlanadi (shu muddat ichida idempotentlik kaliti takrorni to'xtatadi). 0 - o'chirilmaydi
+OUTBOX_SENT_RETENTION = float(os.getenv('OUTBOX_SENT_RETENTION', 7 * 24 * 3600))
+# /broadcast: vazifalar fayli, parallel jo'natuvchilar va sahifa hajmi. Tezlik outbox bilan umumiy (OUTBOX_GLOBAL_RATE)
+BROADCAST_DB_PATH = os.getenv('BROADCAST_DB_PATH', 'bot_broadcast.db')
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 10))
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', 500))
+# Xotira chegaralari: Cart keshi (har ishchida), memory backend savatchalari, PTB user_data
+CART_CACHE_SIZE_LIMIT = int(os.getenv('CART_CACHE_SIZE', 10000))
+CART_CACHE_TTL = float(os.getenv('CART_CACHE_TTL', 600))
+MEMORY_MAX_CARTS = int(os.getenv('MEMORY_MAX_CARTS', 100000))
+MEMORY_CART_IDLE_TTL = float(os.getenv('MEMORY_CART_IDLE_TTL', 3600))
+# Bo'sh bo'lmasa chiqarilgan savatchalar shu faylga yoziladi va foydalanuvchi qaytganda tiklanadi
+MEMORY_SPILL_PATH = os.getenv('MEMORY_SPILL_PATH', '')
+# SQLite backendda shuncha vaqt o'zgarmagan savatchalar o'chiriladi (0 - hech qachon)
+CART_EXPIRE_SECONDS = float(os.getenv('CART_EXPIRE_SECONDS', 30 * 24 * 3600))
+USER_DATA_IDLE_TTL = float(os.getenv('USER_DATA_IDLE_TTL', 6 * 3600))
+JANITOR_INTERVAL = float(os.getenv('JANITOR_INTERVAL', 60))
+# context.user_data (checkout holati) ishchilar orasida umumiy SQLite faylda saqlanadi
+PERSISTENCE_DB_PATH = os.getenv('PERSISTENCE_DB_PATH', STATE_DB_PATH)
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', 0.1))
+# Buyurtmalar tarixi (admin hisobotlari uchun). Kunlar shu vaqt zonasida hisoblanadi
+ORDERS_DB_PATH = os.getenv('ORDERS_DB_PATH', 'bot_orders.db')
+ORDERS_TIMEZONE = os.getenv('ORDERS_TIMEZONE', 'Asia/Tashkent')
+# Menyu fayli (bot.py yonida) va uning o'zgarishini tekshirish oralig'i (0 - faqat /reload_menu orqali)
+MENU_FILE = os.getenv('MENU_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'menu.json'))
+MENU_RELOAD_INTERVAL = float(os.getenv('MENU_RELOAD_INTERVAL', 5))
+# Yetkazib berish zonalari va filial joylashuvi (namuna: zones.example.json). Bo'sh bo'lsa zonalar tekshirilmaydi
+ZONES_FILE = os.getenv('ZONES_FILE', '')
+# Teskari geokodlash: "" - o'chirilgan, "nominatim" - OpenStreetMap Nominatim
+GEOCODER = os.getenv('GEOCODER', '')
+GEOCODER_URL = os.getenv('GEOCODER_URL', 'https://nominatim.openstreetmap.org')
+GEOCODER_MIN_INTERVAL = float(os.getenv('GEOCODER_MIN_INTERVAL', 1))
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', 'bot_geocode.db')
+# Buyurtmalarni filiallar chatlariga taqsimlash (namuna: branches.example.json). Bo'sh bo'lsa hammasi ADMIN_ID ga.
+# ZONES_FILE bo'sh bo'lsa yetkazishlar faylidagi delivery_fallback filialiga, u ham berilmasa barcha chatlarga taqsimlanadi
+BRANCHES_FILE = os.getenv('BRANCHES_FILE', '')
+# least_pending siyosatida chatlar navbati outbox'dan shu oraliqda qayta o'qiladi
+ROUTING_REFRESH_INTERVAL = float(os.getenv('ROUTING_REFRESH_INTERVAL', 2))
+# Flood himoyasi: "tur=tezlik:burst" (callback, command, message, other, global), tezlik 0 - cheklanmaydi.
+# Foydalanuvchi hisoblagichlari ishchilar orasida umumiy faylda, global cheklov esa ishchilarga teng bo'linadi
+RATE_LIMITS = os.getenv('RATE_LIMITS', DEFAULT_LIMITS)
+RATE_LIMIT_DB_PATH = os.getenv('RATE_LIMIT_DB_PATH', 'bot_ratelimit.db')
+# Ishchilar soni (gunicorn.conf.py o'rnatadi; polling rejimida 1)
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 1))
+# Kelgan yangilanishlarni qayta o'ynash uchun yozib borish (benchmarks/replay.py). Bo'sh - o'chirilgan
+RECORD_UPDATES_DIR = os.getenv('RECORD_UPDATES_DIR', '')
+RECORD_UPDATES_MAX_BYTES = int(os.getenv('RECORD_UPDATES_MAX_BYTES', 64 * 1024 * 1024))
+RECORD_UPDATES_KEEP = int(os.getenv('RECORD_UPDATES_KEEP', 20))
+# Webhook o'rnatish va outbox jo'natuvchi faqat bitta ishchida (yetakchida) ishlaydi
+LEADER_LOCK_PATH = os.getenv('LEADER_LOCK_PATH', 'bot_leader.lock')
+LEADER_RETRY_INTERVAL = float(os.getenv('LEADER_RETRY_INTERVAL', 5))
+
+# Bot API ga chiquvchi HTTP ulanishlar (har bir ishchida bitta umumiy hovuz)
+# Hovuz katta bo'lsa httpcore CPU'ga og'irlashadi: ortiqcha so'rovlar navbatda kutadi (http_client.py)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+HTTP_KEEPALIVE = int(os.getenv('HTTP_KEEPALIVE', 0)) or None  # 0 - hovuz hajmiga teng
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
+HTTP2 = os.getenv('HTTP2', '0') == '1'
+# O'qish chegaralari metod turi bo'yicha: callback javobi, xabarni tahrirlash, yangi xabar
+HTTP_ANSWER_TIMEOUT = float(os.getenv('HTTP_ANSWER_TIMEOUT', 3))
+HTTP_EDIT_TIMEOUT = float(os.getenv('HTTP_EDIT_TIMEOUT', 5))
+HTTP_SEND_TIMEOUT = float(os.getenv('HTTP_SEND_TIMEOUT', 10))
 
 # Quart app instance
 app = Quart(__name__)
@@ -32,106 +145,312 @@ logger = logging.getLogger(__name__)
 
 # Global variables
 application = None 
-user_orders = {}
+# Bot API ga barcha chiqish chaqiruvlari shu mijoz hovuzidan o'tadi (main() da yaratiladi)
+http_client = None
+# Savatchalar va foydalanuvchilar shu backendda saqlanadi (ishchilar orasida umumiy)
+state = create_backend(STATE_BACKEND, STATE_DB_PATH, max_carts=MEMORY_MAX_CARTS, spill_path=MEMORY_SPILL_PATH or None)
 USER_DATA_FILE = "user_data_cache.json" # Foydalanuvchi ma'lumotlarini saqlash uchun fayl
+# Yangi foydalanuvchilar USER_DATA_FILE + ".journal" fayliga qator qilib qo'shiladi
+user_journal = UserJournal(USER_DATA_FILE, fsync_interval=USER_JOURNAL_FSYNC_INTERVAL, compact_bytes=USER_JOURNAL_COMPACT_BYTES)
+update_queue = None
+edit_coalescer = EditCoalescer(window=EDIT_COALESCE_MS / 1000)
+# Inline xabarlarning barcha tahrirlari shu yerdan o'tadi: ko'rinish o'zgarmagan bo'lsa so'rov yuborilmaydi
+edit_guard = EditGuard(state)
+# Buyurtmalar avval shu yerga yoziladi, Telegramga esa fon jo'natuvchi yuboradi
+outbox = Outbox(OUTBOX_DB_PATH)
+outbox_sender = None
+# Tarqatish vazifalari umumiy faylda, jo'natuvchi esa faqat yetakchida ishlaydi
+broadcasts = BroadcastStore(BROADCAST_DB_PATH)
+broadcaster = None
+# Faqat o'zgargan foydalanuvchilar fonda yoziladi, har bir yangilanishdan oldin esa shu foydalanuvchi qatori o'qiladi
+persistence = SQLitePersistence(PERSISTENCE_DB_PATH, update_interval=PERSISTENCE_UPDATE_INTERVAL)
+# Tasdiqlangan buyurtmalar shu yerga fonda yoziladi
+order_history = OrderHistory(OrderStore(ORDERS_DB_PATH, tz=local_timezone(ORDERS_TIMEZONE)))
+# Admin cheklanmaydi
+rate_limiter = RateLimiter(RATE_LIMIT_DB_PATH, parse_limits(RATE_LIMITS), exempt=(ADMIN_ID,), workers=BOT_WORKERS)
+recorder = UpdateRecorder(RECORD_UPDATES_DIR, RECORD_UPDATES_MAX_BYTES, RECORD_UPDATES_KEEP) if RECORD_UPDATES_DIR else None
+leader = LeaderLock(LEADER_LOCK_PATH, retry_interval=LEADER_RETRY_INTERVAL)
+startup_seconds = None
+# Ishchi boshlanishidan (BOOT_STARTED_AT) o'tgan soniyalar: import tugashi, tayyorlik, birinchi javob
+boot_times = {"imported": None, "ready": None, "first_request": None}
+# Foydalanuvchilar fayldan fonda yuklanadi; tugaguncha webhooklar qabul qilinaveradi
+users_loaded = asyncio.Event()
+# /metrics: barcha gunicorn ishchilarining metrikalari + umumiy holatdan o'lchamlar
+metrics_registry = build_registry([
+    StateCollector({
+        "bot_active_carts": ("Bo'sh bo'lmagan savatchalar", lambda: state.active_cart_count()),
+        "bot_registered_users": ("Ro'yxatdan o'tgan foydalanuvchilar", lambda: state.user_count()),
+    }),
+])
 
 # -----------------
 # 1. BOT SOZLAMALARI
 # -----------------
 
-MENU = {
-    "🍔 Fast Food": {
-        "item_h": ("Hotdog", 15000), 
-        "item_l": ("Lavash", 25000), 
-        "item_b": ("Burger", 30000)
-    },
-    "🥤 Ichimliklar": {
-        "item_p": ("Pepsi", 8000), 
-        "item_c": ("Cola", 8000), 
-        "item_f": ("Fanta", 8000)
-    },
-    "🍰 Desertlar": {
-        "item_ch": ("Cheesecake", 22000), 
-        "item_t": ("Tort", 35000), 
-        "item_d": ("Donut", 12000)
-    }
-}
-
-ALL_ITEMS = {}
-for category_name, items in MENU.items():
-    for item_id, (name, price) in items.items():
-        ALL_ITEMS[item_id] = (name, price, category_name)
-
-
-# Foydalanuvchi ma'lumotlari: {user_id: {"phone": "+998xxxxxxxxx", "username": "..."}}
-user_data = {}
+# Menyu menu.json faylidan o'qiladi va fayl o'zgarsa (yoki admin /reload_menu yuborsa) qayta yuklanadi
+catalog = Catalog.from_file(MENU_FILE)
+
+# Klaviaturalarning statik qismlari bir marta yaratiladi, katalog yangilansa faqat o'zgargan kategoriyalar qayta quriladi
+render_cache = MenuRenderCache(catalog.menu, catalog.index)
+
+# Savatchalar: backenddan o'qiladi, summa va matn esa Cart obyektida keshlanadi
+carts = CartBook(state, catalog.items, max_size=CART_CACHE_SIZE_LIMIT, ttl=CART_CACHE_TTL)
+
+# Jim turgan foydalanuvchilarning user_data/chat_data si va eski savatchalar davriy tozalanadi
+activity = ActivityTracker()
+janitor = Janitor(tick=JANITOR_INTERVAL)
+
+
+def apply_catalog(new_catalog: Catalog):
+    """Yangi katalogga o'tish. Await yo'q - handlerlar eski va yangi menyuning aralashmasini ko'rmaydi."""
+    global catalog
+    changed = catalog.changed_categories(new_catalog)
+    render_cache.update(new_catalog.menu, new_catalog.index, changed)
+    if new_catalog.items != catalog.items:
+        # Keshdagi savatcha summalari eski narxlar bilan hisoblangan
+        carts.set_items(new_catalog.items)
+    catalog = new_catalog
+    logger.info(f"Menyu yangilandi: {len(new_catalog)} ta mahsulot, o'zgargan kategoriyalar: {changed}")
+
+catalog_watcher = CatalogWatcher(MENU_FILE, apply_catalog, interval=MENU_RELOAD_INTERVAL)
+
+
+def load_zones() -> ZoneIndex | None:
+    """Yetkazib berish zonalari. Fayl berilmasa yoki xato bo'lsa lokatsiyalar zonasiz qabul qilinadi."""
+    if not ZONES_FILE:
+        return None
+    try:
+        return ZoneIndex.from_file(ZONES_FILE)
+    except Exception as e:
+        logger.error(f"Zonalarni yuklashda xato ({ZONES_FILE}): {e}")
+        return None
+
+def create_geocoder() -> ReverseGeocoder | None:
+    if not GEOCODER:
+        return None
+    if GEOCODER != "nominatim":
+        logger.error(f"Noma'lum GEOCODER: {GEOCODER}, manzillar aniqlanmaydi")
+        return None
+    provider = NominatimProvider(GEOCODER_URL, min_interval=GEOCODER_MIN_INTERVAL)
+    return ReverseGeocoder(provider, GEOCODE_CACHE_PATH)
+
+def load_router() -> OrderRouter:
+    """Filiallar yo'nalish jadvali. Fayl berilmasa yoki xato bo'lsa barcha buyurtmalar ADMIN_ID ga."""
+    if not BRANCHES_FILE:
+        return OrderRouter.single(ADMIN_ID)
+    try:
+        router = OrderRouter.from_file(BRANCHES_FILE, pending=outbox.pending_by_chat, refresh_interval=ROUTING_REFRESH_INTERVAL)
+    except Exception as e:
+        logger.error(f"Filiallarni yuklashda xato ({BRANCHES_FILE}): {e}. Buyurtmalar ADMIN_ID ga yuboriladi")
+        return OrderRouter.single(ADMIN_ID)
+    if zones is not None:
+        known = {zone.name for zone in zones.zones}
+        for branch in router.branches:
+            unknown = set(branch.zones) - known
+            if unknown:
+                logger.warning(f"Filial {branch.name}: {ZONES_FILE} da yo'q zonalar {sorted(unknown)}")
+    elif router.multi_branch:
+        target = router.delivery_fallback or "barcha filiallar chatlari"
+        logger.warning(f"ZONES_FILE berilmagan: yetkazishlar zonasiz, {target} ga yo'naltiriladi")
+    logger.info(f"Buyurtmalar {len(router.branches)} ta filialga taqsimlanadi ({router.policy})")
+    return router
+
+zones = load_zones()
+# Manzil lokatsiya kelganda fonda aniqlanadi, tasdiqlashda esa faqat keshdan o'qiladi
+geocoder = create_geocoder()
+# Buyurtma qaysi filial chatiga ketishi shu jadvaldan tanlanadi
+router = load_router()
 
 
 # -----------------
 # 2. YORDAMCHI FUNKSIYALAR
 # -----------------
 
-def get_order_summary(user_id: int) -> tuple[str, int]:
-    """Buyurtma ro'yxatini va umumiy summani hisoblaydi."""
-    orders = user_orders.get(user_id, {})
-    active_orders = {item_id: count for item_id, count in orders.items() if count > 0}
-    
-    if not active_orders:
-        return "🛒 Siz hali buyurtma qo‘shmagansiz.", 0
-
-    summary_text = "📦 Sizning buyurtmangiz:\n"
-    total_price = 0
-    
-    for item_id, count in active_orders.items():
-        name, price, _ = ALL_ITEMS.get(item_id, ("Noma'lum", 0, ""))
-        
-        item_total = count * price
-        total_price += item_total
-        summary_text += f"    - {name} ({count}x) = {item_total:,} so'm\n".replace(",", " ")
-        
-    summary_text += f"\n💰 Jami: {total_price:,} so'm".replace(",", " ")
-    return summary_text, total_price
+def get_order_summary(user_id: int, cart: Cart | None = None) -> tuple[str, int]:
+    """Buyurtma ro'yxatini va umumiy summani qaytaradi. Savatcha o'zgarmagan bo'lsa matn keshdan olinadi."""
+    if cart is None:
+        cart = carts.get(user_id)
+    return cart.summary(carts.items), cart.total
 
 def load_users_from_file():
-    """Foydalanuvchi ma'lumotlarini JSON fayldan yuklaydi (Volume storage/Ephemeral diskda saqlash)."""
+    """Foydalanuvchi ma'lumotlarini JSON fayldan yuklaydi va ustiga jurnalni qayta o'ynaydi (Volume storage/Ephemeral diskda saqlash)."""
     try:
-        if not os.path.exists(USER_DATA_FILE):
-             return {}
-        with open(USER_DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # Kalitlarni int ga o'tkazish
-            return {int(k): v for k, v in data.items()}
+        return user_journal.load()
     except (FileNotFoundError, json.JSONDecodeError):
         return {}
     except Exception as e:
         logger.error(f"Foydalanuvchi ma'lumotlarini yuklashda xato: {e}")
         return {}
 
-def save_users_to_file():
-    """Foydalanuvchi ma'lumotlarini JSON faylga saqlaydi."""
+def import_users() -> int:
+    """Fayldagi foydalanuvchilarni state'ga qo'shadi. Fayllar oxirgi importdan beri o'zgarmagan bo'lsa o'tkazib yuboradi.
+
+    Mavjud yozuvlar almashtirilmaydi: state'dagi ma'lumot fayldagidan eskiroq bo'lmaydi.
+    """
+    if STATE_BACKEND == "memory":
+        users = load_users_from_file()
+        state.set_users(users, replace=False)
+        return len(users)
+    # Umumiy state: bitta ishchi import qiladi, qolganlari qulfni kutib, tayyor natijani ko'radi
+    with user_journal.exclusive():
+        signature = user_journal.signature()
+        if state.get_meta("users_import") == signature:
+            return 0
+        users = load_users_from_file()
+        state.set_users(users, replace=False)
+        state.swap_meta("users_import", signature)
+    return len(users)
+
+async def load_users():
+    """Foydalanuvchilarni fonda (alohida oqimda) yuklaydi."""
+    started = time.perf_counter()
+    try:
+        imported = await asyncio.to_thread(import_users)
+        logger.info(
+            f"Bot ma'lumotlari yuklandi ({imported} ta fayldan, {time.perf_counter() - started:.2f} s). "
+            f"Jami foydalanuvchilar: {state.user_count()}"
+        )
+    except Exception as e:
+        logger.error(f"Foydalanuvchilarni yuklashda xato: {e}")
+    finally:
+        users_loaded.set()
+
+async def lookup_user(user_id: int) -> dict | None:
+    """Foydalanuvchini qaytaradi. Topilmasa va yuklash hali tugamagan bo'lsa, yuklashni kutib qayta qaraydi."""
+    user_info = state.get_user(user_id)
+    if user_info is None and not users_loaded.is_set():
+        await users_loaded.wait()
+        user_info = state.get_user(user_id)
+    return user_info
+
+def mark_first_request():
+    """Ishchi birinchi so'rovga javob bergan vaqtni bir marta yozib qo'yadi."""
+    if boot_times["first_request"] is None:
+        boot_times["first_request"] = round(time.time() - BOOT_STARTED_AT, 4)
+
+def save_user_to_file(user_info: dict):
+    """Bitta foydalanuvchini jurnalga qo'shadi. Yozish fonda bajariladi, event loop bloklanmaydi."""
     try:
-        with open(USER_DATA_FILE, 'w', encoding='utf-8') as f:
-            # Kalitlarni str ga o'tkazish
-            json.dump(user_data, f, indent=4, ensure_ascii=False)
+        user_journal.append(user_info)
     except Exception as e:
         logger.error(f"Faylga saqlashda xato: {e}")
 
+def evict_idle_carts() -> int:
+    """Cart keshidan jim turganlarini chiqarish (backenddagi savatcha saqlanib qoladi)."""
+    evicted = carts.evict_idle()
+    EVICTIONS.labels("cart_cache").inc(evicted)
+    return evicted
+
+def purge_idle_backend_carts() -> int:
+    """Memory backend: jim savatchalar diskka yoziladi yoki tashlanadi. SQLite: tashlab ketilgan savatchalar o'chiriladi."""
+    if STATE_BACKEND == "memory":
+        purged = state.purge_idle_carts(MEMORY_CART_IDLE_TTL)
+    elif leader.is_leader and CART_EXPIRE_SECONDS > 0:
+        # Umumiy baza - bitta ishchi tozalashi kifoya
+        purged = state.purge_idle_carts(CART_EXPIRE_SECONDS)
+    else:
+        return 0
+    EVICTIONS.labels("backend_cart").inc(purged)
+    return purged
+
+def drop_idle_user_data() -> int:
+    """USER_DATA_IDLE_TTL dan beri yozmagan foydalanuvchilarning user_data va chat_data sini xotiradan chiqarish (persistence qatori qoladi)."""
+    if application is None:
+        return 0
+    dropped = 0
+    for user_id in activity.pop_idle(USER_DATA_IDLE_TTL):
+        if user_id in application.user_data:
+            application.drop_user_data(user_id)
+            dropped += 1
+        # Shaxsiy chatda chat_id == user_id
+        if user_id in application.chat_data:
+            application.drop_chat_data(user_id)
+    EVICTIONS.labels("user_data").inc(dropped)
+    return dropped
+
+def purge_idle_user_data_rows() -> int:
+    """Uzoq vaqt yozmagan foydalanuvchilarning saqlangan user_data qatorlari (faqat yetakchida)."""
+    if not leader.is_leader or CART_EXPIRE_SECONDS <= 0:
+        return 0
+    return persistence.purge_idle(CART_EXPIRE_SECONDS)
+
+def purge_render_fingerprints() -> int:
+    """Eski xabar izlari. SQLite umumiy bo'lgani uchun faqat yetakchida."""
+    if STATE_BACKEND != "memory" and not leader.is_leader:
+        return 0
+    return state.purge_renders(RENDER_FINGERPRINT_TTL)
+
+def purge_sent_outbox() -> int:
+    """Saqlash muddati o'tgan jo'natilgan xabarlar. Fayl umumiy bo'lgani uchun faqat yetakchida."""
+    if not leader.is_leader or OUTBOX_SENT_RETENTION <= 0:
+        return 0
+    return outbox.purge_sent(OUTBOX_SENT_RETENTION)
+
+def purge_rate_limits() -> int:
+    """To'lgan tezlik bucketlari. Fayl umumiy bo'lgani uchun faqat yetakchida."""
+    if not leader.is_leader:
+        return 0
+    return rate_limiter.purge()
+
+def purge_geocode_cache() -> int:
+    """Muddati o'tgan manzillar (disk keshi umumiy - faqat yetakchida)."""
+    if geocoder is None or not leader.is_leader:
+        return 0
+    return geocoder.purge_expired()
+
+def update_memory_gauges() -> int:
+    WORKER_RSS.set(rss_bytes())
+    CART_CACHE_SIZE.set(len(carts))
+    USER_DATA_SIZE.set(len(application.user_data) if application else 0)
+    return 0
+
+janitor.add("cart_cache", evict_idle_carts, JANITOR_INTERVAL)
+janitor.add("backend_carts", purge_idle_backend_carts, JANITOR_INTERVAL if STATE_BACKEND == "memory" else 3600, in_thread=True)
+janitor.add("user_data", drop_idle_user_data, JANITOR_INTERVAL)
+janitor.add("user_data_rows", purge_idle_user_data_rows, 3600, in_thread=True)
+janitor.add("render_fingerprints", purge_render_fingerprints, JANITOR_INTERVAL if STATE_BACKEND == "memory" else 3600, in_thread=True)
+janitor.add("geocode_cache", purge_geocode_cache, 3600, in_thread=True)
+janitor.add("rate_limits", purge_rate_limits, 3600, in_thread=True)
+janitor.add("outbox_sent", purge_sent_outbox, 3600, in_thread=True)
+janitor.add("gauges", update_memory_gauges, JANITOR_INTERVAL)
+
 # -----------------
 # 3. HANDLER FUNKSIYALARI
 # -----------------
 
+async def persist_user_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Yangilanish oxirida user_data ni darhol yozish navbatiga qo'yish.
+
+    PTB o'zi ham update_interval da yozadi, lekin keyingi bosish boshqa ishchiga
+    tushishi mumkin - shuning uchun kutmaymiz. O'zgarmagan bo'lsa hech narsa yozilmaydi.
+    """
+    if update.effective_user:
+        await persistence.update_user_data(update.effective_user.id, context.user_data)
+
+async def rate_limit_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Polling rejimida tezlik cheklovi. Webhookda bu tekshiruv Update yaratilishidan oldin bajariladi."""
+    source = classify(update.to_dict())
+    if source is not None and not rate_limiter.allow(*source):
+        if update.callback_query is not None:
+            # Javobsiz qolsa mijozda tugma "yuklanmoqda" holatida osilib qoladi
+            spawn(update.callback_query.answer())
+        raise ApplicationHandlerStop
+
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Har bir yangilanishda foydalanuvchining oxirgi faolligini belgilash (user_data tozalash uchun)."""
+    if update.effective_user:
+        activity.touch(update.effective_user.id)
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Boshlang'ich /start buyrug'ini bajaradi va raqam so'raydi."""
     user_id = update.effective_user.id
     
-    is_registered = user_id in user_data and "phone" in user_data[user_id]
+    user_info = await lookup_user(user_id)
+    is_registered = user_info is not None and "phone" in user_info
     
     # 2. Agar foydalanuvchi ro'yxatdan o'tgan bo'lsa, to'g'ridan-to'g'ri menyuni ko'rsatish
     if is_registered:
-        if user_id not in user_orders:
-            user_orders[user_id] = {}
-            
-        await update.message.reply_text(f"👋 Xush kelibsiz, {user_data[user_id]['username']}! Buyurtma berishni davom ettirishingiz mumkin.")
+        await update.message.reply_text(f"👋 Xush kelibsiz, {user_info['username']}! Buyurtma berishni davom ettirishingiz mumkin.")
         await show_main_menu(update, context)
         return
         
@@ -158,15 +477,16 @@ async def contact_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
              final_phone = '+' + final_phone
         
         # Ma'lumotlarni saqlash
-        user_data[user_id] = {
+        user_info = {
             "phone": final_phone,
             "username": update.effective_user.full_name,
             "id": user_id
         }
-        user_orders[user_id] = {}
+        state.set_user(user_id, user_info)
+        await carts.clear(user_id)
         
         # Ma'lumotlarni doimiy saqlash
-        save_users_to_file() 
+        save_user_to_file(user_info)
 
         await update.message.reply_text("✅ Ro‘yxatdan o‘tish muvaffaqiyatli! Endi menyudan tanlang.")
         await show_main_menu(update, context)
@@ -193,9 +513,7 @@ async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query:
         await query.answer()
 
-    buttons = [[InlineKeyboardButton(f"🍱 {cat}", callback_data=f"cat:{cat}")] for cat in MENU.keys()]
-    buttons.append([InlineKeyboardButton("🛒 Savatcha | Tasdiqlash", callback_data="cart:view")])
-    markup = InlineKeyboardMarkup(buttons)
+    markup = render_cache.categories_markup
     
     user_id = update.effective_user.id
     summary, _ = get_order_summary(user_id)
@@ -203,32 +521,17 @@ async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = f"{summary}\n\n---\n\n📋 Menyu kategoriyasini tanlang:"
     
     if query:
-        await query.edit_message_text(text, reply_markup=markup, parse_mode="Markdown")
+        await edit_guard.edit(query, text, reply_markup=markup, parse_mode="Markdown")
     else:
         await update.message.reply_text(text, reply_markup=markup, parse_mode="Markdown")
 
 
-def create_item_buttons(category_name: str, user_id: int):
+def create_item_buttons(category_name: str, user_id: int, cart: Cart | None = None):
     """Mahsulotlar ro'yxati, + / - / count tugmalari va Orqaga tugmasini yaratadi."""
-    orders = user_orders.get(user_id, {})
-    buttons = []
-    
-    for item_id, (name, price) in MENU[category_name].items():
-        count = orders.get(item_id, 0)
-        
-        row1 = [
-            InlineKeyboardButton("➖", callback_data=f"qty_dec:{item_id}"),
-            InlineKeyboardButton(f" {count} ", callback_data="ignore"),
-            InlineKeyboardButton("➕", callback_data=f"qty_inc:{item_id}")
-        ]
-        
-        row2 = [InlineKeyboardButton(f"{name} - {price:,} so'm".replace(",", " "), callback_data="ignore")]
-        
-        buttons.extend([row2, row1])
-
-    buttons.append([InlineKeyboardButton("⬅️ Barcha kategoriyalar", callback_data="back:categories")])
-    
-    return InlineKeyboardMarkup(buttons)
+    if cart is None:
+        cart = carts.get(user_id)
+    # Nom/narx qatorlari va ➖/➕ tugmalari keshdan olinadi, faqat sonlar (indeks bo'yicha) har safar qo'yiladi
+    return render_cache.item_markup(category_name, cart.counts)
 
 
 async def category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -238,14 +541,27 @@ async def category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     category = query.data.split(":")[1]
     user_id = query.from_user.id
 
+    if category not in catalog.menu:
+        # Menyu yangilanib, kategoriya olib tashlangan
+        await show_categories(update, context)
+        return
+
     context.user_data['current_category'] = category
     
-    summary, _ = get_order_summary(user_id)
-    markup = create_item_buttons(category, user_id)
+    await edit_category_view(query, category, user_id)
+
+
+async def edit_category_view(query, category: str, user_id: int):
+    """Kategoriya xabarini savatchaning joriy holati bilan tahrirlaydi."""
+    if category not in catalog.menu:
+        return
+    cart = carts.get(user_id)
+    summary, _ = get_order_summary(user_id, cart)
+    markup = create_item_buttons(category, user_id, cart)
     
     text = f"{summary}\n\n---\n\n**{category}** bo‘limi. Nechta kerakligini tanlang:"
     
-    await query.edit_message_text(text, reply_markup=markup, parse_mode="Markdown")
+    await edit_guard.edit(query, text, reply_markup=markup, parse_mode="Markdown")
 
 
 async def quantity_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -256,19 +572,20 @@ async def quantity_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     action, item_id = query.data.split(":")
     user_id = query.from_user.id
     
-    if user_id not in user_orders:
-        user_orders[user_id] = {}
-        
-    current_count = user_orders[user_id].get(item_id, 0)
-    
     if action == "qty_inc":
-        new_count = current_count + 1
+        delta = 1
     elif action == "qty_dec":
-        new_count = max(0, current_count - 1)
+        delta = -1
     else:
         return
 
-    user_orders[user_id][item_id] = new_count
+    if item_id not in catalog.index:
+        # Eski klaviatura: mahsulot menyudan olib tashlangan
+        await show_categories(update, context)
+        return
+
+    # Atomar o'zgartirish: boshqa ishchi bir vaqtda bosilgan tugmani ham hisobga oladi
+    await carts.incr(user_id, item_id, delta)
     
     category = context.user_data.get('current_category')
     if not category:
@@ -276,12 +593,16 @@ async def quantity_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_categories(update, context) 
         return
 
-    summary, _ = get_order_summary(user_id)
-    markup = create_item_buttons(category, user_id)
-    
-    text = f"{summary}\n\n---\n\n**{category}** bo‘limi. Nechta kerakligini tanlang:"
-    
-    await query.edit_message_text(text, reply_markup=markup, parse_mode="Markdown")
+    # Tez-tez bosishlar bitta tahrirga birlashtiriladi, xabar oyna tugagach oxirgi holat bilan yangilanadi
+    key = (query.message.chat_id, query.message.message_id)
+    await edit_coalescer.schedule(key, lambda: edit_category_view(query, category, user_id))
+
+
+async def cancel_pending_edits(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Boshqa tugma bosilganda shu xabar uchun kutilayotgan kechiktirilgan tahrirni bekor qilish."""
+    message = update.callback_query.message
+    if message:
+        edit_coalescer.cancel((message.chat_id, message.message_id))
 
 
 async def cart_view_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -312,7 +633,7 @@ async def cart_view_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         if query:
-            await message.edit_text(text, reply_markup=markup, parse_mode="Markdown")
+            await edit_guard.edit(message, text, reply_markup=markup, parse_mode="Markdown")
         else:
             await message.reply_text(text, reply_markup=markup, parse_mode="Markdown")
     except Exception as e:
@@ -325,8 +646,7 @@ async def cart_clear_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer("Savatcha tozalandi.")
     user_id = query.from_user.id
     
-    if user_id in user_orders:
-        user_orders[user_id] = {}
+    await carts.clear(user_id)
         
     await show_categories(update, context)
 
@@ -342,7 +662,7 @@ async def checkout_start_handler(update: Update, context: ContextTypes.DEFAULT_T
     ]
     markup = InlineKeyboardMarkup(buttons)
 
-    await query.edit_message_text("Qanday usulni tanlaysiz?", reply_markup=markup)
+    await edit_guard.edit(query, "Qanday usulni tanlaysiz?", reply_markup=markup)
 
 async def delivery_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Yetkazib berish turini qabul qilish."""
@@ -359,26 +679,65 @@ async def delivery_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         button = [[KeyboardButton("📍 Lokatsiyani yuborish", request_location=True)]]
         markup = ReplyKeyboardMarkup(button, resize_keyboard=True, one_time_keyboard=True)
         
-        await message.edit_text("Manzil tanlanmoqda...")
+        await edit_guard.edit(message, "Manzil tanlanmoqda...")
         
         await message.reply_text(
             "📍 Yetkazib berish uchun iltimos, lokatsiyangizni yuboring:", 
             reply_markup=markup
         )
+    elif len(router.pickup_branches) > 1:
+        # Bir nechta filial: mijoz qaysi filialdan olib ketishini tanlaydi
+        buttons = [
+            [InlineKeyboardButton(f"🏪 {router.branches[index].name}", callback_data=f"pickup:{index}")]
+            for index in router.pickup_branches
+        ]
+        await edit_guard.edit(message, "Qaysi filialdan olib ketasiz?", reply_markup=InlineKeyboardMarkup(buttons))
     else:
-        await message.edit_text("✅ Buyurtmangiz qabul qilindi! (Borib olish) Sizga tez orada aloqaga chiqamiz.")
-        await send_to_admin(update, context, "🏃 Borib olish")
+        await complete_pickup(update, context, None)
+
+async def pickup_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Borib olish uchun filial tanlandi."""
+    query = update.callback_query
+    await query.answer()
+    index = query.data.split(":")[1]
+    await complete_pickup(update, context, int(index) if index.isdigit() else None)
+
+async def complete_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE, branch: int | None):
+    # Buyurtma saqlangach mijozga darhol tasdiq, adminga esa fonda yuboriladi
+    if await send_to_admin(update, context, "🏃 Borib olish", pickup_branch=branch):
+        text = "✅ Buyurtmangiz qabul qilindi! (Borib olish) Sizga tez orada aloqaga chiqamiz."
+        if branch is not None and branch < len(router.branches):
+            chosen = router.branches[branch]
+            text += f"\n🏪 {chosen.name}" + (f", {chosen.address}" if chosen.address else "")
+        await edit_guard.edit(update.callback_query.message, text)
         # Asosiy menyu tugmasini bosgandek ko'rsatamiz
-        await show_main_menu(update, context) 
+        await show_main_menu(update, context)
 
 async def location_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Lokatsiyani qabul qilish va tasdiqlash."""
     location = update.message.location
     lat, lon = location.latitude, location.longitude
 
-    context.user_data["temp_location"] = (lat, lon)
+    # Zona va narx grid indeksidan (mikrosekundlar), manzil esa fonda aniqlanadi
+    quote = zones.quote(lat, lon) if zones is not None else None
+    if zones is not None and quote is None:
+        await update.message.reply_text(
+            "😔 Kechirasiz, bu manzil yetkazib berish hududimizdan tashqarida. "
+            "Boshqa lokatsiya yuboring yoki savatchadan \"🏃 Borib olish\"ni tanlang."
+        )
+        return
 
-    text = f"Buyurtma qilmoqchi bo‘lgan manzilingiz:\n\n**Xarita koordinatalari:**\nLat: `{lat}`\nLon: `{lon}`\n\nUshbu manzilni tasdiqlaysizmi? (Kuryerga aniqroq ma'lumot kerak bo'lsa, siz bilan bog‘lanamiz)"
+    context.user_data["temp_location"] = (lat, lon)
+    context.user_data["delivery_quote"] = quote
+    if geocoder is not None:
+        # Tasdiqlash tugmasi bosilguncha keshga tushadi
+        spawn(geocoder.lookup(lat, lon))
+
+    text = f"Buyurtma qilmoqchi bo‘lgan manzilingiz:\n\n**Xarita koordinatalari:**\nLat: `{lat}`\nLon: `{lon}`\n\n"
+    if quote:
+        zone, distance, fee = quote
+        text += f"🗺 **Zona:** {zone} ({distance} km)\n🚚 **Yetkazib berish:** ~{format_price(fee)} so'm\n\n"
+    text += "Ushbu manzilni tasdiqlaysizmi? (Kuryerga aniqroq ma'lumot kerak bo'lsa, siz bilan bog‘lanamiz)"
     buttons = [
         [InlineKeyboardButton("✅ Ha, tasdiqlayman", callback_data="confirm:yes")],
         [InlineKeyboardButton("❌ Yo‘q, qaytadan yuborish", callback_data="confirm:no")]
@@ -398,31 +757,55 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data.split(":")
 
     if data[1] == "yes":
-        await query.edit_message_text("✅ Manzil tasdiqlandi. Buyurtmangiz qabul qilindi! Kuryer tez orada aloqaga chiqadi.")
-        await send_to_admin(update, context, "🚖 Yetkazib berish (Lokatsiya bilan)")
-        await show_main_menu(update, context)
+        if await send_to_admin(update, context, "🚖 Yetkazib berish (Lokatsiya bilan)"):
+            await edit_guard.edit(query, "✅ Manzil tasdiqlandi. Buyurtmangiz qabul qilindi! Kuryer tez orada aloqaga chiqadi.")
+            await show_main_menu(update, context)
     else:
         # Lokatsiya qayta so'ralganda oldingi xabarni tahrirlash
-        await query.edit_message_text("❌ Iltimos, lokatsiyani qaytadan to'g'ri yuboring.")
+        await edit_guard.edit(query, "❌ Iltimos, lokatsiyani qaytadan to'g'ri yuboring.")
         button = [[KeyboardButton("📍 Lokatsiyani yuborish", request_location=True)]]
         markup = ReplyKeyboardMarkup(button, resize_keyboard=True, one_time_keyboard=True)
         await query.message.reply_text("📍 Iltimos, lokatsiyangizni yuboring:", reply_markup=markup)
 
-async def send_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, delivery_type: str):
-    """Yakuniy buyurtmani adminga yuboradi."""
+async def enqueue_outbox(group_key: str, messages: list) -> bool:
+    """Xabarlar guruhini outbox'ga oqimda yozadi (SQLite tranzaksiyasi loopni to'xtatmasin) va jo'natuvchini uyg'otadi."""
+    queued = await asyncio.to_thread(outbox.enqueue, group_key, messages)
+    if queued and outbox_sender is not None:
+        outbox_sender.wake()
+    return queued
+
+
+async def send_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, delivery_type: str, pickup_branch: int | None = None) -> bool:
+    """Yakuniy buyurtmani outbox'ga yozadi (filial chatiga fonda yuboriladi). Saqlansa True qaytaradi."""
     user_id = update.effective_user.id
+    # Idempotentlik kaliti: tasdiqlash tugmasi turgan xabar. Tugma ikki marta bosilsa ham buyurtma bir marta yoziladi
+    order_key = f"order:{user_id}:{update.effective_message.message_id}"
+    # Takroriy bosish filial tanlashdan oldin aniqlanadi - aks holda u filial hisoblagichlarini buzadi
+    try:
+        duplicate = await asyncio.to_thread(outbox.has_group, order_key)
+    except Exception as e:
+        logger.error(f"Outbox'ni tekshirishda xato {order_key}: {e}")
+        duplicate = False
+    if duplicate:
+        logger.info(f"Buyurtma {order_key} allaqachon navbatda, takroriy bosish e'tiborsiz qoldirildi")
+        await carts.clear(user_id)
+        context.user_data.pop("temp_location", None)
+        context.user_data.pop("delivery_quote", None)
+        return True
     
-    user_info = user_data.get(user_id, {})
+    user_info = await lookup_user(user_id) or {}
     phone = user_info.get("phone", "Raqam topilmadi")
     username = user_info.get("username", update.effective_user.full_name)
     
-    summary, total = get_order_summary(user_id)
+    cart = carts.get(user_id)
+    summary, total = get_order_summary(user_id, cart)
     
+    # Foydalanuvchi kiritgan maydonlar qochiriladi: ismdagi "_" yoki "*" Telegramda 400 xatoga olib keladi
     text = f"""
 🚨 **Yangi Buyurtma!** 🚨
 
-👤 **Mijoz:** {username}
-📞 **Raqam:** `{phone}`
+👤 **Mijoz:** {escape_markdown(username)}
+📞 **Raqam:** `{phone.replace('`', '')}`
 🆔 **User ID:** `{user_id}`
 
 {summary}
@@ -430,23 +813,219 @@ async def send_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, deli
 🚚 **Yetkazib berish turi:** {delivery_type}
 """
 
-    try:
-        # Adminga buyurtma matnini yuborish
-        await context.bot.send_message(chat_id=ADMIN_ID, text=text, parse_mode="Markdown")
+    messages = []
+    location = None
+    # Agar yetkazib berish bo'lsa, lokatsiyani ham yuborish
+    if delivery_type.startswith("🚖 Yetkazib berish") and "temp_location" in context.user_data:
+        location = context.user_data["temp_location"]
+
+    order_location = location
+    address = None
+    quote = context.user_data.get("delivery_quote") if location else None
+    # Yetkazish - zona bo'yicha, borib olish - tanlangan filial bo'yicha; chat siyosat bo'yicha tanlanadi
+    kind = "delivery" if delivery_type.startswith("🚖") else "pickup"
+    branch, admin_chat = router.route(kind, (quote[0] if quote else None) if kind == "delivery" else pickup_branch)
+    if router.multi_branch:
+        text += f"🏪 **Filial:** {escape_markdown(branch)}\n"
+    if location:
+        if quote:
+            zone, distance, fee = quote
+            text += f"🗺 **Zona:** {escape_markdown(zone)} ({distance} km), yetkazish ~{format_price(fee)} so'm\n"
+        if geocoder is not None:
+            # Tarmoqqa chiqmaydi: manzil lokatsiya kelganda fonda so'ralgan
+            address = await geocoder.cached(*location)
+            if address:
+                text += f"🏠 **Manzil:** {escape_markdown(address)}\n"
+
+    if location and OUTBOX_MERGE_LOCATION:
+        # Bitta xabar: matn oxirida xarita havolasi
+        lat, lon = location
+        text += f"\n📍 [Xaritada ochish](https://maps.google.com/?q={lat},{lon})\n"
+        location = None
+    messages.append((admin_chat, "send_message", {"text": text, "parse_mode": "Markdown"}))
+    if location:
+        lat, lon = location
+        messages.append((admin_chat, "send_location", {"latitude": lat, "longitude": lon}))
 
-        # Agar yetkazib berish bo'lsa, lokatsiyani alohida yuborish
-        if delivery_type.startswith("🚖 Yetkazib berish") and "temp_location" in context.user_data:
-            lat, lon = context.user_data["temp_location"]
-            await context.bot.send_location(chat_id=ADMIN_ID, latitude=lat, longitude=lon)
+    try:
+        if await enqueue_outbox(order_key, messages):
+            ORDERS.labels(kind).inc()
+            ORDERS_ROUTED.labels(branch).inc()
+            order_history.record({
+                "order_key": order_key,
+                "user_id": user_id,
+                "created_at": time.time(),
+                "total": total,
+                "delivery_type": kind,
+                "location": order_location,
+                "items": [
+                    (item_id, name, category, price, cart.counts[index])
+                    for index, (item_id, name, price, category) in enumerate(carts.items) if index in cart.counts
+                ],
+            })
+            if order_location and geocoder is not None and address is None:
+                spawn(send_address_later(order_key, user_id, order_location, admin_chat))
+        else:
+            # Boshqa ishchi tekshiruvdan keyin yozib ulgurgan: tanlangan chat hisobga olinmaydi
+            router.release(admin_chat)
+            logger.info(f"Buyurtma {order_key} allaqachon navbatda, takroriy bosish e'tiborsiz qoldirildi")
         
-        # Buyurtma yakunlangandan so'ng savatchani tozalash
-        user_orders[user_id] = {}
+        # Buyurtma saqlangandan so'ng savatchani tozalash
+        await carts.clear(user_id)
         context.user_data.pop("temp_location", None) # Vaqtincha lokatsiyani o'chirish
+        context.user_data.pop("delivery_quote", None)
         
     except Exception as e:
-        logger.error(f"Adminga xabar yuborishda xatolik: {e}")
+        logger.error(f"Buyurtmani saqlashda xatolik: {e}")
         # Foydalanuvchiga xato haqida xabar berish
         await update.effective_message.reply_text("⚠️ Uzr, buyurtmani qabul qilishda texnik xatolik yuz berdi. Iltimos, qayta urinib ko'ring.")
+        return False
+
+    return True
+
+
+async def send_address_later(order_key: str, user_id: int, location: tuple, admin_chat: int):
+    """Tasdiqlash paytida manzil hali aniqlanmagan bo'lsa, aniqlangach buyurtma ketgan chatga alohida xabar."""
+    address = await geocoder.lookup(*location)
+    if not address:
+        return
+    try:
+        await enqueue_outbox(f"{order_key}:address", [(admin_chat, "send_message", {"text": f"🏠 Buyurtma manzili (User ID {user_id}): {address}"})])
+    except Exception as e:
+        logger.error(f"Manzilni navbatga yozishda xato {order_key}: {e}")
+
+
+async def reload_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin buyrug'i: menyuni menu.json dan darhol qayta yuklash. Boshqa ishchilar faylni kuzatib o'zlari yangilanadi."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    new_catalog = catalog_watcher.reload()
+    if new_catalog is None:
+        await update.message.reply_text("❌ Menyu yuklanmadi. Fayldagi xato loglarda ko'rsatilgan, eski menyu ishlayapti.")
+        return
+    await update.message.reply_text(f"✅ Menyu yangilandi: {len(new_catalog.menu)} ta kategoriya, {len(new_catalog)} ta mahsulot.")
+
+
+def format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, order_history.store.tz).strftime("%d.%m %H:%M")
+
+async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: bugungi buyurtmalar soni, tushum va oxirgi buyurtmalar."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    store = order_history.store
+    day = store.day()
+    (count, revenue), recent = await asyncio.gather(
+        asyncio.to_thread(store.day_summary, day),
+        asyncio.to_thread(store.orders_for_day, day, 15),
+    )
+    lines = [f"📅 **Bugun ({day})**: {count} ta buyurtma, {format_price(revenue)} so'm\n"]
+    for order_id, user_id, created_at, order_total, kind in recent:
+        lines.append(f"#{order_id} {format_time(created_at)} - `{user_id}` - {format_price(order_total)} so'm ({kind})")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+async def revenue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /revenue [kunlar] - mahsulot va kategoriya bo'yicha tushum (standart: 7 kun)."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    days = int(context.args[0]) if context.args and context.args[0].isdigit() else 7
+    store = order_history.store
+    since, until = store.days_back(max(1, days))
+    by_item, by_category = await asyncio.gather(
+        asyncio.to_thread(store.revenue_by_item, since, until),
+        asyncio.to_thread(store.revenue_by_category, since, until),
+    )
+    lines = [f"💰 **Tushum: {since} - {until}**\n", "**Kategoriyalar:**"]
+    lines += [f"{category}: {quantity} ta, {format_price(revenue)} so'm" for category, quantity, revenue in by_category]
+    lines.append("\n**Mahsulotlar:**")
+    lines += [f"{name}: {quantity} ta, {format_price(revenue)} so'm" for name, _, quantity, revenue in by_item]
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+async def user_orders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /user_orders <user_id> [N] - foydalanuvchining oxirgi N ta buyurtmasi."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    if not context.args or not context.args[0].lstrip("-").isdigit():
+        await update.message.reply_text("Foydalanish: /user_orders <user_id> [soni]")
+        return
+    user_id = int(context.args[0])
+    limit = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else 10
+    rows = await asyncio.to_thread(order_history.store.user_orders, user_id, min(limit, 50))
+    if not rows:
+        await update.message.reply_text(f"`{user_id}` uchun buyurtmalar topilmadi.", parse_mode="Markdown")
+        return
+    lines = [f"🧾 **{user_id} ning oxirgi buyurtmalari:**\n"]
+    for order_id, created_at, order_total, kind, items in rows:
+        goods = ", ".join(f"{name} x{count}" for _, name, _, _, count in items)
+        lines.append(f"#{order_id} {format_time(created_at)} - {format_price(order_total)} so'm ({kind}): {goods}")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /broadcast <matn> - barcha ro'yxatdan o'tgan foydalanuvchilarga xabar."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    text = update.message.text.partition(" ")[2].strip()
+    if not text:
+        await update.message.reply_text("Foydalanish: /broadcast <xabar matni>")
+        return
+    total = await asyncio.to_thread(state.user_count)
+    broadcast_id = await asyncio.to_thread(broadcasts.create, text, total)
+    if broadcast_id is None:
+        await update.message.reply_text("Boshqa tarqatish hali tugamagan: /broadcast_status yoki /broadcast_cancel")
+        return
+    if broadcaster is not None:
+        broadcaster.wake()
+    await update.message.reply_text(
+        f"📣 Tarqatish #{broadcast_id} navbatga qo'yildi: ~{total} ta foydalanuvchi, "
+        f"taxminan {round(total / OUTBOX_GLOBAL_RATE / 60, 1)} daqiqa."
+    )
+
+async def broadcast_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /broadcast_status - oxirgi tarqatish holati, tezligi va taxminiy tugash vaqti."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    job = await asyncio.to_thread(broadcasts.latest)
+    if job is None:
+        await update.message.reply_text("Hali tarqatish bo'lmagan.")
+        return
+    await update.message.reply_text(format_broadcast(job))
+
+async def broadcast_cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: /broadcast_cancel - tugamagan tarqatishni to'xtatish."""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    broadcast_id = await asyncio.to_thread(broadcasts.cancel)
+    if broadcast_id is None:
+        await update.message.reply_text("Faol tarqatish yo'q.")
+        return
+    await update.message.reply_text(f"Tarqatish #{broadcast_id} bekor qilindi.")
+
+def format_broadcast(job: dict) -> str:
+    info = broadcast_summary(job)
+    lines = [
+        f"📣 Tarqatish #{job['id']}: {job['status']}",
+        f"Yuborildi: {job['sent']} / ~{job['total']}",
+        f"Bloklaganlar: {job['blocked']}, xatolar: {job['failed']}, qayta urinishlar: {job['retried']}",
+        f"Vaqt: {info['elapsed']} s, tezlik: {info['rate']} xabar/s",
+    ]
+    if info["eta"] is not None:
+        lines.append(f"Taxminan {info['eta']} s qoldi")
+    return "\n".join(lines)
+
+def report_outbox_failure(group_key: str, chat_id: int, error: str) -> None:
+    """Filial chatiga yetkazilmagan buyurtma haqida adminga ogohlantirish (outbox jo'natuvchi oqimida)."""
+    if not group_key.startswith("order:"):
+        return
+    ORDERS_FAILED.inc()
+    logger.error(f"Buyurtma {group_key} chat {chat_id} ga yetkazilmadi: {error}")
+    # Formatlashsiz: ogohlantirishning o'zi ham xuddi shu sabab bilan rad etilmasin
+    outbox.enqueue(f"alert:{group_key}", [(ADMIN_ID, "send_message", {
+        "text": f"⚠️ Buyurtma {group_key} chat {chat_id} ga yetkazilmadi: {error}\nTarkibi: /user_orders {group_key.split(':')[1]}",
+    })])
+
+async def report_broadcast(job: dict) -> None:
+    """Tugagan tarqatish natijasini adminga outbox orqali yuborish."""
+    await enqueue_outbox(f"broadcast:{job['id']}", [(ADMIN_ID, "send_message", {"text": format_broadcast(job)})])
 
 
 async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -454,7 +1033,8 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     user_id = update.effective_user.id
     
-    if user_id not in user_data or "phone" not in user_data[user_id]:
+    user_info = await lookup_user(user_id)
+    if user_info is None or "phone" not in user_info:
         await update.message.reply_text("Iltimos, avval /start buyrug'i orqali ro'yxatdan o'ting.")
         return
 
@@ -476,40 +1056,135 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # -----------------
 
 def init_handlers(application: Application):
-    """Handlerlarni bot ilovasiga qo'shish."""
-    application.add_handler(CommandHandler("start", start_command))
+    """Handlerlarni bot ilovasiga qo'shish. Har bir handler vaqti /metrics uchun o'lchanadi."""
+    # Xabar boshqa ko'rinishga o'tsa, eski kechiktirilgan tahrir uni qayta yozib yubormasligi kerak
+    application.add_handler(TypeHandler(Update, instrument("track_activity", track_activity)), group=-2)
+    application.add_handler(CallbackQueryHandler(instrument("cancel_pending_edits", cancel_pending_edits), pattern=lambda data: not data.startswith(("qty_", "ignore"))), group=-1)
+
+    # Callback tugmalari: regexlar ro'yxati o'rniga lug'at (to'liq qiymat yoki ":" gacha prefiks)
+    quantity = instrument("quantity_handler", quantity_handler)
+    application.add_handler(CallbackRouter({
+        "back:categories": instrument("show_categories", show_categories),
+        "cat": instrument("category_handler", category_handler),
+        "qty_inc": quantity,
+        "qty_dec": quantity,
+        "cart:view": instrument("cart_view_handler", cart_view_handler),
+        "cart:clear": instrument("cart_clear_handler", cart_clear_handler),
+        "checkout:start": instrument("checkout_start_handler", checkout_start_handler),
+        "delivery": instrument("delivery_handler", delivery_handler),
+        "pickup": instrument("pickup_handler", pickup_handler),
+        "confirm": instrument("confirm_handler", confirm_handler),
+        "ignore": instrument("ignore", ignore_handler),
+    }))
+
+    application.add_handler(CommandHandler("start", instrument("start_command", start_command)))
+    application.add_handler(CommandHandler("reload_menu", instrument("reload_menu_command", reload_menu_command)))
+    application.add_handler(CommandHandler("today", instrument("today_command", today_command)))
+    application.add_handler(CommandHandler("revenue", instrument("revenue_command", revenue_command)))
+    application.add_handler(CommandHandler("user_orders", instrument("user_orders_command", user_orders_command)))
+    application.add_handler(CommandHandler("broadcast", instrument("broadcast_command", broadcast_command)))
+    application.add_handler(CommandHandler("broadcast_status", instrument("broadcast_status_command", broadcast_status_command)))
+    application.add_handler(CommandHandler("broadcast_cancel", instrument("broadcast_cancel_command", broadcast_cancel_command)))
         
-    application.add_handler(MessageHandler(filters.CONTACT, contact_handler))
-    application.add_handler(MessageHandler(filters.LOCATION, location_handler))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
+    application.add_handler(MessageHandler(filters.CONTACT, instrument("contact_handler", contact_handler)))
+    application.add_handler(MessageHandler(filters.LOCATION, instrument("location_handler", location_handler)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrument("text_handler", text_handler)))
+
+    application.add_handler(TypeHandler(Update, instrument("persist_user_data", persist_user_data)), group=100)
+
 
-    application.add_handler(CallbackQueryHandler(show_categories, pattern="^back:categories"))
-    application.add_handler(CallbackQueryHandler(category_handler, pattern="^cat:"))
-    application.add_handler(CallbackQueryHandler(quantity_handler, pattern="^qty_(inc|dec):"))
-    application.add_handler(CallbackQueryHandler(cart_view_handler, pattern="^cart:view"))
-    application.add_handler(CallbackQueryHandler(cart_clear_handler, pattern="^cart:clear"))
-    application.add_handler(CallbackQueryHandler(checkout_start_handler, pattern="^checkout:start"))
-    application.add_handler(CallbackQueryHandler(delivery_handler, pattern="^delivery:"))
-    application.add_handler(CallbackQueryHandler(confirm_handler, pattern="^confirm:"))
-    application.add_handler(CallbackQueryHandler(lambda update, context: update.callback_query.answer(), pattern="^ignore"))
+async def ignore_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ma'lumot tugmalari (nom, narx, son) bosilganda faqat javob qaytarish."""
+    await update.callback_query.answer()
 
 
+# Har bir so'rovda qayta serializatsiya qilmaslik uchun tayyor javob tanasi
+OK_BODY = b'{"status":"ok"}'
+
 @app.post(WEBHOOK_PATH)
 async def telegram_webhook_handler():
     """Telegramdan kelgan POST so'rovlarini qabul qilish."""
     global application
     if application:
-        # Quart orqali JSON so'rovini olish
-        data = await request.get_json()
+        mark_first_request()
+        # Xom baytlarni orjson bilan o'qish
+        body = await request.get_data()
+        if recorder is not None:
+            recorder.record(body)
+        data = loads(body)
+
+        # Flood himoyasi: cheklovdan oshgan yangilanish Update yaratilmasdan tashlanadi
+        if rate_limiter.enabled:
+            source = classify(data)
+            if source is not None and not rate_limiter.allow(*source):
+                if source[0] == "callback":
+                    # Tugma "yuklanmoqda" holatida osilib qolmasligi uchun bo'sh javob
+                    spawn(application.bot.answer_callback_query(data["callback_query"]["id"]))
+                return Response(OK_BODY, content_type="application/json")
+
+        # Ma'lumot tugmasi: Update yaratmasdan javob beramiz
+        query_id = trivial_callback_id(data)
+        if query_id is not None:
+            INGEST_SHORTCUTS.labels("ignore").inc()
+            spawn(application.bot.answer_callback_query(query_id))
+            return Response(OK_BODY, content_type="application/json")
         
         # So'rovni PTBga yuborish
         update = Update.de_json(data, application.bot)
         
-        # Yangilanishni asinxron tarzda qayta ishlash
-        await application.process_update(update)
+        if update_queue is not None:
+            # Navbatga qo'yib, darhol javob qaytaramiz. Navbat to'lsa 503 - Telegram keyinroq qayta yuboradi
+            if not await update_queue.put(update):
+                return jsonify({"status": "busy"}), 503
+        else:
+            # Yangilanishni asinxron tarzda qayta ishlash
+            await application.process_update(update)
     
     # Telegram har doim '200 OK' javobini kutadi
-    return jsonify({"status": "ok"})
+    return Response(OK_BODY, content_type="application/json")
+
+@app.route("/stats", methods=["GET"])
+async def stats():
+    """Ichki holat: navbat chuqurligi va kutish vaqti."""
+    mark_first_request()
+    return jsonify({
+        "webhook_mode": WEBHOOK_MODE,
+        "update_queue": update_queue.stats() if update_queue is not None else None,
+        "edit_coalescer": edit_coalescer.stats(),
+        "edit_guard": edit_guard.stats(),
+        "outbox": outbox_sender.stats() if outbox_sender is not None else outbox.counts(),
+        "broadcast": broadcaster.stats() if broadcaster is not None else None,
+        "routing": router.stats(),
+        "ratelimit": rate_limiter.stats(),
+        "recorder": recorder.stats() if recorder is not None else None,
+        "worker": {
+            "pid": os.getpid(),
+            "leader": leader.is_leader,
+            "startup_seconds": startup_seconds,
+            "boot": boot_times,
+            "users_loaded": users_loaded.is_set(),
+        },
+        "http": http_client.stats() if http_client is not None else None,
+        "memory": {
+            "rss_bytes": rss_bytes(),
+            "cart_cache": carts.stats(),
+            "backend": state.stats(),
+            "user_data": len(application.user_data) if application else 0,
+            "tracked_users": len(activity),
+            "persistence": persistence.stats(),
+            "janitor": janitor.results,
+        },
+        "geo": {
+            "zones": zones.stats() if zones is not None else None,
+            "geocoder": geocoder.stats() if geocoder is not None else None,
+        },
+    })
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    """Prometheus uchun metrikalar."""
+    body, content_type = render(metrics_registry)
+    return Response(body, content_type=content_type)
 
 @app.route("/", methods=["GET"])
 async def home():
@@ -517,11 +1192,11 @@ async def home():
     return f"Telegram Bot Ishlamoqda! Webhook URL: {WEBHOOK_URL}"
 
 
-async def set_webhook_url(application: Application):
-    """Webhook URL'sini o'rnatish. Bot ishga tushganda bir marta chaqiriladi."""
+async def set_webhook_url(application: Application) -> bool:
+    """Webhook URL'sini o'rnatish. Faqat yetakchi ishchida chaqiriladi. Muvaffaqiyatli bo'lsa True."""
     if not WEB_HOST:
         logger.error("WEB_HOST topilmadi. Webhook o'rnatish bekor qilindi.")
-        return
+        return False
 
     # Webhookni o'rnatish uchun Telegram API'ga murojaat
     try:
@@ -534,31 +1209,154 @@ async def set_webhook_url(application: Application):
                 chat_id=ADMIN_ID, 
                 text=f"✅ Bot yangi Webhook manzilida ishga tushdi: {WEB_HOST}"
             )
+        return True
 
     except Exception as e:
         logger.error(f"❌ Webhook o'rnatishda PTB xatosi: {e}")
+        return False
 
 async def startup():
-    """Quart ishga tushganda Webhookni o'rnatish."""
-    global application
+    """Quart ishga tushganda bot ilovasini tayyorlash. Webhookni faqat yetakchi ishchi o'rnatadi.
+
+    Foydalanuvchilarni yuklash va yetakchi ishlari fonda bajariladi: ishchi
+    faqat ``initialize()`` (getMe) va ``start()`` ni kutib so'rov qabul qiladi.
+    """
+    global application, update_queue, startup_seconds
     if application:
-        await set_webhook_url(application)
+        started = time.perf_counter()
+        # initialize() bilan bir vaqtda: foydalanuvchilar alohida oqimda yuklanadi
+        spawn(load_users())
+        catalog_watcher.start()
+        janitor.start()
+        await application.initialize()
+        # start() persistence yozuvchisini ishga tushiradi (yangilanishlar baribir UpdateQueue orqali keladi)
+        await application.start()
+        if WEBHOOK_MODE == "queue":
+            update_queue = UpdateQueue(
+                application.process_update,
+                workers=UPDATE_QUEUE_WORKERS,
+                maxsize=UPDATE_QUEUE_SIZE,
+                put_timeout=UPDATE_QUEUE_PUT_TIMEOUT,
+            )
+            await update_queue.start()
+        # Yetakchi bo'lsak webhook va fon xizmatlari fonda ishga tushadi, aks holda
+        # kutmasdan so'rovlarni qabul qilamiz va yetakchi to'xtasa o'rnini egallaymiz
+        leader.try_acquire()
+        leader.watch(lambda: leader_startup(application))
+        startup_seconds = round(time.perf_counter() - started, 4)
+        boot_times["ready"] = round(time.time() - BOOT_STARTED_AT, 4)
+        STARTUP.labels("leader" if leader.is_leader else "follower").observe(startup_seconds)
+        logger.info(f"Ishchi {os.getpid()} {startup_seconds} soniyada tayyor (yetakchi: {leader.is_leader})")
+
+async def leader_startup(application: Application):
+    """Yetakchi ishchining bir martalik ishlari."""
+    await start_services(application)
+    # Webhook har bir ishga tushirishda (gunicorn master) bir marta o'rnatiladi.
+    # Ishchi qayta tug'ilsa yoki yetakchilik boshqasiga o'tsa takror chaqirilmaydi.
+    webhook_key = f"{boot_id()}|{WEBHOOK_URL}"
+    if state.get_meta("webhook") == webhook_key:
+        logger.info("Webhook shu ishga tushirishda allaqachon o'rnatilgan, o'tkazib yuborildi.")
+        return
+    if await set_webhook_url(application):
+        state.swap_meta("webhook", webhook_key)
+
+async def polling_init(application: Application):
+    """Polling rejimida bitta jarayon: hamma fon vazifalar shu yerda."""
+    spawn(load_users())
+    catalog_watcher.start()
+    janitor.start()
+    leader.try_acquire()
+    await start_services(application)
+
+async def start_services(application: Application):
+    """Fon vazifalarini ishga tushirish (webhook va polling rejimlari uchun umumiy)."""
+    global outbox_sender, broadcaster
+    outbox_sender = OutboxSender(
+        outbox,
+        application.bot,
+        global_rate=OUTBOX_GLOBAL_RATE,
+        chat_interval=OUTBOX_CHAT_INTERVAL,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        on_failed=report_outbox_failure,
+    )
+    outbox_sender.start()
+    # Tarqatish foydalanuvchilar ro'yxatini sahifalab o'qiydi: yuklash tugashini kutamiz
+    await users_loaded.wait()
+    # Tarqatish outbox bilan bitta token bucketdan foydalanadi: jami tezlik OUTBOX_GLOBAL_RATE dan oshmaydi
+    broadcaster = Broadcaster(
+        broadcasts,
+        state,
+        application.bot,
+        outbox_sender.bucket,
+        concurrency=BROADCAST_CONCURRENCY,
+        page_size=BROADCAST_PAGE_SIZE,
+        on_finish=report_broadcast,
+    )
+    broadcaster.start()
+
+async def shutdown(*args):
+    """To'xtashdan oldin navbatni tugatish va navbatdagi yozuvlarni diskka yozib qo'yish."""
+    global update_queue, outbox_sender, broadcaster
+    if update_queue is not None:
+        await update_queue.stop()
+        update_queue = None
+    # Fonda hali ishga tushayotgan yetakchi xizmatlari keyin yaratilib qolmasin
+    await leader.stop_watch()
+    await edit_coalescer.flush_all()
+    if broadcaster is not None:
+        # Joriy joy saqlanadi, keyingi yetakchi shu yerdan davom etadi
+        await broadcaster.stop()
+        broadcaster = None
+    if outbox_sender is not None:
+        await outbox_sender.stop()
+        outbox_sender = None
+    await leader.release()
+    await catalog_watcher.stop()
+    await janitor.stop()
+    if WEB_HOST and application:
+        if application.running:
+            # stop() oxirgi o'zgarishlarni persistence'ga yozadi
+            await application.stop()
+        await application.shutdown()
+    if geocoder is not None:
+        await geocoder.close()
+    await order_history.close()
+    await user_journal.close()
+    if recorder is not None:
+        await recorder.close()
 
 
 def main() -> Quart:
-    """Gunicorn uchun asosiy kirish nuqtasi. Bot Applicationni sozlaydi."""
-    global application, user_data
+    """Gunicorn uchun asosiy kirish nuqtasi (Procfile: "bot:main()"). Bot Applicationni sozlaydi."""
+    global application, http_client
     
     if not TOKEN:
         logger.error("FATAL: BOT_TOKEN o'rnatilmagan! Ilovani ishga tushirish bekor qilindi.")
         return app
         
-    # Foydalanuvchi ma'lumotlarini yuklash
-    user_data = load_users_from_file()
-    logger.info(f"Bot ma'lumotlari yuklandi. Jami foydalanuvchilar: {len(user_data)}")
+    boot_times["imported"] = round(time.time() - BOOT_STARTED_AT, 4)
 
     # Bot ilovasini yaratish
-    application = Application.builder().token(TOKEN).build()
+    http_client = BotHTTPClient(
+        pool_size=HTTP_POOL_SIZE,
+        keepalive=HTTP_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        http2=HTTP2,
+        timeouts={"answer": HTTP_ANSWER_TIMEOUT, "edit": HTTP_EDIT_TIMEOUT, "send": HTTP_SEND_TIMEOUT},
+    )
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .request(http_client)
+        # get_updates uchun standart mijoz (1 ulanish), lekin sertifikatlar qayta yuklanmaydi
+        .get_updates_request(HTTPXRequest(connection_pool_size=1, httpx_kwargs={"verify": shared_ssl_context()}))
+        .base_url(f"{BOT_API_BASE_URL}/bot")
+        .base_file_url(f"{BOT_API_BASE_URL}/file/bot")
+        .persistence(persistence)
+        .post_init(polling_init)
+        .post_shutdown(shutdown)
+        .build()
+    )
     init_handlers(application)
 
     if WEB_HOST:
@@ -566,10 +1364,13 @@ def main() -> Quart:
         logger.info("Bot WEBHOOK rejimida ishga tushmoqda.")
         # Quart serveri ishga tushishidan oldin Webhookni o'rnatish
         app.before_serving(startup)
+        app.after_serving(shutdown)
         return app
     
     # POLLING rejimida ishga tushirish (Lokal rivojlanish uchun)
     logger.info("Bot POLLING rejimida ishga tushmoqda. (Faqat lokalda ishlaydi)")
+    if rate_limiter.enabled:
+        application.add_handler(TypeHandler(Update, instrument("rate_limit_update", rate_limit_update)), group=-3)
     # Lokal test qilish uchun ishlatiladigan joy
     application.run_polling(allowed_updates=Update.ALL_TYPES)
     return app
@@ -0,0 +1,342 @@
+"""Ro'yxatdan o'tgan barcha foydalanuvchilarga xabar tarqatish (broadcast).
+
+Admin ``/broadcast`` bilan vazifa yaratadi (istalgan ishchida), tarqatishni esa
+faqat yetakchi ishchidagi ``Broadcaster`` bajaradi:
+
+* qabul qiluvchilar state backenddan ``user_id`` bo'yicha sahifalab
+  (keyset) o'qiladi - hamma foydalanuvchi xotiraga yuklanmaydi;
+* bir nechta jo'natuvchi parallel ishlaydi, lekin har bir xabar outbox bilan
+  umumiy ``TokenBucket`` dan token oladi: buyurtmalar va tarqatish birgalikda
+  Telegramning global cheklovidan (~30 xabar/s) oshmaydi;
+* 429 da Telegram aytgan vaqtcha hamma to'xtaydi va xabar qayta yuboriladi,
+  botni bloklaganlar (403) va yopilgan chatlar qayta urinilmaydi;
+* ``cursor`` - shu ``user_id`` gacha hamma ishlangan. U har soniyada fon
+  oqimida (``journal.BackgroundWriter``) bazaga yoziladi, qayta ishga tushganda (yoki yetakchi almashganda) tarqatish shu
+  joydan davom etadi. Takroran ketishi mumkin bo'lgan xabarlar soni
+  tekshiruv oralig'i va parallel jo'natuvchilar soni bilan cheklangan.
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from journal import BackgroundWriter
+from outbox import retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("pending", "running")
+
+
+class BroadcastStore:
+    """Tarqatish vazifalari va ularning holati (SQLite, ishchilar orasida umumiy)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        cursor INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        blocked INTEGER NOT NULL DEFAULT 0,
+        retried INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    );
+    """
+
+    FIELDS = ("id", "text", "status", "cursor", "total", "sent", "failed", "blocked", "retried",
+              "created_at", "started_at", "finished_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pid = None
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    def _row(self, query: str, params=()) -> dict | None:
+        row = self._conn().execute(f"SELECT {', '.join(self.FIELDS)} FROM broadcasts {query}", params).fetchone()
+        return dict(zip(self.FIELDS, row)) if row else None
+
+    def create(self, text: str, total: int) -> int | None:
+        """Yangi vazifa. Boshqasi hali tugamagan bo'lsa ``None``."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM broadcasts WHERE status IN (?, ?)", ACTIVE).fetchone():
+                conn.execute("ROLLBACK")
+                return None
+            cur = conn.execute(
+                "INSERT INTO broadcasts (text, total, created_at) VALUES (?, ?, ?)", (text, total, time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.lastrowid
+
+    def get(self, broadcast_id: int) -> dict | None:
+        return self._row("WHERE id = ?", (broadcast_id,))
+
+    def latest(self) -> dict | None:
+        return self._row("ORDER BY id DESC LIMIT 1")
+
+    def next_active(self) -> dict | None:
+        return self._row("WHERE status IN (?, ?) ORDER BY id LIMIT 1", ACTIVE)
+
+    def status(self, broadcast_id: int) -> str | None:
+        row = self._conn().execute("SELECT status FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+        return row[0] if row else None
+
+    def mark_running(self, broadcast_id: int) -> None:
+        self._conn().execute(
+            "UPDATE broadcasts SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ? AND status = 'pending'",
+            (time.time(), broadcast_id),
+        )
+
+    def checkpoint(self, broadcast_id: int, cursor: int, sent: int, failed: int, blocked: int, retried: int) -> None:
+        self._conn().execute(
+            "UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, blocked = ?, retried = ? WHERE id = ?",
+            (cursor, sent, failed, blocked, retried, broadcast_id),
+        )
+
+    def finish(self, broadcast_id: int) -> None:
+        self._conn().execute(
+            "UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ? AND status = 'running'",
+            (time.time(), broadcast_id),
+        )
+
+    def cancel(self) -> int | None:
+        """Tugamagan vazifani bekor qiladi. Bekor qilingan vazifa id si yoki ``None``."""
+        row = self._conn().execute(
+            "UPDATE broadcasts SET status = 'cancelled', finished_at = ? WHERE status IN (?, ?) RETURNING id",
+            (time.time(), *ACTIVE),
+        ).fetchone()
+        return row[0] if row else None
+
+
+def summary(job: dict) -> dict:
+    """Vazifa holatidan tezlik va taxminiy tugash vaqti."""
+    processed = job["sent"] + job["failed"] + job["blocked"]
+    end = job["finished_at"] or time.time()
+    elapsed = end - job["started_at"] if job["started_at"] else 0.0
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    remaining = max(0, job["total"] - processed)
+    return {
+        "processed": processed,
+        "elapsed": round(elapsed, 1),
+        "rate": round(rate, 1),
+        "eta": round(remaining / rate) if rate and job["status"] in ACTIVE else None,
+    }
+
+
+class Broadcaster:
+    """Faol tarqatish vazifasini bajaruvchi fon vazifa (faqat yetakchida)."""
+
+    def __init__(self, store: BroadcastStore, backend, bot, bucket, concurrency: int = 10, page_size: int = 500,
+                 checkpoint_interval: float = 1.0, poll_interval: float = 5.0, max_attempts: int = 3, on_finish=None):
+        self.store = store
+        self.backend = backend
+        self.bot = bot
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.checkpoint_interval = checkpoint_interval
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        # on_finish(job) - tugagan vazifa haqida adminga xabar berish uchun (korutina bo'lsa kutiladi)
+        self.on_finish = on_finish
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Holat yozuvlari event loop'da emas: paketdagi har vazifaning faqat oxirgisi yoziladi
+        self._checkpoints = BackgroundWriter(self._write_checkpoints, max_batch=100, max_delay=0.05, name="broadcast-checkpoint")
+        self.job = None
+        self._reset({"cursor": 0, "sent": 0, "failed": 0, "blocked": 0, "retried": 0})
+
+    def _reset(self, job: dict) -> None:
+        self.cursor = job["cursor"]
+        self.sent = job["sent"]
+        self.failed = job["failed"]
+        self.blocked = job["blocked"]
+        self.retried = job["retried"]
+        # Navbatga berilgan qabul qiluvchilar tartib bilan: [user_id, tugadimi]
+        self._dispatched = deque()
+        self._last_checkpoint = time.monotonic()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="broadcaster")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.next_active)
+            except Exception as e:
+                logger.error(f"Tarqatish vazifasini o'qishda xato: {e}")
+                job = None
+            if job is not None:
+                try:
+                    await self._broadcast(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Tarqatish #{job['id']} xato bilan to'xtadi: {e}")
+                    await asyncio.sleep(self.poll_interval)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _broadcast(self, job: dict):
+        self.job = job
+        self._reset(job)
+        await asyncio.to_thread(self.store.mark_running, job["id"])
+        logger.info(f"Tarqatish #{job['id']} boshlandi (cursor={self.cursor}, jami ~{job['total']})")
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(job, queue)) for _ in range(self.concurrency)]
+        cancelled = False
+        try:
+            after = self.cursor
+            while True:
+                if await asyncio.to_thread(self.store.status, job["id"]) == "cancelled":
+                    cancelled = True
+                    break
+                user_ids = await asyncio.to_thread(self.backend.user_ids_after, after, self.page_size)
+                if not user_ids:
+                    break
+                for user_id in user_ids:
+                    entry = [user_id, False]
+                    self._dispatched.append(entry)
+                    await queue.put(entry)
+                after = user_ids[-1]
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            # To'xtatilganda ham oxirgi uzluksiz ishlangan joy saqlanadi (finish'dan oldin yozilib bo'ladi)
+            self._checkpoint(force=True)
+            self.job = None
+            await self._checkpoints.close()
+        if cancelled:
+            logger.info(f"Tarqatish #{job['id']} bekor qilindi: {self.sent} ta yuborildi")
+            return
+        await asyncio.to_thread(self.store.finish, job["id"])
+        finished = await asyncio.to_thread(self.store.get, job["id"])
+        stats = summary(finished)
+        logger.info(
+            f"Tarqatish #{job['id']} tugadi: {self.sent} yuborildi, {self.blocked} bloklagan, {self.failed} xato, "
+            f"{stats['elapsed']} s, {stats['rate']} xabar/s"
+        )
+        if self.on_finish is not None:
+            try:
+                result = self.on_finish(finished)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Tarqatish #{job['id']} natijasini yuborishda xato: {e}")
+
+    async def _worker(self, job: dict, queue: asyncio.Queue):
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            await self._deliver(job["text"], entry[0])
+            entry[1] = True
+            self._advance()
+
+    async def _deliver(self, text: str, user_id: int) -> None:
+        attempts = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=user_id, text=text)
+            except RetryAfter as e:
+                # Global cheklov: barcha jo'natuvchilar to'xtaydi, xabar urinish hisoblanmaydi
+                self.bucket.pause(retry_after_seconds(e))
+                self.retried += 1
+                continue
+            except Forbidden:
+                self.blocked += 1
+                return
+            except BadRequest as e:
+                logger.warning(f"Tarqatish: {user_id} ga yuborilmadi: {e}")
+                self.failed += 1
+                return
+            except Exception as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.warning(f"Tarqatish: {user_id} ga {attempts} urinishda ham yuborilmadi: {e}")
+                    self.failed += 1
+                    return
+                self.retried += 1
+                await asyncio.sleep(2 ** attempts)
+                continue
+            self.sent += 1
+            return
+
+    def _advance(self) -> None:
+        dispatched = self._dispatched
+        while dispatched and dispatched[0][1]:
+            self.cursor = dispatched.popleft()[0]
+        self._checkpoint()
+
+    def _checkpoint(self, force: bool = False) -> None:
+        if self.job is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_interval:
+            return
+        self._last_checkpoint = now
+        self._checkpoints.submit((self.job["id"], self.cursor, self.sent, self.failed, self.blocked, self.retried))
+
+    def _write_checkpoints(self, batch) -> None:
+        latest = {}
+        for item in batch:
+            latest[item[0]] = item
+        for item in latest.values():
+            self.store.checkpoint(*item)
+
+    def stats(self) -> dict | None:
+        if self.job is None:
+            return None
+        return {
+            "id": self.job["id"],
+            "cursor": self.cursor,
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "retried": self.retried,
+            "in_flight": len(self._dispatched),
+        }
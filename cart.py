@@ -0,0 +1,145 @@
+"""Savatcha obyekti: ixcham saqlash, yig'ma summa va keshlangan matn.
+
+Backend savatchani ``{item_id: count}`` ko'rinishida saqlaydi (menyu
+qayta yuklansa ham barqaror). Jarayon ichida esa savatcha ``Cart``
+obyektida mahsulot indeksi bo'yicha saqlanadi: umumiy summa har o'zgarishda
+yangilanib boriladi, buyurtma matni esa faqat savatcha o'zgarganda qayta
+tuziladi.
+
+Jarayon ichidagi ``Cart`` kesh chegaralangan: ``max_size`` dan oshsa eng kam
+ishlatilgani, ``ttl`` soniya tegilmaganlari esa ``evict_idle()`` da chiqariladi.
+Chiqarilgan savatcha yo'qolmaydi - keyingi so'rovda backenddan qayta o'qiladi.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+EMPTY_SUMMARY = "🛒 Siz hali buyurtma qo‘shmagansiz."
+
+
+class Cart:
+    """Bitta foydalanuvchi savatchasi. ``counts``: {mahsulot indeksi: soni}."""
+
+    __slots__ = ("counts", "total", "_summary")
+
+    def __init__(self, counts: dict, items: list):
+        self.counts = counts
+        self.total = sum(items[index][2] * count for index, count in counts.items())
+        self._summary = None
+
+    def set_count(self, index: int, count: int, items: list) -> None:
+        """Bitta mahsulot sonini o'zgartiradi va summani farq bo'yicha yangilaydi."""
+        old = self.counts.get(index, 0)
+        if count == old:
+            return
+        if count > 0:
+            self.counts[index] = count
+        else:
+            self.counts.pop(index, None)
+        self.total += (count - old) * items[index][2]
+        self._summary = None
+
+    def summary(self, items: list) -> str:
+        """Buyurtma matni. Savatcha o'zgarmaguncha qayta tuzilmaydi."""
+        if self._summary is None:
+            if not self.counts:
+                self._summary = EMPTY_SUMMARY
+            else:
+                lines = ["📦 Sizning buyurtmangiz:\n"]
+                for index in sorted(self.counts):
+                    count = self.counts[index]
+                    _, name, price, _ = items[index]
+                    lines.append(f"    - {name} ({count}x) = {count * price:,} so'm\n".replace(",", " "))
+                lines.append(f"\n💰 Jami: {self.total:,} so'm".replace(",", " "))
+                self._summary = "".join(lines)
+        return self._summary
+
+
+class CartBook:
+    """Ishchi ichidagi ``Cart`` obyektlari keshi.
+
+    Har bir o'qishda backenddan savatcha bitta so'rov bilan olinadi (boshqa
+    ishchilar uni o'zgartirgan bo'lishi mumkin). Agar tarkib keshdagisi bilan
+    bir xil bo'lsa, tayyor ``Cart`` (summasi va matni bilan) qaytariladi.
+
+    Yozishlar (``incr``, ``clear``) backend diskda bo'lsa (``blocking``)
+    oqimda bajariladi. ``get`` esa sinxron qoladi: u kalit bo'yicha bitta
+    o'qish, WAL rejimida yozishlarni kutmaydi va menyu chizuvchi sinxron
+    funksiyalardan chaqiriladi.
+    """
+
+    def __init__(self, backend, items: list, max_size: int = 10000, ttl: float = 600.0):
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl = ttl
+        # {user_id: (oxirgi murojaat vaqti, Cart)} - eng eskisi boshida
+        self._carts = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+        self.set_items(items)
+
+    def set_items(self, items: list) -> None:
+        """``items``: [(item_id, name, price, category), ...] - indeks shu ro'yxatdagi o'rin."""
+        self.items = items
+        self.index = {item[0]: i for i, item in enumerate(items)}
+        self._carts.clear()
+
+    def _to_counts(self, raw: dict) -> dict:
+        index = self.index
+        # Menyuda yo'q mahsulotlar (masalan, olib tashlangan) hisobga olinmaydi
+        return {index[item_id]: count for item_id, count in raw.items() if count > 0 and item_id in index}
+
+    def _put(self, user_id: int, cart: Cart) -> None:
+        self._carts[user_id] = (time.monotonic(), cart)
+        self._carts.move_to_end(user_id)
+        while len(self._carts) > self.max_size:
+            self._carts.popitem(last=False)
+            self.evicted_lru += 1
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def get(self, user_id: int) -> Cart:
+        counts = self._to_counts(self.backend.get_cart(user_id))
+        entry = self._carts.get(user_id)
+        cart = entry[1] if entry is not None else None
+        if cart is None or cart.counts != counts:
+            cart = Cart(counts, self.items)
+        self._put(user_id, cart)
+        return cart
+
+    async def incr(self, user_id: int, item_id: str, delta: int) -> int:
+        """Backendda atomar o'zgartiradi va keshdagi savatchani ham yangilaydi."""
+        new_count = await self._call(self.backend.incr_item, user_id, item_id, delta)
+        entry = self._carts.get(user_id)
+        if entry is not None and item_id in self.index:
+            entry[1].set_count(self.index[item_id], new_count, self.items)
+            self._put(user_id, entry[1])
+        return new_count
+
+    def evict_idle(self) -> int:
+        """``ttl`` dan ko'p tegilmagan savatchalarni keshdan chiqaradi. Chiqarilganlar sonini qaytaradi."""
+        deadline = time.monotonic() - self.ttl
+        evicted = 0
+        # Tartib murojaat vaqti bo'yicha, shuning uchun faqat boshidan tekshiriladi
+        while self._carts:
+            touched, _ = next(iter(self._carts.values()))
+            if touched >= deadline:
+                break
+            self._carts.popitem(last=False)
+            evicted += 1
+        self.evicted_idle += evicted
+        return evicted
+
+    def stats(self) -> dict:
+        return {"size": len(self._carts), "max_size": self.max_size, "evicted_lru": self.evicted_lru, "evicted_idle": self.evicted_idle}
+
+    async def clear(self, user_id: int) -> None:
+        await self._call(self.backend.clear_cart, user_id)
+        self._carts.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._carts)
@@ -0,0 +1,129 @@
+"""Menyu katalogi: tashqi ``menu.json`` fayldan yuklanadi va ishlayotgan botda yangilanadi.
+
+Fayl ko'rinishi (kategoriyalar va mahsulotlar tartibi saqlanadi)::
+
+    {
+        "🍔 Fast Food": {
+            "item_h": {"name": "Hotdog", "price": 15000},
+            ...
+        },
+        ...
+    }
+
+``Catalog`` o'zgarmas obyekt. Yangilashda yangi katalog to'liq yig'ilib
+tekshiriladi, keyin bitta havola almashtiriladi - handlerlar hech qachon
+yarim yangilangan menyuni ko'rmaydi. Fayl noto'g'ri bo'lsa eski katalog
+qoladi. Savatchalar backendda ``item_id`` bo'yicha saqlangani uchun
+yangilashda yo'qolmaydi; menyudan olib tashlangan mahsulotlar shunchaki
+hisobga olinmaydi.
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Telegram callback_data chegarasi (bayt)
+MAX_CALLBACK_DATA = 64
+
+
+class Catalog:
+    """Indekslangan menyu: ``item_id`` va kategoriya bo'yicha O(1) qidiruv."""
+
+    def __init__(self, menu: dict):
+        # menu: {kategoriya: {item_id: (nomi, narxi)}}
+        self.menu = {}
+        self.items = []  # [(item_id, nomi, narxi, kategoriya), ...] - indeks shu ro'yxatdagi o'rin
+        self.index = {}  # {item_id: indeks}
+        for category, items in menu.items():
+            if len(f"cat:{category}".encode()) > MAX_CALLBACK_DATA:
+                raise ValueError(f"Kategoriya nomi juda uzun: {category}")
+            self.menu[category] = {}
+            for item_id, (name, price) in items.items():
+                if item_id in self.index:
+                    raise ValueError(f"Mahsulot ID takrorlangan: {item_id}")
+                if len(f"qty_dec:{item_id}".encode()) > MAX_CALLBACK_DATA:
+                    raise ValueError(f"Mahsulot ID juda uzun: {item_id}")
+                if not isinstance(name, str) or not name:
+                    raise ValueError(f"{item_id}: nomi bo'sh")
+                if not isinstance(price, int) or isinstance(price, bool) or price <= 0:
+                    raise ValueError(f"{item_id}: narx musbat butun son bo'lishi kerak")
+                self.menu[category][item_id] = (name, price)
+                self.index[item_id] = len(self.items)
+                self.items.append((item_id, name, price, category))
+
+    @classmethod
+    def from_file(cls, path: str) -> "Catalog":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls({
+            category: {item_id: (item["name"], item["price"]) for item_id, item in items.items()}
+            for category, items in data.items()
+        })
+
+    def _rows(self, category: str) -> tuple:
+        return tuple((item_id, name, price, self.index[item_id]) for item_id, (name, price) in self.menu[category].items())
+
+    def changed_categories(self, other: "Catalog") -> list:
+        """``other`` (yangi katalog) da qaysi kategoriyalar qatorlari o'zgargan (nom, narx, tartib yoki indeks)."""
+        return [
+            category for category in other.menu
+            if category not in self.menu or self._rows(category) != other._rows(category)
+        ]
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CatalogWatcher:
+    """Fayl ``mtime`` o'zgarishini kuzatib, katalogni qayta yuklaydi.
+
+    Har bir ishchi o'z nusxasini alohida kuzatadi, shuning uchun fayl
+    yangilansa barcha ishchilar ``interval`` ichida yangi menyuga o'tadi.
+    """
+
+    def __init__(self, path: str, on_change, interval: float = 5.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.mtime = self._mtime()
+        self._task = None
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self) -> Catalog | None:
+        """Faylni o'qib ``on_change(catalog)`` ni chaqiradi. Xato bo'lsa ``None`` (eski katalog qoladi)."""
+        self.mtime = self._mtime()
+        try:
+            catalog = Catalog.from_file(self.path)
+        except Exception as e:
+            logger.error(f"Menyu faylini yuklashda xato, eski menyu qoldi: {e}")
+            return None
+        self.on_change(catalog)
+        return catalog
+
+    def check(self) -> bool:
+        if self._mtime() == self.mtime:
+            return False
+        return self.reload() is not None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="catalog-watcher")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,184 @@
+"""Xabarlarni tahrirlash (edit_message_text) chaqiruvlarini kamaytirish.
+
+Mijoz ➕ tugmasini ketma-ket 5 marta bossa, har bir bosish uchun alohida
+tahrirlash Telegramning chat bo'yicha cheklovlariga urilib, 429 va
+"message is not modified" xatolarini keltirib chiqaradi. ``EditCoalescer``
+bitta xabar uchun kutilayotgan tahrirlarni qisqa oyna ichida bittaga
+birlashtiradi: savatcha darhol o'zgaradi, xabar esa oyna tugagach eng oxirgi
+holat bilan bir marta tahrirlanadi.
+
+Cheklov: oyna har bir ishchida alohida. Bitta xabarga bosishlar turli
+gunicorn ishchilariga tushsa, har biri o'z tahririni yuboradi va ular
+Telegramga yuborilish tartibida emas, yetib borish tartibida qo'llanadi.
+Har bir tahrir chizilayotgan paytdagi umumiy savatchani ko'rsatadi, lekin
+ikki ishchining so'rovlari bir vaqtda yo'lda bo'lsa xabarda eskirog'i
+qolishi mumkin. Keyingi bosish yoki ko'rinish uni tuzatadi, savatchaning
+o'zi (backendda) har doim to'g'ri.
+
+``EditGuard`` esa ko'rinishi o'zgarmagan tahrirlarni umuman yubormaydi: har bir
+xabar uchun oxirgi yuborilgan matn va klaviaturaning izi (hash) state
+backendda saqlanadi. Masalan 0 da turgan mahsulotga ➖ bosilganda yoki
+"Orqaga" bilan o'sha kategoriyalar ro'yxatiga qaytilganda Telegram
+"message is not modified" deb rad etadigan so'rov tarmoqqa chiqmaydi.
+"""
+
+import asyncio
+import hashlib
+import logging
+
+from telegram import CallbackQuery
+from telegram.error import BadRequest
+
+from metrics import EDITS
+
+logger = logging.getLogger(__name__)
+
+
+def render_fingerprint(text: str, reply_markup=None, parse_mode: str | None = None) -> int:
+    """Matn, parse_mode va inline klaviaturaning barqaror 64 bitli izi.
+
+    ``hash()`` ishlatilmaydi - u har bir jarayonda boshqacha, izlar esa ishchilar orasida umumiy.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"{parse_mode}\x1d{text}".encode())
+    if reply_markup is not None:
+        for row in reply_markup.inline_keyboard:
+            digest.update(b"\x1d")
+            for button in row:
+                digest.update(f"{button.text}\x1f{button.callback_data}\x1f{button.url or ''}\x1e".encode())
+    return int.from_bytes(digest.digest(), "big", signed=True)
+
+
+class EditCoalescer:
+    """Kalit (chat_id, message_id) bo'yicha tahrirlarni birlashtiradi.
+
+    ``schedule()`` ga oxirgi holatni chizadigan async funksiya beriladi. U
+    oyna tugagach chaqiriladi, shuning uchun har doim eng so'nggi holat
+    yuboriladi. Bitta xabar uchun tahrirlar ketma-ket bajariladi - faqat
+    shu ishchi ichida (modul izohidagi cheklovga qarang).
+    """
+
+    def __init__(self, window: float = 0.3):
+        self.window = window
+        self._pending = {}
+        self._timers = {}
+        self._locks = {}
+        self._tasks = set()
+        # Statistika
+        self.scheduled = 0
+        self.flushed = 0
+        self.cancelled = 0
+
+    async def schedule(self, key, render) -> None:
+        """Tahrirni rejalashtiradi. Oyna 0 bo'lsa darhol bajaradi."""
+        self.scheduled += 1
+        if self.window <= 0:
+            self.flushed += 1
+            await render()
+            return
+        # Oxirgi holat yutadi: oldingi kutilayotgan render almashtiriladi
+        self._pending[key] = render
+        if key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, self._start_flush, key)
+
+    def cancel(self, key) -> None:
+        """Xabar uchun kutilayotgan tahrirni bekor qiladi."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if self._pending.pop(key, None) is not None:
+            self.cancelled += 1
+
+    def _start_flush(self, key):
+        self._timers.pop(key, None)
+        task = asyncio.create_task(self._flush(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, key):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            render = self._pending.pop(key, None)
+            if render is None:
+                return
+            self.flushed += 1
+            try:
+                await render()
+            except Exception as e:
+                logger.error(f"Kechiktirilgan tahrirlashda xato {key}: {e}")
+        if key not in self._pending and not lock.locked():
+            self._locks.pop(key, None)
+
+    async def flush_all(self):
+        """Barcha kutilayotgan tahrirlarni darhol bajaradi (to'xtashda)."""
+        for key, timer in list(self._timers.items()):
+            timer.cancel()
+            self._timers.pop(key, None)
+        await asyncio.gather(*(self._flush(key) for key in list(self._pending)), *self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": int(self.window * 1000),
+            "scheduled": self.scheduled,
+            "flushed": self.flushed,
+            "coalesced": self.scheduled - self.flushed - self.cancelled - len(self._pending),
+            "cancelled": self.cancelled,
+            "pending": len(self._pending),
+        }
+
+
+class EditGuard:
+    """Xabarni faqat ko'rinishi o'zgargan bo'lsa tahrirlaydi.
+
+    Izlar ``backend.swap_render`` orqali (chat_id, message_id) kaliti bilan
+    saqlanadi. Tahrir yetib bormasa iz o'chiriladi - keyingi urinish albatta
+    yuboriladi. Iz to'g'ri qolishi uchun xabarning barcha tahrirlari shu
+    yerdan o'tishi kerak. Backend diskda bo'lsa (``blocking``) izlar event
+    loop'dan tashqarida, oqimda o'qiladi va yoziladi.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.sent = 0
+        self.suppressed = 0
+        self.not_modified = 0
+        self._sent = EDITS.labels("sent")
+        self._suppressed = EDITS.labels("suppressed")
+        self._not_modified = EDITS.labels("not_modified")
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def edit(self, target, text: str, reply_markup=None, parse_mode: str | None = None) -> bool:
+        """``target`` - CallbackQuery yoki Message. Tahrir yuborilgan bo'lsa ``True``."""
+        message = target.message if isinstance(target, CallbackQuery) else target
+        chat_id, message_id = message.chat.id, message.message_id
+        if not await self._call(self.backend.swap_render, chat_id, message_id, render_fingerprint(text, reply_markup, parse_mode)):
+            self.suppressed += 1
+            self._suppressed.inc()
+            return False
+        try:
+            if isinstance(target, CallbackQuery):
+                await target.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            else:
+                await target.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if "not modified" in e.message:
+                # Xabar tahrirlanmagan (masalan iz tozalangan) - ko'rinish baribir shu
+                self.not_modified += 1
+                self._not_modified.inc()
+                return False
+            await self._call(self.backend.forget_render, chat_id, message_id)
+            raise
+        except Exception:
+            await self._call(self.backend.forget_render, chat_id, message_id)
+            raise
+        self.sent += 1
+        self._sent.inc()
+        return True
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "suppressed": self.suppressed, "not_modified": self.not_modified}
@@ -0,0 +1,299 @@
+"""Yetkazib berish lokatsiyalari: zonalar, masofa, narx va manzil.
+
+* ``ZoneIndex`` - zonalar faylidagi (namuna: ``zones.example.json``)
+  ko'pburchak zonalar. Xarita kataklarga (grid) bo'linadi va har bir
+  katakka shu katakni kesib o'tadigan zonalar oldindan yoziladi, shuning
+  uchun nuqtani tasniflash bitta lug'at o'qish va 1-2 ta ko'pburchak
+  tekshiruvidan iborat. Zonalar ustma-ust tushsa fayldagi birinchisi
+  tanlanadi (markaz -> shahar -> chekka).
+* ``haversine_km`` - filialdan to'g'ri chiziqli masofa; narx zona bazaviy
+  narxi va km bo'yicha qo'shimchadan hisoblanadi.
+* ``ReverseGeocoder`` - ixtiyoriy provayder (masalan Nominatim) orqali
+  koordinatani manzilga aylantiradi. Natijalar yaxlitlangan koordinata
+  kaliti bilan xotiradagi LRU va SQLite disk keshida saqlanadi, bir xil
+  nuqta uchun parallel so'rovlar bittaga birlashtiriladi.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Ikki nuqta orasidagi katta doira masofasi, km."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def point_in_polygon(lat: float, lon: float, polygon: list) -> bool:
+    """Nur tashlash (ray casting): nuqta ko'pburchak ichidami. ``polygon`` - [(lat, lon), ...]."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+class Zone:
+    """Yetkazib berish zonasi: ko'pburchak va narx qoidasi."""
+
+    def __init__(self, name: str, polygon: list, base_fee: int, per_km: int = 0, free_km: float = 0.0):
+        if len(polygon) < 3:
+            raise ValueError(f"Zona {name}: ko'pburchakda kamida 3 ta nuqta bo'lishi kerak")
+        self.name = name
+        self.polygon = [(float(lat), float(lon)) for lat, lon in polygon]
+        self.base_fee = int(base_fee)
+        self.per_km = int(per_km)
+        self.free_km = float(free_km)
+        lats = [lat for lat, _ in self.polygon]
+        lons = [lon for _, lon in self.polygon]
+        self.bbox = (min(lats), min(lons), max(lats), max(lons))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        return point_in_polygon(lat, lon, self.polygon)
+
+    def fee(self, distance_km: float) -> int:
+        """Bazaviy narx + bepul masofadan keyingi har bir km; 1000 so'mgacha yuqoriga yaxlitlanadi."""
+        fee = self.base_fee + self.per_km * max(0.0, distance_km - self.free_km)
+        return int(math.ceil(fee / 1000) * 1000)
+
+
+class ZoneIndex:
+    """Zonalarning grid indeksi va filial joylashuvi."""
+
+    def __init__(self, zones: list, branch: tuple, max_distance_km: float = 0.0, cell_deg: float = 0.01):
+        if not zones:
+            raise ValueError("Kamida bitta zona bo'lishi kerak")
+        self.zones = zones
+        self.branch = branch
+        self.max_distance_km = max_distance_km
+        self.cell_deg = cell_deg
+        # {(qator, ustun): (zona, ...)} - katakni kesib o'tadigan zonalar, ustuvorlik tartibida
+        self._grid = {}
+        for zone in zones:
+            min_lat, min_lon, max_lat, max_lon = zone.bbox
+            for row in range(self._cell(min_lat), self._cell(max_lat) + 1):
+                for col in range(self._cell(min_lon), self._cell(max_lon) + 1):
+                    self._grid[(row, col)] = self._grid.get((row, col), ()) + (zone,)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ZoneIndex":
+        """Zonalar fayli: {"branch": {"lat", "lon"}, "max_distance_km", "cell_deg", "zones": [{"name", "base_fee", "per_km", "free_km", "polygon": [[lat, lon], ...]}]}."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        zones = [
+            Zone(zone["name"], zone["polygon"], zone["base_fee"], zone.get("per_km", 0), zone.get("free_km", 0))
+            for zone in data["zones"]
+        ]
+        branch = (float(data["branch"]["lat"]), float(data["branch"]["lon"]))
+        return cls(zones, branch, float(data.get("max_distance_km", 0)), float(data.get("cell_deg", 0.01)))
+
+    def _cell(self, value: float) -> int:
+        return math.floor(value / self.cell_deg)
+
+    def classify(self, lat: float, lon: float) -> Zone | None:
+        for zone in self._grid.get((self._cell(lat), self._cell(lon)), ()):
+            if zone.contains(lat, lon):
+                return zone
+        return None
+
+    def quote(self, lat: float, lon: float) -> tuple | None:
+        """(zona nomi, filialdan masofa km, yetkazish narxi). Hudud tashqarisida ``None``."""
+        zone = self.classify(lat, lon)
+        if zone is None:
+            return None
+        distance = haversine_km(self.branch[0], self.branch[1], lat, lon)
+        if self.max_distance_km and distance > self.max_distance_km:
+            return None
+        return zone.name, round(distance, 1), zone.fee(distance)
+
+    def stats(self) -> dict:
+        return {"zones": len(self.zones), "cells": len(self._grid)}
+
+
+class NominatimProvider:
+    """OpenStreetMap Nominatim orqali teskari geokodlash.
+
+    Ochiq server soniyasiga 1 ta so'rovga ruxsat beradi, shuning uchun so'rovlar
+    orasida ``min_interval`` saqlanadi (o'z serveringizda 0 qilish mumkin).
+    """
+
+    def __init__(self, url: str = "https://nominatim.openstreetmap.org", user_agent: str = "makburgers-bot",
+                 language: str = "uz", timeout: float = 5.0, min_interval: float = 1.0):
+        import httpx
+
+        self.url = url.rstrip("/")
+        self.language = language
+        self.min_interval = min_interval
+        self._client = httpx.AsyncClient(timeout=timeout, headers={"User-Agent": user_agent})
+        self._lock = asyncio.Lock()
+        self._last = 0.0
+
+    async def reverse(self, lat: float, lon: float) -> str | None:
+        async with self._lock:
+            wait = self._last + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last = time.monotonic()
+        response = await self._client.get(
+            f"{self.url}/reverse",
+            params={"format": "jsonv2", "lat": lat, "lon": lon, "zoom": 18, "accept-language": self.language},
+        )
+        response.raise_for_status()
+        return response.json().get("display_name")
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ReverseGeocoder:
+    """Provayder ustidagi kesh: xotira (LRU) -> SQLite disk -> provayder.
+
+    Kalit - ``precision`` xonagacha yaxlitlangan koordinata (4 xona ~ 11 m).
+    Provayder xatolari keshlanmaydi, topilmagan manzil esa bo'sh satr sifatida
+    keshlanadi (qayta so'ralmaydi).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        key TEXT PRIMARY KEY,
+        address TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, provider, cache_path: str, precision: int = 4, max_entries: int = 10000, ttl: float = 30 * 24 * 3600):
+        self.provider = provider
+        self.path = cache_path
+        self.precision = precision
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._local = threading.local()
+        self._pid = None
+        self._conn().executescript(self.SCHEMA)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    def key(self, lat: float, lon: float) -> str:
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    def _remember(self, key: str, address: str) -> None:
+        self._memory[key] = address
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def cached(self, lat: float, lon: float) -> str | None:
+        """Faqat keshdan (tarmoqqa chiqmaydi). Topilmasa ``None``, manzil noma'lum bo'lsa ``""``.
+
+        Xotiradagi kesh loopda tekshiriladi, disk keshi esa oqimda o'qiladi.
+        """
+        key = self.key(lat, lon)
+        address = self._memory.get(key)
+        if address is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return address
+        address = await asyncio.to_thread(self._load, key)
+        if address is None:
+            return None
+        self.disk_hits += 1
+        self._remember(key, address)
+        return address
+
+    def _load(self, key: str) -> str | None:
+        row = self._conn().execute(
+            "SELECT address FROM geocode_cache WHERE key = ? AND created_at >= ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    async def lookup(self, lat: float, lon: float) -> str | None:
+        """Keshdan yoki provayderdan manzil. Provayder xato bersa ``None``."""
+        address = await self.cached(lat, lon)
+        if address is not None:
+            return address
+        key = self.key(lat, lon)
+        future = self._inflight.get(key)
+        if future is None:
+            # Disk o'qilayotganda boshqa so'rov manzilni aniqlab bo'lgan bo'lishi mumkin
+            address = self._memory.get(key)
+            if address is not None:
+                return address
+            future = self._inflight[key] = asyncio.ensure_future(self._resolve(key, lat, lon))
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _resolve(self, key: str, lat: float, lon: float) -> str | None:
+        self.misses += 1
+        try:
+            address = await self.provider.reverse(round(lat, self.precision), round(lon, self.precision)) or ""
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Teskari geokodlashda xato {key}: {e}")
+            return None
+        self._remember(key, address)
+        try:
+            # Disk sekin bo'lsa ham event loop to'xtab qolmasin
+            await asyncio.to_thread(self._store, key, address)
+        except sqlite3.Error as e:
+            logger.error(f"Manzilni disk keshiga yozishda xato {key}: {e}")
+        return address
+
+    def _store(self, key: str, address: str) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO geocode_cache (key, address, created_at) VALUES (?, ?, ?)", (key, address, time.time())
+        )
+
+    def purge_expired(self) -> int:
+        return self._conn().execute("DELETE FROM geocode_cache WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+
+    async def close(self):
+        for future in list(self._inflight.values()):
+            future.cancel()
+        close = getattr(self.provider, "close", None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> dict:
+        return {
+            "memory": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,47 @@
+# Gunicorn bu faylni ishchi papkadan avtomatik o'qiydi.
+# Prometheus metrikalari ishchilar orasida fayllar orqali yig'iladi (metrics.py).
+import importlib
+import os
+import shutil
+import tempfile
+import time
+
+# prometheus_client import qilinishidan oldin o'rnatilishi kerak, aks holda ishchilar oddiy rejimga tushadi
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "makburgers-metrics"))
+
+# Og'ir kutubxonalar masterda bir marta import qilinadi: ishchilar ularni fork orqali tayyor
+# holda oladi va faqat bot.py ning o'zini yuklaydi. Ilova (bot.py) masterda yuklanmaydi -
+# ulanishlar, oqimlar va event loop obyektlari har ishchida alohida yaratiladi.
+# httpcore va anyio backendini httpx birinchi mijoz/so'rovda yuklaydi (~130 ms ishchi boshiga).
+PRELOAD_MODULES = (
+    "quart", "telegram", "telegram.ext", "httpx", "httpcore", "anyio._backends._asyncio",
+    "prometheus_client", "orjson", "dotenv",
+)
+
+
+def on_starting(server):
+    """Oldingi ishga tushirishdan qolgan metrika fayllarini tozalash va kutubxonalarni oldindan yuklash."""
+    # Ishchilar meros oladi: qayta tug'ilgan ishchi webhookni qayta o'rnatmaydi (leader.py)
+    os.environ["BOT_BOOT_ID"] = f"{os.getpid()}-{int(time.time())}"
+    # Ishchilar soni: global tezlik cheklovi ular orasida teng bo'linadi (ratelimit.py)
+    os.environ["BOT_WORKERS"] = str(server.cfg.workers)
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning(f"{name} oldindan yuklanmadi: {e}")
+
+
+def post_fork(server, worker):
+    """Ishchi boshlangan vaqt: bot.py ishga tushish bosqichlarini shundan o'lchaydi (/stats)."""
+    os.environ["BOT_WORKER_STARTED_AT"] = str(time.time())
+
+
+def child_exit(server, worker):
+    """To'xtagan ishchining metrika fayllarini belgilash."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,181 @@
+"""Bot API uchun umumiy, sozlangan HTTP mijoz.
+
+Har bir ishchida bitta ``BotHTTPClient`` bor va barcha chiqish chaqiruvlari
+(handlerlar, outbox, webhook o'rnatish) shu ulanishlar hovuzidan foydalanadi:
+
+* bir vaqtda ketayotgan so'rovlar soni hovuz hajmi bilan cheklanadi, qolganlari
+  ``asyncio.Semaphore`` da navbat kutadi. httpcore hovuzi har bir hodisada
+  navbatdagi barcha so'rovlarni barcha ulanishlar bilan solishtiradi (kvadratik),
+  shuning uchun tushlik to'lqinida 256 ta ulanishli hovuz 16 talikdan sekinroq
+  ishlaydi (50 ms kechikishli stubda 200 ta tahrir: ~2 s va ~0.75 s, CPU 5 barobar);
+* keep-alive ulanishlar soni hovuz hajmiga teng - to'lqinlar orasida
+  ulanishlar yopilib, qayta ochilmaydi;
+* HTTP/2 ixtiyoriy: ``h2`` o'rnatilgan bo'lsa TLS (ALPN) orqali kelishiladi,
+  oddiy ``http://`` (lokal stub, o'z Bot API serveri) HTTP/1.1 da qoladi;
+* o'qish vaqti chegarasi metod turiga qarab: callback javoblari tez tugashi
+  kerak, xabar yuborish esa biroz ko'proq kutishi mumkin. Chaqiruvchi vaqtni
+  o'zi bergan bo'lsa (masalan ``get_updates``) o'zgartirilmaydi;
+* TLS sertifikatlari (certifi) ishchida bir marta yuklanadi va barcha
+  mijozlar bitta SSL kontekstini ishlatadi (har mijoz uchun ~40 ms tejaladi);
+* har bir so'rov yangi ulanish ochdimi yoki mavjudini qayta ishlatdimi -
+  httpcore ``trace`` kengaytmasi orqali ``bot_http_connections_total`` ga yoziladi.
+"""
+
+import asyncio
+import logging
+import ssl
+
+import httpx
+
+from metrics import HTTP_CONNECTIONS, InstrumentedRequest
+
+logger = logging.getLogger(__name__)
+
+# Metod turlari: callback javoblari, mavjud xabarni o'zgartirish, yangi xabar yuborish
+ANSWER_METHODS = ("answerCallbackQuery", "answerInlineQuery")
+EDIT_PREFIXES = ("editMessage", "deleteMessage")
+SEND_PREFIXES = ("send", "copyMessage", "forwardMessage")
+
+
+def method_class(api_method: str) -> str:
+    """"editMessageText" -> "edit"."""
+    if api_method in ANSWER_METHODS:
+        return "answer"
+    if api_method.startswith(EDIT_PREFIXES):
+        return "edit"
+    if api_method.startswith(SEND_PREFIXES):
+        return "send"
+    return "default"
+
+
+_ssl_context = None
+
+
+def shared_ssl_context() -> ssl.SSLContext:
+    """Ishchidagi barcha httpx mijozlari uchun umumiy SSL konteksti."""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ConnectionTrace:
+    """Bitta so'rov uchun httpcore hodisalari: ulanish shu so'rov uchun ochildimi."""
+
+    __slots__ = ("client", "opened")
+
+    def __init__(self, client):
+        self.client = client
+        self.opened = False
+
+    async def __call__(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.opened = True
+        elif event.endswith(".send_request_headers.started"):
+            self.client._count("new" if self.opened else "reused")
+
+
+class BotHTTPClient(InstrumentedRequest):
+    """Hovuz, keep-alive va metod turiga qarab vaqt chegaralari sozlangan HTTPXRequest.
+
+    ``pool_size``: ulanishlar va bir vaqtdagi so'rovlar soni (ishchi uchun).
+    ``keepalive``: to'lqinlar orasida ochiq qoladigan ulanishlar (standart - ``pool_size``).
+    ``timeouts``: {"answer" | "edit" | "send" | "default": o'qish chegarasi, soniya}.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        keepalive: int | None = None,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeouts: dict | None = None,
+        connect_timeout: float = 5.0,
+        write_timeout: float = 5.0,
+        media_write_timeout: float = 20.0,
+    ):
+        if http2 and not http2_available():
+            logger.warning("HTTP/2 so'ralgan, lekin h2 o'rnatilmagan - HTTP/1.1 ishlatiladi (pip install 'httpx[http2]')")
+            http2 = False
+        self.timeouts = {"answer": 3.0, "edit": 5.0, "send": 10.0, "default": 5.0, **(timeouts or {})}
+        self.pool_size = pool_size
+        self.keepalive = pool_size if keepalive is None else keepalive
+        self.http2 = http2
+        self.counts = {"new": 0, "reused": 0}
+        self._read_timeouts = {}
+        self._metrics = {kind: HTTP_CONNECTIONS.labels(kind) for kind in self.counts}
+        self._slots = asyncio.Semaphore(pool_size)
+        self.waiting = 0
+        super().__init__(
+            connection_pool_size=pool_size,
+            read_timeout=self.timeouts["default"],
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            media_write_timeout=media_write_timeout,
+            httpx_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=self.keepalive,
+                    keepalive_expiry=keepalive_expiry,
+                ),
+                # http1 ham yoqiq: HTTP/2 faqat server ALPN da taklif qilsa ishlatiladi
+                "http1": True,
+                "http2": http2,
+                "verify": shared_ssl_context(),
+                "event_hooks": {"request": [self._attach_trace]},
+            },
+        )
+
+    async def _attach_trace(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = _ConnectionTrace(self)
+
+    def _count(self, kind: str) -> None:
+        self.counts[kind] += 1
+        self._metrics[kind].inc()
+
+    def read_timeout_for(self, api_method: str) -> float:
+        timeout = self._read_timeouts.get(api_method)
+        if timeout is None:
+            timeout = self._read_timeouts[api_method] = self.timeouts[method_class(api_method)]
+        return timeout
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        if read_timeout is self.DEFAULT_NONE:
+            read_timeout = self.read_timeout_for(url.rsplit("/", 1)[-1])
+        if self._slots.locked():
+            # Hovuz band: httpcore ichida emas, shu yerda navbat kutamiz
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        try:
+            return await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        total = self.counts["new"] + self.counts["reused"]
+        return {
+            "pool_size": self.pool_size,
+            "keepalive": self.keepalive,
+            "http2": self.http2,
+            "waiting": self.waiting,
+            "connections_opened": self.counts["new"],
+            "requests_reused": self.counts["reused"],
+            "reuse_ratio": round(self.counts["reused"] / total, 3) if total else None,
+        }
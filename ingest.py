@@ -0,0 +1,75 @@
+"""Webhook yangilanishlarini tez qabul qilish.
+
+* So'rov tanasi xom baytlardan ``orjson`` bilan o'qiladi (o'rnatilmagan
+  bo'lsa standart ``json``).
+* Ma'lumot tugmalari (``ignore``) ``Update`` obyekti yaratilmasdan shu yerning
+  o'zida javoblanadi - ular holatni o'zgartirmaydi.
+* Callback tugmalari ``CallbackRouter`` orqali lug'atdan topiladi: har bir
+  bosishda o'nlab regexlarni ketma-ket tekshirish o'rniga bitta ``dict.get``.
+"""
+
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import BaseHandler
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson ixtiyoriy
+    import json
+
+    loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Javobi kutilmaydigan fon vazifalari (GC yig'ib ketmasligi uchun havola saqlanadi)
+_background = set()
+
+
+def spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def trivial_callback_id(data: dict) -> str | None:
+    """Yangilanish ``ignore`` tugmasi bo'lsa callback_query id sini qaytaradi."""
+    query = data.get("callback_query")
+    if query is not None and query.get("data") == "ignore":
+        return query["id"]
+    return None
+
+
+def route_key(data: str) -> str:
+    """"qty_inc:item_h" -> "qty_inc"."""
+    return data.partition(":")[0]
+
+
+class CallbackRouter(BaseHandler):
+    """Callback tugmalarini ``callback_data`` bo'yicha lug'atdan yo'naltiradi.
+
+    ``routes``: {to'liq qiymat yoki ":" gacha prefiks: callback}. Avval
+    to'liq qiymat (masalan ``"cart:view"``), keyin prefiks (``"cat"``) qidiriladi.
+    """
+
+    def __init__(self, routes: dict, block: bool = True):
+        super().__init__(self._dispatch, block=block)
+        self.routes = routes
+
+    def check_update(self, update: object):
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return None
+        routes = self.routes
+        return routes.get(data) or routes.get(route_key(data))
+
+    async def handle_update(self, update, application, check_result, context):
+        return await check_result(update, context)
+
+    async def _dispatch(self, update, context):  # pragma: no cover - handle_update chetlab o'tadi
+        raise RuntimeError("CallbackRouter.handle_update ishlatilishi kerak")
@@ -0,0 +1,102 @@
+"""Jarayon ichidagi foydalanuvchi holatini davriy tozalash.
+
+Bot haftalab to'xtovsiz ishlaganda har bir ishchida foydalanuvchilar soniga
+qarab o'sadigan tuzilmalar bor: ``Cart`` keshi, ``MemoryBackend`` savatchalari
+va PTB ning ``context.user_data`` / ``chat_data`` lug'atlari. ``Janitor`` ularni
+belgilangan oraliqda tozalaydi, ``ActivityTracker`` esa qaysi foydalanuvchi
+qachon oxirgi marta yozganini kuzatadi.
+"""
+
+import asyncio
+import logging
+import os
+import resource
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes() -> int:
+    """Jarayonning joriy rezident xotirasi (Linux'da /proc, boshqa joyda eng yuqori qiymat)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ActivityTracker:
+    """Foydalanuvchilarning oxirgi faolligi; eng uzoq jim turgani boshida."""
+
+    def __init__(self):
+        self._seen = OrderedDict()
+
+    def touch(self, user_id: int) -> None:
+        self._seen[user_id] = time.monotonic()
+        self._seen.move_to_end(user_id)
+
+    def pop_idle(self, idle_seconds: float) -> list:
+        """``idle_seconds`` dan beri jim turgan foydalanuvchilarni ro'yxatdan olib qaytaradi."""
+        deadline = time.monotonic() - idle_seconds
+        idle = []
+        while self._seen:
+            user_id, seen = next(iter(self._seen.items()))
+            if seen >= deadline:
+                break
+            self._seen.popitem(last=False)
+            idle.append(user_id)
+        return idle
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class Janitor:
+    """Ro'yxatdan o'tgan tozalash vazifalarini o'z oraliqlarida bajaradi."""
+
+    def __init__(self, tick: float = 30.0):
+        self.tick = tick
+        self._jobs = []
+        self._task = None
+        self.results = {}
+
+    def add(self, name: str, fn, interval: float, in_thread: bool = False) -> None:
+        """``fn()`` har ``interval`` soniyada chaqiriladi; qaytargan soni ``results`` ga yig'iladi.
+
+        ``in_thread=True`` - diskka murojaat qiladigan vazifalar event loop'dan tashqarida bajariladi.
+        """
+        if interval > 0:
+            self._jobs.append([name, fn, interval, in_thread, time.monotonic() + interval])
+            self.results[name] = 0
+
+    def start(self):
+        if self._jobs and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="janitor")
+
+    async def run_due(self) -> None:
+        now = time.monotonic()
+        for job in self._jobs:
+            name, fn, interval, in_thread, due = job
+            if now < due:
+                continue
+            job[4] = now + interval
+            try:
+                removed = await asyncio.to_thread(fn) if in_thread else fn()
+            except Exception as e:
+                logger.error(f"Tozalash vazifasi {name} xato bilan tugadi: {e}")
+                continue
+            self.results[name] += removed or 0
+            if removed:
+                logger.info(f"Tozalash: {name} - {removed} ta yozuv")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.run_due()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,186 @@
+"""Foydalanuvchilarni faylga saqlash: append-only jurnal + davriy siqish (compaction).
+
+Har bir yangi ro'yxatdan o'tish butun JSON faylni qayta yozmaydi - jurnal
+fayliga bitta qator qo'shiladi. Jurnal katta bo'lib ketganda u asosiy
+snapshot faylga (``user_data_cache.json``) birlashtiriladi va tozalanadi.
+Diskka yozish event loop'dan tashqarida, fon yozuvchi orqali bajariladi.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """Elementlarni navbatga yig'ib, ``flush_fn(batch)`` ni alohida oqimda chaqiradi.
+
+    ``submit()`` darhol qaytadi, yozish esa ``max_batch`` ta element yoki
+    ``max_delay`` soniyadan keyin paket bo'lib bajariladi.
+    """
+
+    def __init__(self, flush_fn, max_batch: int = 500, max_delay: float = 0.05, name: str = "writer"):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.name = name
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=self.name)
+
+    def submit(self, item) -> None:
+        """Elementni yozish navbatiga qo'shadi (bloklamaydi)."""
+        self._ensure_started()
+        self._queue.put_nowait(item)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch):
+        try:
+            await asyncio.to_thread(self.flush_fn, batch)
+        except Exception as e:
+            logger.error(f"{self.name}: {len(batch)} ta elementni yozishda xato: {e}")
+
+    async def close(self):
+        """Navbatdagi barcha elementlarni yozib, fon vazifasini to'xtatadi."""
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(_STOP)
+            await self._task
+        self._task = None
+
+
+class UserJournal:
+    """``snapshot`` JSON fayl + ``snapshot.journal`` (har qatorda bitta foydalanuvchi).
+
+    Bir nechta ishchi jarayon bir vaqtda yozishi mumkin: qator qo'shish umumiy
+    (shared) qulf bilan, siqish esa eksklyuziv qulf bilan bajariladi.
+    """
+
+    def __init__(self, snapshot_path: str, fsync_interval: float = 0.0, compact_bytes: int = 4 * 1024 * 1024,
+                 max_batch: int = 500, max_delay: float = 0.05):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + ".journal"
+        self.lock_path = snapshot_path + ".lock"
+        # 0 - har paketdan keyin fsync, > 0 - ko'pi bilan shu oraliqda bir marta, < 0 - hech qachon
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self._last_fsync = 0.0
+        self.writer = BackgroundWriter(self._write_batch, max_batch=max_batch, max_delay=max_delay, name="user-journal")
+
+    @contextmanager
+    def _locked(self, mode):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def exclusive(self):
+        """Eksklyuziv qulf (siqish bilan bir xil): masalan, fayllarni bitta ishchi import qilishi uchun."""
+        return self._locked(fcntl.LOCK_EX)
+
+    def append(self, user_info: dict) -> None:
+        """Foydalanuvchini jurnalga yozish uchun navbatga qo'yadi. O(1), bloklamaydi."""
+        self.writer.submit(user_info)
+
+    def _write_batch(self, batch):
+        data = "".join(json.dumps(info, ensure_ascii=False) + "\n" for info in batch).encode("utf-8")
+        with self._locked(fcntl.LOCK_SH):
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                now = time.monotonic()
+                if self.fsync_interval == 0 or (self.fsync_interval > 0 and now - self._last_fsync >= self.fsync_interval):
+                    os.fsync(fd)
+                    self._last_fsync = now
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        if size >= self.compact_bytes:
+            self.compact()
+
+    def load(self) -> dict:
+        """Snapshotni o'qiydi va ustiga jurnalni qayta o'ynaydi: {user_id: info}."""
+        users = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                users = {int(k): v for k, v in json.load(f).items()}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        info = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Oxirgi qator yarim yozilgan bo'lishi mumkin (masalan, jarayon o'ldirilganda)
+                        continue
+                    users[int(info["id"])] = info
+        return users
+
+    def signature(self) -> str:
+        """Snapshot va jurnal fayllarining o'lchami va o'zgarish vaqti. Fayllar o'zgarmagan bo'lsa bir xil."""
+        parts = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+                parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+            except FileNotFoundError:
+                parts.append("-")
+        return "|".join(parts)
+
+    def compact(self) -> int:
+        """Jurnalni snapshotga birlashtiradi va jurnalni tozalaydi. Foydalanuvchilar sonini qaytaradi."""
+        with self._locked(fcntl.LOCK_EX):
+            # Boshqa ishchi allaqachon siqqan bo'lishi mumkin
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) == 0:
+                return -1
+            users = self.load()
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(users, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            with open(self.journal_path, "w"):
+                pass
+        logger.info(f"Foydalanuvchilar jurnali siqildi. Jami: {len(users)}")
+        return len(users)
+
+    async def close(self):
+        await self.writer.close()
@@ -0,0 +1,81 @@
+"""Menyu klaviaturalari uchun oldindan hisoblangan kesh.
+
+``MENU`` o'zgarmaguncha kategoriyalar klaviaturasi, mahsulot nomi/narxi
+qatorlari va ➖/➕ tugmalari bir xil bo'ladi. Ular bir marta yaratiladi,
+so'rov vaqtida esa faqat mahsulot soni ko'rsatilgan katakchalar qo'yiladi.
+PTB obyektlari o'zgarmas (immutable), shuning uchun ularni so'rovlar orasida
+bemalol qayta ishlatish mumkin.
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+def format_price(price: int) -> str:
+    """15000 -> "15 000"."""
+    return f"{price:,}".replace(",", " ")
+
+
+class MenuRenderCache:
+    """Kategoriya va mahsulot klaviaturalarining statik qismlarini saqlaydi."""
+
+    # Shu songacha bo'lgan "soni" tugmalari ham keshlanadi
+    MAX_CACHED_COUNT = 100
+
+    def __init__(self, menu: dict, item_index: dict):
+        self.rebuild(menu, item_index)
+
+    def rebuild(self, menu: dict, item_index: dict) -> None:
+        """Menyu o'zgarganda butun keshni qayta quradi. ``item_index``: {item_id: savatchadagi indeks}."""
+        self.item_index = item_index
+        self.version = getattr(self, "version", 0) + 1
+        buttons = [[InlineKeyboardButton(f"🍱 {cat}", callback_data=f"cat:{cat}")] for cat in menu.keys()]
+        buttons.append([InlineKeyboardButton("🛒 Savatcha | Tasdiqlash", callback_data="cart:view")])
+        self.categories_markup = InlineKeyboardMarkup(buttons)
+        self.back_row = (InlineKeyboardButton("⬅️ Barcha kategoriyalar", callback_data="back:categories"),)
+        self._count_buttons = [InlineKeyboardButton(f" {n} ", callback_data="ignore") for n in range(self.MAX_CACHED_COUNT)]
+        self._category_rows = {}
+        for category_name, items in menu.items():
+            self.rebuild_category(category_name, items)
+
+    def rebuild_category(self, category_name: str, items: dict) -> None:
+        """Bitta kategoriyaning statik qatorlarini qayta quradi."""
+        self._category_rows[category_name] = [
+            (
+                self.item_index[item_id],
+                (InlineKeyboardButton(f"{name} - {format_price(price)} so'm", callback_data="ignore"),),
+                InlineKeyboardButton("➖", callback_data=f"qty_dec:{item_id}"),
+                InlineKeyboardButton("➕", callback_data=f"qty_inc:{item_id}"),
+            )
+            for item_id, (name, price) in items.items()
+        ]
+
+    def drop_category(self, category_name: str) -> None:
+        self._category_rows.pop(category_name, None)
+
+    def update(self, menu: dict, item_index: dict, changed: list) -> None:
+        """Katalog yangilanganda faqat ``changed`` kategoriyalarni qayta quradi.
+
+        Kategoriyalar ro'yxati (yoki tartibi) o'zgargan bo'lsa butun kesh qayta quriladi.
+        """
+        if list(menu) != list(self._category_rows):
+            self.rebuild(menu, item_index)
+            return
+        self.item_index = item_index
+        self.version += 1
+        for category_name in changed:
+            self.rebuild_category(category_name, menu[category_name])
+
+    def count_button(self, count: int) -> InlineKeyboardButton:
+        if 0 <= count < self.MAX_CACHED_COUNT:
+            return self._count_buttons[count]
+        return InlineKeyboardButton(f" {count} ", callback_data="ignore")
+
+    def item_markup(self, category_name: str, counts: dict) -> InlineKeyboardMarkup:
+        """Kategoriya mahsulotlari klaviaturasi: statik qatorlar + joriy sonlar ({indeks: soni})."""
+        rows = []
+        count_button = self.count_button
+        for index, label_row, dec_button, inc_button in self._category_rows[category_name]:
+            rows.append(label_row)
+            rows.append((dec_button, count_button(counts.get(index, 0)), inc_button))
+        rows.append(self.back_row)
+        return InlineKeyboardMarkup(rows)
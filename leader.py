@@ -0,0 +1,87 @@
+"""Gunicorn ishchilari orasida yetakchi (leader) tanlash.
+
+Har bir ishchi ishga tushganda faylga ``flock`` bilan bloklanmaydigan qulf
+qo'yishga urinadi. Qulfni olgan bitta jarayon yetakchi bo'ladi va faqat u
+bir martalik ishlarni bajaradi (webhook o'rnatish, adminga xabar, outbox
+jo'natuvchi). Qolganlari kutmasdan so'rovlarni qabul qilishga o'tadi.
+
+Qulf jarayon tirik ekan ushlab turiladi; yetakchi o'lsa OS qulfni bo'shatadi
+va boshqa ishchilardan biri ``retry_interval`` ichida o'rnini egallaydi.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def boot_id() -> str:
+    """Joriy ishga tushirish (gunicorn master) identifikatori.
+
+    ``gunicorn.conf.py`` ``BOT_BOOT_ID`` ni masterda o'rnatadi; ishchilar uni
+    meros oladi. Ishchi qayta tug'ilsa ham qiymat o'zgarmaydi.
+    """
+    return os.environ.get("BOT_BOOT_ID") or f"ppid-{os.getppid()}"
+
+
+class LeaderLock:
+    """Fayl qulfi orqali yetakchilik."""
+
+    def __init__(self, path: str, retry_interval: float = 5.0):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._fd = None
+        self._task = None
+
+    def try_acquire(self) -> bool:
+        """Qulfni kutmasdan olishga urinadi."""
+        if self.is_leader:
+            return True
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # Kim yetakchi ekanini ko'rish uchun faylga pid yoziladi
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, str(os.getpid()).encode(), 0)
+        self.is_leader = True
+        return True
+
+    def watch(self, on_elected) -> None:
+        """Qulfni fonda kutadi va olingach ``on_elected()`` ni chaqiradi.
+
+        Qulf allaqachon olingan bo'lsa ``on_elected()`` darhol fonda ishga
+        tushadi - ishchi yetakchi ishlarini kutmasdan so'rov qabul qiladi.
+        """
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._watch(on_elected), name="leader-watch")
+
+    async def _watch(self, on_elected):
+        while not self.try_acquire():
+            await asyncio.sleep(self.retry_interval)
+        logger.info(f"Ishchi {os.getpid()} yetakchilikni oldi")
+        try:
+            await on_elected()
+        except Exception as e:
+            logger.error(f"Yetakchi vazifalarini ishga tushirishda xato: {e}")
+
+    async def stop_watch(self) -> None:
+        """Qulf kutish yoki yarim qolgan ``on_elected()`` ni to'xtatadi (qulf qo'lda qoladi)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def release(self) -> None:
+        await self.stop_watch()
+        if self._fd is not None:
+            # Faylni yopish qulfni ham bo'shatadi
+            os.close(self._fd)
+            self._fd = None
+        self.is_leader = False
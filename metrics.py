@@ -0,0 +1,127 @@
+"""Prometheus metrikalari va handlerlar vaqtini o'lchash.
+
+Gunicorn bir nechta ishchi ishga tushirgani uchun ``PROMETHEUS_MULTIPROC_DIR``
+o'rnatilgan bo'lsa metrikalar ishchilar orasida fayllar orqali yig'iladi
+(``gunicorn.conf.py`` uni avtomatik sozlaydi). ``/metrics`` so'rovi qaysi
+ishchiga tushishidan qat'i nazar barcha ishchilar yig'indisini qaytaradi.
+
+Issiq yo'ldagi qo'shimcha xarajat: bitta ``perf_counter`` juftligi va oldindan
+tayyorlangan label obyektiga ``observe()``.
+"""
+
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from telegram.ext import ApplicationHandlerStop
+from telegram.request import HTTPXRequest
+
+# Telegram handlerlari odatda millisekundlarda ishlaydi
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Handler bajarilish vaqti", ["handler"], buckets=LATENCY_BUCKETS)
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlerdagi xatolar soni", ["handler"])
+API_CALLS = Counter("bot_api_calls_total", "Bot API chaqiruvlari", ["method", "status"])
+API_LATENCY = Histogram("bot_api_call_seconds", "Bot API chaqiruvi vaqti", ["method"], buckets=LATENCY_BUCKETS)
+ORDERS = Counter("bot_orders_total", "Qabul qilingan buyurtmalar", ["delivery_type"])
+ORDERS_ROUTED = Counter("bot_orders_routed_total", "Filiallarga yo'naltirilgan buyurtmalar", ["branch"])
+ORDERS_FAILED = Counter("bot_orders_failed_total", "Filial chatiga yetkazilmay qolgan buyurtmalar")
+RATE_LIMITED = Counter("bot_updates_rate_limited_total", "Tezlik cheklovi sabab tashlangan yangilanishlar", ["kind", "scope"])
+INGEST_SHORTCUTS = Counter("bot_ingest_shortcut_total", "Update yaratilmasdan javob berilgan yangilanishlar", ["kind"])
+HTTP_CONNECTIONS = Counter("bot_http_connections_total", "Bot API so'rovlari: yangi ochilgan yoki qayta ishlatilgan ulanish", ["kind"])
+EDITS = Counter("bot_message_edits_total", "Xabar tahrirlari: yuborilgan yoki ko'rinish o'zgarmagani uchun o'tkazib yuborilgan", ["result"])
+EVICTIONS = Counter("bot_evictions_total", "Xotiradan chiqarilgan yozuvlar", ["kind"])
+# Ishchi bo'yicha o'lchamlar: "all" - har bir ishchi alohida (pid label), "livesum" - tirik ishchilar yig'indisi
+WORKER_RSS = Gauge("bot_worker_rss_bytes", "Ishchining rezident xotirasi", multiprocess_mode="all")
+CART_CACHE_SIZE = Gauge("bot_cart_cache_size", "Ishchilardagi Cart keshi hajmi", multiprocess_mode="livesum")
+USER_DATA_SIZE = Gauge("bot_user_data_entries", "Ishchilardagi context.user_data yozuvlari", multiprocess_mode="livesum")
+STARTUP = Histogram(
+    "bot_worker_startup_seconds", "Ishchining ishga tushish vaqti (so'rov qabul qilishgacha)", ["role"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+def instrument(name: str, callback):
+    """Handlerni vaqt va xatolarni o'lchaydigan o'ram bilan qaytaradi."""
+    latency = HANDLER_LATENCY.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            # Xato emas: masalan tezlik cheklovi yangilanishni keyingi handlerlarga o'tkazmaydi
+            raise
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """Har bir Bot API chaqiruvini metod bo'yicha sanaydigan HTTPXRequest."""
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        status = "error"
+        try:
+            code, payload = await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+            status = str(code)
+            return code, payload
+        finally:
+            API_LATENCY.labels(api_method).observe(time.perf_counter() - start)
+            API_CALLS.labels(api_method, status).inc()
+
+
+class StateCollector:
+    """Umumiy holatdan olinadigan o'lchamlar (faol savatchalar, foydalanuvchilar).
+
+    Qiymatlar so'rov vaqtida backenddan o'qiladi, shuning uchun barcha
+    ishchilar uchun bir xil bo'ladi.
+    """
+
+    def __init__(self, gauges):
+        # gauges: {nomi: (tavsif, funksiya)}
+        self.gauges = gauges
+
+    def collect(self):
+        for name, (documentation, fn) in self.gauges.items():
+            yield GaugeMetricFamily(name, documentation, value=fn())
+
+
+def build_registry(collectors=()) -> CollectorRegistry:
+    """Ko'p jarayonli rejimda barcha ishchilar metrikalarini yig'adigan registry."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    for collector in collectors:
+        registry.register(collector)
+    return registry
+
+
+def render(registry) -> tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,190 @@
+"""Buyurtmalar tarixi: lokal SQLite'dagi indekslangan ombor.
+
+Tasdiqlangan har bir buyurtma ``orders`` jadvaliga yoziladi, shu tranzaksiyada
+kunlik yig'indilar (``daily_stats``, ``daily_item_stats``) ham yangilanadi.
+Admin so'rovlari shu yig'indilar va indekslar bo'yicha ishlaydi, shuning uchun
+millionlab buyurtmadan keyin ham jadvalni to'liq o'qimaydi:
+
+* bugungi buyurtmalar - ``orders (day, id)`` indeksi;
+* mahsulot/kategoriya bo'yicha tushum - ``daily_item_stats`` (kun x mahsulot qatorlari);
+* foydalanuvchining oxirgi N ta buyurtmasi - ``orders (user_id, id)`` indeksi.
+
+Yozish event loop'da emas: ``BackgroundWriter`` buyurtmalarni paketlab alohida
+oqimda yozadi. Buyurtma kaliti (outbox bilan bir xil) takroriy yozuvni oldini oladi.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from journal import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+
+def local_timezone(name: str):
+    """Kunlar shu vaqt zonasida hisoblanadi. Zona bazasi topilmasa UTC."""
+    try:
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo(name)
+    except Exception as e:
+        logger.warning(f"Vaqt zonasi {name} topilmadi, UTC ishlatiladi: {e}")
+        return timezone.utc
+
+
+class OrderStore:
+    """Buyurtmalar va kunlik yig'indilar."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY,
+        order_key TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        day TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        delivery_type TEXT NOT NULL,
+        latitude REAL,
+        longitude REAL,
+        items TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, id);
+    CREATE INDEX IF NOT EXISTS orders_day ON orders (day, id);
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,
+        orders INTEGER NOT NULL,
+        revenue INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS daily_item_stats (
+        day TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue INTEGER NOT NULL,
+        PRIMARY KEY (day, item_id)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str, tz=None):
+        self.path = path
+        self.tz = tz
+        self._local = threading.local()
+        self._pid = None
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    def day(self, ts: float | None = None) -> str:
+        """Vaqt belgisi -> "YYYY-MM-DD" (mahalliy kun)."""
+        return datetime.fromtimestamp(time.time() if ts is None else ts, self.tz).strftime("%Y-%m-%d")
+
+    def write_batch(self, orders: list) -> None:
+        """Buyurtmalarni bitta tranzaksiyada yozadi.
+
+        Har bir buyurtma: {"order_key", "user_id", "created_at", "total",
+        "delivery_type", "location": (lat, lon) | None,
+        "items": [(item_id, nomi, kategoriya, narxi, soni), ...]}.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for order in orders:
+                day = self.day(order["created_at"])
+                lat, lon = order.get("location") or (None, None)
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO orders (order_key, user_id, created_at, day, total, delivery_type, latitude, longitude, items) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (order["order_key"], order["user_id"], order["created_at"], day, order["total"],
+                     order["delivery_type"], lat, lon, json.dumps(order["items"], ensure_ascii=False)),
+                )
+                if cur.rowcount == 0:
+                    # Takroriy buyurtma - yig'indilarga qayta qo'shilmaydi
+                    continue
+                conn.execute(
+                    "INSERT INTO daily_stats (day, orders, revenue) VALUES (?, 1, ?) "
+                    "ON CONFLICT (day) DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue",
+                    (day, order["total"]),
+                )
+                conn.executemany(
+                    "INSERT INTO daily_item_stats (day, item_id, name, category, quantity, revenue) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (day, item_id) DO UPDATE SET name = excluded.name, category = excluded.category, "
+                    "quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue",
+                    ((day, item_id, name, category, count, price * count) for item_id, name, category, price, count in order["items"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def day_summary(self, day: str) -> tuple[int, int]:
+        """(buyurtmalar soni, tushum) - kunlik yig'indidan."""
+        row = self._conn().execute("SELECT orders, revenue FROM daily_stats WHERE day = ?", (day,)).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    def orders_for_day(self, day: str, limit: int = 20) -> list:
+        """Kunning oxirgi buyurtmalari (yangilari birinchi)."""
+        return self._conn().execute(
+            "SELECT id, user_id, created_at, total, delivery_type FROM orders WHERE day = ? ORDER BY id DESC LIMIT ?",
+            (day, limit),
+        ).fetchall()
+
+    def revenue_by_item(self, since_day: str, until_day: str, limit: int = 20) -> list:
+        """[(nomi, kategoriya, soni, tushum), ...] tushum bo'yicha kamayish tartibida."""
+        return self._conn().execute(
+            "SELECT name, category, SUM(quantity), SUM(revenue) FROM daily_item_stats WHERE day BETWEEN ? AND ? "
+            "GROUP BY item_id ORDER BY SUM(revenue) DESC LIMIT ?",
+            (since_day, until_day, limit),
+        ).fetchall()
+
+    def revenue_by_category(self, since_day: str, until_day: str) -> list:
+        """[(kategoriya, soni, tushum), ...]."""
+        return self._conn().execute(
+            "SELECT category, SUM(quantity), SUM(revenue) FROM daily_item_stats WHERE day BETWEEN ? AND ? "
+            "GROUP BY category ORDER BY SUM(revenue) DESC",
+            (since_day, until_day),
+        ).fetchall()
+
+    def user_orders(self, user_id: int, limit: int = 10) -> list:
+        """Foydalanuvchining oxirgi ``limit`` ta buyurtmasi: [(id, vaqt, summa, turi, mahsulotlar), ...]."""
+        rows = self._conn().execute(
+            "SELECT id, created_at, total, delivery_type, items FROM orders WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return [(order_id, created_at, total, delivery_type, json.loads(items)) for order_id, created_at, total, delivery_type, items in rows]
+
+    def days_back(self, days: int) -> tuple[str, str]:
+        """Oxirgi ``days`` kun oralig'i (bugun ham kiradi)."""
+        today = datetime.now(self.tz)
+        return (today - timedelta(days=days - 1)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+
+
+class OrderHistory:
+    """Buyurtmalarni fonda paketlab yozuvchi ``OrderStore`` o'rami."""
+
+    def __init__(self, store: OrderStore, max_batch: int = 200, max_delay: float = 0.2):
+        self.store = store
+        self._writer = BackgroundWriter(store.write_batch, max_batch=max_batch, max_delay=max_delay, name="order-history")
+
+    def record(self, order: dict) -> None:
+        """Buyurtmani yozish navbatiga qo'shadi (bloklamaydi)."""
+        self._writer.submit(order)
+
+    def pending(self) -> int:
+        return self._writer.pending()
+
+    async def close(self):
+        await self._writer.close()
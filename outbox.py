@@ -0,0 +1,349 @@
+"""Adminga yuboriladigan xabarlar uchun ishonchli navbat (outbox).
+
+Buyurtma avval lokal SQLite faylga yoziladi, mijozga tasdiq shundan keyin
+darhol ko'rsatiladi. Telegramga yuborishni fon jo'natuvchi (``OutboxSender``)
+bajaradi:
+
+* global va chat bo'yicha tezlik cheklovlariga rioya qiladi;
+* 429 (``RetryAfter``) da Telegram aytgan vaqtcha kutadi, tarmoq xatolarida
+  eksponensial kechikish bilan qayta urinadi;
+* har bir xabarning idempotentlik kaliti bor - bitta buyurtma ikki marta
+  navbatga tushmaydi, jo'natilgani esa ``sent`` deb belgilanadi;
+* bitta buyurtmaning xabarlari (matn, keyin lokatsiya) tartib bilan ketadi.
+
+Bir nechta ishchi jarayon bir faylni ishlatishi mumkin: qatorlar ``lease``
+bilan band qilinadi, shuning uchun bitta xabarni ikki jo'natuvchi olmaydi.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """``RetryAfter.retry_after`` PTB versiyasiga qarab int yoki timedelta bo'ladi."""
+    value = error.retry_after
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class TokenBucket:
+    """Oddiy asinxron token bucket: soniyasiga ``rate`` ta, ``burst`` tagacha to'planadi."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """429 kelganda barcha jo'natishlarni to'xtatib turish.
+
+        To'xtash vaqtida tokenlar to'planmaydi: aks holda pauzadan keyin darhol
+        ``burst`` ta xabar ketib, yana 429 olinadi.
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self.paused_until
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Outbox:
+    """SQLite'dagi xabarlar navbati."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY,
+        idem_key TEXT NOT NULL UNIQUE,
+        group_key TEXT NOT NULL,
+        chat_id INTEGER NOT NULL,
+        method TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_at REAL NOT NULL,
+        claimed_until REAL NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        sent_at REAL,
+        last_error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_at);
+    CREATE INDEX IF NOT EXISTS outbox_group ON outbox (group_key, id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pid = None
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    def enqueue(self, group_key: str, messages: list) -> bool:
+        """Bitta guruh (buyurtma) xabarlarini tranzaksiyada yozadi.
+
+        ``messages``: [(chat_id, method, kwargs), ...]. Guruh avval yozilgan
+        bo'lsa (takroriy bosish) hech narsa qo'shilmaydi va ``False`` qaytadi -
+        takroriy bosish boshqa chatga yo'naltirilgan bo'lsa ham.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM outbox WHERE group_key = ? LIMIT 1", (group_key,)).fetchone():
+                conn.execute("ROLLBACK")
+                return False
+            inserted = 0
+            for seq, (chat_id, method, kwargs) in enumerate(messages):
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO outbox (idem_key, group_key, chat_id, method, payload, next_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (f"{group_key}:{seq}:{chat_id}", group_key, chat_id, method, json.dumps(kwargs, ensure_ascii=False), now, now),
+                )
+                inserted += cur.rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return inserted > 0
+
+    def claim(self, limit: int, lease: float, skip_chats=()) -> list:
+        """Vaqti kelgan xabarlarni band qiladi. Guruhdagi oldingi xabar hali ketmagan bo'lsa keyingisi olinmaydi.
+
+        ``skip_chats`` - hozir jo'natilayotgan chatlar: ularning keyingi xabarlari tartib buzilmasligi uchun olinmaydi.
+        """
+        now = time.time()
+        skip = f"AND o.chat_id NOT IN ({', '.join('?' * len(skip_chats))})" if skip_chats else ""
+        return self._conn().execute(
+            f"""
+            UPDATE outbox SET status = 'sending', claimed_until = ?
+            WHERE id IN (
+                SELECT o.id FROM outbox o
+                WHERE ((o.status = 'pending' AND o.next_at <= ?) OR (o.status = 'sending' AND o.claimed_until < ?))
+                  {skip}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM outbox p
+                      WHERE p.group_key = o.group_key AND p.id < o.id AND p.status NOT IN ('sent', 'failed')
+                  )
+                ORDER BY o.id LIMIT ?
+            )
+            RETURNING id, chat_id, method, payload, attempts
+            """,
+            (now + lease, now, now, *skip_chats, limit),
+        ).fetchall()
+
+    def has_group(self, group_key: str) -> bool:
+        """Guruh allaqachon navbatga yozilganmi (takroriy bosishni yo'naltirishdan oldin aniqlash uchun)."""
+        return self._conn().execute("SELECT 1 FROM outbox WHERE group_key = ? LIMIT 1", (group_key,)).fetchone() is not None
+
+    def pending_by_chat(self) -> dict:
+        """{chat_id: hali jo'natilmagan xabarlar soni}."""
+        return dict(self._conn().execute(
+            "SELECT chat_id, COUNT(*) FROM outbox WHERE status IN ('pending', 'sending') GROUP BY chat_id"
+        ).fetchall())
+
+    def mark_sent(self, row_id: int) -> None:
+        self._conn().execute("UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?", (time.time(), row_id))
+
+    def retry_later(self, row_id: int, delay: float, error: str, count_attempt: bool = True) -> None:
+        self._conn().execute(
+            "UPDATE outbox SET status = 'pending', next_at = ?, attempts = attempts + ?, last_error = ? WHERE id = ?",
+            (time.time() + delay, 1 if count_attempt else 0, error, row_id),
+        )
+
+    def mark_failed(self, row_id: int, error: str) -> str | None:
+        """Xabarni butunlay jo'natilmagan deb belgilaydi va uning guruh kalitini qaytaradi."""
+        row = self._conn().execute(
+            "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ? RETURNING group_key",
+            (error, row_id),
+        ).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> dict:
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def purge_sent(self, older_than: float) -> int:
+        """Eski jo'natilgan xabarlarni o'chiradi."""
+        return self._conn().execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (time.time() - older_than,)).rowcount
+
+
+class OutboxSender:
+    """Outbox'dan xabarlarni olib Telegramga jo'natuvchi fon vazifa."""
+
+    def __init__(self, outbox: Outbox, bot, global_rate: float = 25.0, chat_interval: float = 1.0,
+                 max_attempts: int = 10, batch_size: int = 50, poll_interval: float = 1.0, lease: float = 60.0,
+                 on_failed=None):
+        self.outbox = outbox
+        self.bot = bot
+        self.bucket = TokenBucket(global_rate)
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        # on_failed(group_key, chat_id, error) - butunlay jo'natilmagan xabar haqida ogohlantirish uchun (oqimda chaqiriladi)
+        self.on_failed = on_failed
+        self._chat_next = {}
+        # {chat_id: vazifa} - har bir chat o'z xabarlarini alohida vazifada jo'natadi
+        self._chat_tasks = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Statistika
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="outbox-sender")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Tugallanmagan xabarlar lease tugagach qayta olinadi
+        tasks = list(self._chat_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._chat_tasks.clear()
+
+    def wake(self) -> None:
+        """Yangi xabar qo'shilganda jo'natuvchini kutmasdan uyg'otish."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            # Claim'dan oldin: shu orada bo'shagan chat yoki yangi xabar uyg'otishi yo'qolmaydi
+            self._wakeup.clear()
+            try:
+                rows = await asyncio.to_thread(self.outbox.claim, self.batch_size, self.lease, tuple(self._chat_tasks))
+            except Exception as e:
+                logger.error(f"Outbox'dan o'qishda xato: {e}")
+                rows = []
+            if rows:
+                by_chat = {}
+                for row in rows:
+                    by_chat.setdefault(row[1], []).append(row)
+                # Har bir chat o'z navbatida ketma-ket, turli chatlar esa parallel va bir-birini kutmaydi:
+                # sekin chat (chat_interval) bo'sh chatlarning keyingi xabarlarini ushlab turmaydi
+                for chat_id, chat_rows in by_chat.items():
+                    task = asyncio.create_task(self._send_chat(chat_rows))
+                    self._chat_tasks[chat_id] = task
+                    task.add_done_callback(lambda task, chat_id=chat_id: self._chat_done(chat_id, task))
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _chat_done(self, chat_id, task: asyncio.Task) -> None:
+        self._chat_tasks.pop(chat_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Chat {chat_id} xabarlarini jo'natishda xato: {task.exception()}")
+        # Chat bo'shadi - uning navbatdagi xabarlarini olish mumkin
+        self._wakeup.set()
+
+    async def _send_chat(self, rows):
+        for i, (row_id, chat_id, method, payload, attempts) in enumerate(rows):
+            wait = self._chat_next.get(chat_id, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.bucket.acquire()
+            self._chat_next[chat_id] = time.monotonic() + self.chat_interval
+            ok = await self._send_one(row_id, chat_id, method, payload, attempts)
+            if not ok:
+                # Tartib buzilmasligi uchun shu chatning qolgan xabarlari keyingi aylanishga qoladi
+                await asyncio.to_thread(self._release, rows[i + 1:])
+                return
+
+    def _release(self, rows) -> None:
+        for row in rows:
+            self.outbox.retry_later(row[0], 0, "oldingi xabar kutilmoqda", count_attempt=False)
+
+    async def _send_one(self, row_id, chat_id, method, payload, attempts) -> bool:
+        try:
+            await getattr(self.bot, method)(chat_id=chat_id, **json.loads(payload))
+        except RetryAfter as e:
+            delay = retry_after_seconds(e)
+            self.bucket.pause(delay)
+            self.retried += 1
+            logger.warning(f"Telegram 429: {delay} soniya kutamiz (xabar {row_id})")
+            await asyncio.to_thread(self.outbox.retry_later, row_id, delay, str(e), count_attempt=False)
+            return False
+        except (BadRequest, Forbidden) as e:
+            kwargs = json.loads(payload)
+            if isinstance(e, BadRequest) and "can't parse entities" in e.message.lower() and kwargs.pop("parse_mode", None):
+                # Formatlash buzilgan (masalan ismda "_"): xabar yo'qolmasin, bir marta oddiy matn sifatida yuboramiz
+                logger.warning(f"Xabar {row_id} formatlashsiz qayta yuborilmoqda (chat {chat_id}): {e}")
+                return await self._send_one(row_id, chat_id, method, json.dumps(kwargs, ensure_ascii=False), attempts)
+            # Qayta urinish foyda bermaydi
+            logger.error(f"Xabar {row_id} jo'natilmadi (chat {chat_id}): {e}")
+            await self._fail(row_id, chat_id, str(e))
+            return True
+        except Exception as e:
+            if attempts + 1 >= self.max_attempts:
+                logger.error(f"Xabar {row_id} {attempts + 1} urinishdan keyin ham jo'natilmadi: {e}")
+                await self._fail(row_id, chat_id, str(e))
+                return True
+            delay = min(300, 2 ** attempts)
+            self.retried += 1
+            logger.warning(f"Xabar {row_id} jo'natishda xato, {delay} soniyadan keyin qayta urinamiz: {e}")
+            await asyncio.to_thread(self.outbox.retry_later, row_id, delay, str(e))
+            return False
+        # Disk sekin bo'lsa ham webhook loop'i to'xtab qolmasin
+        await asyncio.to_thread(self.outbox.mark_sent, row_id)
+        self.sent += 1
+        return True
+
+    async def _fail(self, row_id, chat_id, error: str) -> None:
+        self.failed += 1
+        await asyncio.to_thread(self._mark_failed, row_id, chat_id, error)
+
+    def _mark_failed(self, row_id, chat_id, error: str) -> None:
+        group_key = self.outbox.mark_failed(row_id, error)
+        if self.on_failed is None or group_key is None:
+            return
+        try:
+            self.on_failed(group_key, chat_id, error)
+        except Exception as e:
+            logger.error(f"Xabar {row_id} yo'qolgani haqida ogohlantirishda xato: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "active_chats": len(self._chat_tasks),
+            "queue": self.outbox.counts(),
+        }
@@ -0,0 +1,183 @@
+"""PTB ``context.user_data`` ni ishchilar va qayta ishga tushirishlar orasida saqlash.
+
+Checkout holati (``current_category``, ``delivery_choice``, ``temp_location``)
+``user_data`` da turadi. Gunicorn ishchilari har biri o'z nusxasiga ega bo'lsa,
+lokatsiya bir ishchida saqlanib, tasdiqlash boshqasiga tushganda yo'qoladi.
+
+``SQLitePersistence`` PTB ning ``BasePersistence`` interfeysini umumiy SQLite
+fayl ustida amalga oshiradi:
+
+* ishga tushishda hech narsa yuklanmaydi - har bir yangilanishdan oldin
+  ``refresh_user_data`` faqat shu foydalanuvchi qatorini o'qiydi;
+* PTB faqat yangilanish kelgan foydalanuvchilar uchun ``update_user_data``
+  chaqiradi, bu yerda esa qiymat oxirgi yozilganidan farq qilsagina
+  (dirty) yozish navbatiga qo'shiladi;
+* yozish fonda, paket bo'lib, bitta tranzaksiyada bajariladi (write-behind);
+* ``drop_user_data`` faqat xotiradan chiqaradi - qator boshqa ishchilar uchun
+  qoladi, eskirgan qatorlarni ``purge_idle`` o'chiradi.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from journal import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Faqat ``user_data`` ni saqlaydigan SQLite persistence (bot_data, chat_data ishlatilmaydi)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ptb_user_data (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ptb_user_data_updated ON ptb_user_data (updated_at);
+    """
+
+    def __init__(self, path: str, update_interval: float = 0.1, max_batch: int = 500, max_delay: float = 0.02):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self._local = threading.local()
+        self._pid = None
+        self._conn().executescript(self.SCHEMA)
+        # Bu ishchi oxirgi marta yozgan/o'qigan qiymat: {user_id: json}
+        self._stored = {}
+        # Hali diskka yozilmaganlar: {user_id: json}. Fon oqimi bilan umumiy, shuning uchun qulf ostida
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._writer = BackgroundWriter(self._write_batch, max_batch=max_batch, max_delay=max_delay, name="user-data-writer")
+        self.reads = 0
+        self.writes = 0
+        self.skipped = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    def _write_batch(self, user_ids: list) -> None:
+        with self._lock:
+            rows = [(user_id, self._dirty[user_id]) for user_id in set(user_ids) if user_id in self._dirty]
+        if not rows:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO ptb_user_data (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                ((user_id, data, now) for user_id, data in rows),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            for user_id, data in rows:
+                # Yozish davomida yana o'zgargan bo'lsa keyingi paketda yoziladi
+                if self._dirty.get(user_id) == data:
+                    del self._dirty[user_id]
+        self.writes += len(rows)
+
+    # --- user_data ---
+    async def get_user_data(self) -> dict:
+        # Hammasini oldindan yuklamaymiz: har bir foydalanuvchi refresh_user_data da o'qiladi
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._dirty:
+            # Bu ishchidagi nusxa hali yozilmagan - u eng yangisi
+            return
+        row = self._conn().execute("SELECT data FROM ptb_user_data WHERE user_id = ?", (user_id,)).fetchone()
+        self.reads += 1
+        if row is None or row[0] == self._stored.get(user_id):
+            return
+        # Boshqa ishchi o'zgartirgan: joyida almashtiramiz (PTB shu lug'at obyektini ushlab turadi)
+        user_data.clear()
+        user_data.update(json.loads(row[0]))
+        self._stored[user_id] = row[0]
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        encoded = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        if self._stored.get(user_id) == encoded:
+            self.skipped += 1
+            return
+        self._stored[user_id] = encoded
+        with self._lock:
+            self._dirty[user_id] = encoded
+        self._writer.submit(user_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        # Faqat shu ishchi xotirasidan: foydalanuvchi boshqa ishchida faol bo'lishi mumkin
+        if user_id not in self._dirty:
+            self._stored.pop(user_id, None)
+
+    def purge_idle(self, idle_seconds: float) -> int:
+        """``idle_seconds`` dan beri yangilanmagan qatorlarni o'chiradi."""
+        return self._conn().execute(
+            "DELETE FROM ptb_user_data WHERE updated_at < ?", (time.time() - idle_seconds,)
+        ).rowcount
+
+    async def flush(self) -> None:
+        await self._writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._stored),
+            "dirty": len(self._dirty),
+            "reads": self.reads,
+            "writes": self.writes,
+            "skipped_unchanged": self.skipped,
+        }
+
+    # --- Ishlatilmaydigan qismlar (store_data da o'chirilgan) ---
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -0,0 +1,241 @@
+"""Foydalanuvchilar bo'yicha tezlik cheklovi (flood himoyasi).
+
+Webhookdan kelgan xom JSON ``Update`` obyektiga aylantirilishidan oldin
+tekshiriladi: yangilanish turi (``callback``, ``command``, ``message``,
+``other``) va foydalanuvchi bo'yicha token bucket, ustiga barcha
+foydalanuvchilar uchun umumiy (``global``) bucket. Cheklovdan oshgan
+yangilanish tashlab yuboriladi - Telegramga baribir 200 qaytariladi, aks
+holda u qayta yuboradi.
+
+Buyurtmani rasmiylashtirish tugmalari (``UNLIMITED_CALLBACKS``) va shu
+qadamlarda yuboriladigan lokatsiya hamda kontakt xabarlari
+(``UNLIMITED_MESSAGES``) hech qachon cheklanmaydi: ular tashlansa buyurtma
+jimgina yo'qoladi.
+
+Foydalanuvchi hisoblagichlari ishchilar orasida umumiy SQLite faylda: bitta
+UPSERT bucketni o'tgan vaqtga qarab to'ldiradi, tokenni yechadi va natijani
+qaytaradi (``RETURNING``). Baza band bo'lsa uzoq kutilmaydi (``busy_timeout``)
+va yangilanish o'tkaziladi. Rad etilgan kalit uchun ishchi token qachon
+paydo bo'lishini eslab qoladi va shu vaqtgacha bazaga murojaat qilmaydi:
+spam qilayotgan foydalanuvchining keyingi yangilanishlari lug'atdan bitta
+qidiruv bilan tashlanadi.
+
+Global bucket esa har ishchining xotirasida, ``tezlik / ishchilar soni``
+bilan: barcha yangilanishlar bitta umumiy qatorga yozish uchun navbatda
+turmaydi. U birinchi tekshiriladi; foydalanuvchi bucketi rad etsa global
+token qaytariladi.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("callback", "command", "message", "other")
+DEFAULT_LIMITS = "callback=10:60,command=1:5,message=2:10,other=2:10,global=500:1000"
+
+# Rasmiylashtirish qadamlari: tashlansa buyurtma yo'qoladi, shuning uchun cheklanmaydi
+UNLIMITED_CALLBACKS = ("checkout:", "delivery:", "pickup:", "confirm:")
+# Yetkazish lokatsiyasi va ro'yxatdan o'tishdagi telefon raqami - xuddi shu sabab bilan
+UNLIMITED_MESSAGES = ("location", "contact")
+
+# Eslab qolingan bloklar shundan oshsa muddati o'tganlari tozalanadi
+MAX_BLOCKED = 10000
+
+
+def parse_limits(spec: str) -> dict:
+    """"callback=5:20,global=300:600" -> {"callback": (5.0, 20.0), "global": (300.0, 600.0)}.
+
+    Qiymat - ``tezlik:burst`` (soniyasiga token va bucket hajmi). Tezlik 0
+    bo'lsa shu tur cheklanmaydi.
+    """
+    limits = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, value = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS and kind != "global":
+            raise ValueError(f"Noma'lum yangilanish turi: {kind} ({', '.join(KINDS)}, global)")
+        rate, _, burst = value.partition(":")
+        rate = float(rate)
+        limits[kind] = (rate, max(float(burst or rate), 1.0))
+    return limits
+
+
+def classify(data: dict) -> tuple | None:
+    """Xom yangilanish -> (tur, user_id). Foydalanuvchisi yo'q va cheklanmaydigan yangilanishlar uchun ``None``."""
+    query = data.get("callback_query")
+    if query is not None:
+        if (query.get("data") or "").startswith(UNLIMITED_CALLBACKS):
+            return None
+        return "callback", query["from"]["id"]
+    message = data.get("message")
+    if message is not None:
+        user = message.get("from")
+        if user is None:
+            return None
+        if any(key in message for key in UNLIMITED_MESSAGES):
+            return None
+        text = message.get("text")
+        return ("command" if text and text[0] == "/" else "message"), user["id"]
+    for key, value in data.items():
+        if key != "update_id" and isinstance(value, dict):
+            user = value.get("from")
+            return ("other", user["id"]) if isinstance(user, dict) else None
+    return None
+
+
+class TokenBucket:
+    """Jarayon ichidagi oddiy token bucket (global cheklov uchun)."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class RateLimiter:
+    """Token bucketlar: (tur, foydalanuvchi) - ishchilar orasida umumiy, global - har ishchida ulushi."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL,
+        allowed INTEGER NOT NULL DEFAULT 1
+    ) WITHOUT ROWID;
+    """
+
+    # SET ichidagi ifodalar eski qatordan hisoblanadi: to'ldirilgan qiymat >= 1 bo'lsa token yechiladi
+    TAKE = """
+    INSERT INTO rate_buckets (key, tokens, updated) VALUES (?1, ?2 - 1, ?3)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = MIN(?2, tokens + MAX(?3 - updated, 0) * ?4) - (MIN(?2, tokens + MAX(?3 - updated, 0) * ?4) >= 1),
+        allowed = MIN(?2, tokens + MAX(?3 - updated, 0) * ?4) >= 1,
+        updated = ?3
+    RETURNING tokens, allowed
+    """
+
+    def __init__(self, path: str, limits: dict, exempt=(), workers: int = 1, busy_timeout: float = 0.05):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        limits = {kind: limit for kind, limit in limits.items() if limit[0] > 0}
+        self.global_limit = limits.pop("global", None)
+        self.global_bucket = None
+        if self.global_limit is not None:
+            # Har ishchi umumiy cheklovning teng ulushini oladi
+            workers = max(workers, 1)
+            rate, burst = self.global_limit
+            self.global_bucket = TokenBucket(rate / workers, max(burst / workers, 1.0))
+        self.limits = limits
+        self.exempt = frozenset(exempt)
+        # kalit -> shu vaqtgacha (time.time()) token yo'q, bazaga so'ramasdan rad etiladi
+        self._blocked = {}
+        self.allowed = 0
+        self.dropped = {}
+        self.local_drops = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._pid = None
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.limits or self.global_limit)
+
+    def allow(self, kind: str, user_id: int) -> bool:
+        """Yangilanishni o'tkazish mumkinmi. Bazaga yozib bo'lmasa o'tkaziladi (fail-open)."""
+        if user_id in self.exempt:
+            return True
+        now = time.time()
+        bucket = self.global_bucket
+        if bucket is not None and not bucket.take(now):
+            self._drop(kind, "global")
+            return False
+        limit = self.limits.get(kind)
+        if limit is not None and not self._take(f"{kind}:{user_id}", limit, now):
+            # Yangilanish o'tmadi - global tokeni boshqalarga qaytadi
+            if bucket is not None:
+                bucket.refund()
+            self._drop(kind, "user")
+            return False
+        self.allowed += 1
+        return True
+
+    def _take(self, key: str, limit: tuple, now: float) -> bool:
+        until = self._blocked.get(key)
+        if until is not None:
+            if now < until:
+                self.local_drops += 1
+                return False
+            del self._blocked[key]
+        rate, burst = limit
+        try:
+            tokens, allowed = self._conn().execute(self.TAKE, (key, burst, now, rate)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Tezlik cheklovini tekshirishda xato: {e}")
+            return True
+        if allowed:
+            return True
+        if len(self._blocked) >= MAX_BLOCKED:
+            self._blocked = {k: t for k, t in self._blocked.items() if t > now}
+        self._blocked[key] = now + (1 - tokens) / rate
+        return False
+
+    def _drop(self, kind: str, scope: str) -> None:
+        self.dropped[kind] = self.dropped.get(kind, 0) + 1
+        RATE_LIMITED.labels(kind, scope).inc()
+
+    def purge(self) -> int:
+        """To'lib bo'lgan bucketlarni o'chiradi (yo'q bucket to'la bucket bilan bir xil). O'chirilganlar soni."""
+        limits = list(self.limits.values())
+        if not limits:
+            return 0
+        # Eng sekin to'ladigan bucket ham shu vaqtda to'ladi
+        refill = max(burst / rate for rate, burst in limits)
+        cur = self._conn().execute("DELETE FROM rate_buckets WHERE updated < ?", (time.time() - refill,))
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        return {
+            "limits": {kind: list(limit) for kind, limit in self.limits.items()},
+            "global": list(self.global_limit) if self.global_limit else None,
+            "global_worker_share": [self.global_bucket.rate, self.global_bucket.burst] if self.global_bucket else None,
+            "allowed": self.allowed,
+            "dropped": dict(self.dropped),
+            "local_drops": self.local_drops,
+            "blocked_keys": len(self._blocked),
+            "errors": self.errors,
+        }
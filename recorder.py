@@ -0,0 +1,122 @@
+"""Webhookka kelgan yangilanishlarni yozib borish (keyin qayta o'ynash uchun).
+
+``RECORD_UPDATES_DIR`` berilsa har bir ishchi kelgan xom JSON tanani vaqt
+belgisi bilan o'z gzip fayliga yozadi: har qatorda ``{"t": vaqt, "u": update}``.
+So'rov yo'lida faqat ``(time.time(), bytes)`` navbatga qo'yiladi - siqish va
+diskka yozish fon oqimida, paket bo'lib (``journal.BackgroundWriter``).
+Har paketdan keyin gzip oqimi ``flush`` qilinadi, jarayon o'lsa ham oxirgi
+paketgacha o'qiladi.
+
+Fayl ``max_bytes`` dan oshsa yangisi ochiladi; papkada eng yangi ``keep`` ta
+fayl qoladi (0 - hammasi). Qayta o'ynash: ``benchmarks/replay.py``.
+"""
+
+import glob
+import gzip
+import heapq
+import json
+import logging
+import os
+import time
+import zlib
+
+from journal import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+PATTERN = "updates-*.jsonl.gz"
+
+
+class UpdateRecorder:
+    """Xom yangilanishlarni siqilgan, aylanuvchi (rotating) fayllarga yozadi."""
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, keep: int = 20,
+                 compresslevel: int = 3, max_batch: int = 1000, max_delay: float = 0.5):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.compresslevel = compresslevel
+        self.recorded = 0
+        self.files = 0
+        self._raw = None
+        self._gzip = None
+        self.path = None
+        os.makedirs(directory, exist_ok=True)
+        self.writer = BackgroundWriter(self._write_batch, max_batch=max_batch, max_delay=max_delay, name="update-recorder")
+
+    def record(self, body: bytes) -> None:
+        """Xom tanani yozish navbatiga qo'yadi (bloklamaydi)."""
+        self.writer.submit((time.time(), body))
+        self.recorded += 1
+
+    def _open(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(self.directory, f"updates-{stamp}-{os.getpid()}-{self.files:04d}.jsonl.gz")
+        self._raw = open(self.path, "ab")
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="ab", compresslevel=self.compresslevel)
+        self.files += 1
+        self._prune()
+
+    def _write_batch(self, batch):
+        if self._gzip is None:
+            self._open()
+        lines = []
+        for t, body in batch:
+            if b"\n" in body:
+                # Qator formati buzilmasligi uchun (Telegram odatda ixcham JSON yuboradi)
+                body = json.dumps(json.loads(body), separators=(",", ":")).encode()
+            lines.append(b'{"t":%.6f,"u":%s}\n' % (t, body))
+        self._gzip.write(b"".join(lines))
+        self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        if self._raw.tell() >= self.max_bytes:
+            self._close_file()
+
+    def _close_file(self):
+        if self._gzip is not None:
+            self._gzip.close()
+            self._raw.close()
+            self._gzip = self._raw = None
+
+    def _prune(self):
+        # Boshqa ishchilar ham shu papkada aylantiradi: fayl allaqachon o'chirilgan bo'lishi mumkin
+        for path in sorted(glob.glob(os.path.join(self.directory, PATTERN)))[:-self.keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "file": self.path,
+            "recorded": self.recorded,
+            "pending": self.writer.pending(),
+            "files": self.files,
+        }
+
+    async def close(self):
+        await self.writer.close()
+        self._close_file()
+
+
+def _read_file(path: str):
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Oxirgi qator yarim yozilgan bo'lishi mumkin
+                    continue
+                yield record["t"], record["u"]
+    except (EOFError, zlib.error) as e:
+        # Yozuvchi to'xtatilgan bo'lsa fayl oxiri yopilmagan bo'ladi
+        logger.warning(f"{path}: fayl oxiri to'liq emas ({e}), o'qilgani ishlatiladi")
+
+
+def read_records(paths: list):
+    """Fayllardagi (vaqt, update) juftlari, barcha ishchilar bo'yicha vaqt tartibida."""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, PATTERN))) if os.path.isdir(path) else [path])
+    return heapq.merge(*(_read_file(path) for path in files), key=lambda record: record[0])
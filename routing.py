@@ -0,0 +1,148 @@
+"""Buyurtmalarni filiallar va ularning admin chatlariga taqsimlash.
+
+``branches.json`` (``BRANCHES_FILE``) dan bir marta yo'nalish jadvali
+quriladi: ``{("delivery", zona) | ("pickup", filial raqami): (nishon, ...)}``,
+nishon - ``(filial nomi, chat_id)``. Buyurtma kelganda kalit bo'yicha lug'atdan
+nomzodlar olinadi va siyosat bo'yicha bittasi tanlanadi:
+
+* ``round_robin`` - har bir kalit uchun navbat bilan (ishchi ichida);
+* ``least_pending`` - outbox'da eng kam jo'natilmagan xabari bor chat. Hisob
+  ``refresh_interval`` da bir marta bazadan yangilanadi, oraliqda esa shu
+  ishchi tanlagan buyurtmalar qo'shib boriladi.
+
+Nomzodlar soni filialdagi chatlar soni bilan cheklangan, shuning uchun
+tanlash doimiy vaqtda. Zonasi hech bir filialga yozilmagan yetkazish (yoki
+zonalar o'chirilgan bo'lsa - ``ZONES_FILE`` bo'sh, standart holat) faylda
+``delivery_fallback`` filiali berilsa o'sha filialga, aks holda barcha
+filiallar chatlari orasida taqsimlanadi. Fayl berilmasa yagona nishon -
+``ADMIN_ID`` (avvalgi xatti-harakat).
+"""
+
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("round_robin", "least_pending")
+
+
+class Branch:
+    """Filial: nomi, buyurtmalar ketadigan chatlar, yetkazadigan zonalari."""
+
+    def __init__(self, name: str, chats: list, zones: list = (), pickup: bool = True, address: str = ""):
+        if not chats:
+            raise ValueError(f"Filial {name}: kamida bitta chat bo'lishi kerak")
+        self.name = name
+        self.chats = tuple(int(chat_id) for chat_id in chats)
+        self.zones = tuple(zones)
+        self.pickup = pickup
+        self.address = address
+
+
+class OrderRouter:
+    """Oldindan qurilgan yo'nalish jadvali va nishon tanlash siyosati."""
+
+    def __init__(self, branches: list, policy: str = "round_robin", pending=None, refresh_interval: float = 2.0,
+                 delivery_fallback: str | None = None):
+        if not branches:
+            raise ValueError("Kamida bitta filial bo'lishi kerak")
+        if policy not in POLICIES:
+            raise ValueError(f"Noma'lum siyosat: {policy} ({', '.join(POLICIES)})")
+        names = [branch.name for branch in branches]
+        if delivery_fallback is not None and delivery_fallback not in names:
+            raise ValueError(f"delivery_fallback: {delivery_fallback} filiallar orasida yo'q")
+        self.delivery_fallback = delivery_fallback
+        self.branches = branches
+        self.policy = policy
+        # pending() -> {chat_id: jo'natilmagan xabarlar}; least_pending uchun
+        self._pending_source = pending
+        self.refresh_interval = refresh_interval
+        self._pending = {}
+        self._refreshed = 0.0
+        self._table = {}
+        for branch in branches:
+            targets = tuple((branch.name, chat_id) for chat_id in branch.chats)
+            for zone in branch.zones:
+                self._table[("delivery", zone)] = self._table.get(("delivery", zone), ()) + targets
+        everyone = tuple((branch.name, chat_id) for branch in branches for chat_id in branch.chats)
+        # Zonasi noma'lum yetkazish: berilgan bo'lsa bitta filialga, aks holda hammaga
+        self._table[("delivery", None)] = tuple(
+            target for target in everyone if target[0] == delivery_fallback
+        ) or everyone
+        self.pickup_branches = [index for index, branch in enumerate(branches) if branch.pickup]
+        for index in self.pickup_branches:
+            branch = branches[index]
+            self._table[("pickup", index)] = tuple((branch.name, chat_id) for chat_id in branch.chats)
+        self._table[("pickup", None)] = tuple(
+            target for index in self.pickup_branches for target in self._table[("pickup", index)]
+        ) or everyone
+        self._next = dict.fromkeys(self._table, 0)
+        self.routed = {}
+
+    @classmethod
+    def single(cls, chat_id: int) -> "OrderRouter":
+        return cls([Branch("", [chat_id])])
+
+    @classmethod
+    def from_file(cls, path: str, pending=None, refresh_interval: float = 2.0) -> "OrderRouter":
+        """branches.json: {"policy", "delivery_fallback", "branches": [{"name", "chats": [chat_id, ...], "zones": [...], "pickup", "address"}]}."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        branches = [
+            Branch(branch["name"], branch["chats"], branch.get("zones", ()), branch.get("pickup", True), branch.get("address", ""))
+            for branch in data["branches"]
+        ]
+        return cls(branches, data.get("policy", "round_robin"), pending, refresh_interval, data.get("delivery_fallback"))
+
+    @property
+    def multi_branch(self) -> bool:
+        return len(self.branches) > 1
+
+    def route(self, kind: str, key=None) -> tuple:
+        """Buyurtma uchun (filial nomi, chat_id)."""
+        if (kind, key) not in self._table:
+            key = None
+        targets = self._table[(kind, key)]
+        if len(targets) == 1:
+            target = targets[0]
+        elif self.policy == "least_pending":
+            self._refresh()
+            pending = self._pending
+            target = min(targets, key=lambda target: pending.get(target[1], 0))
+        else:
+            index = self._next[(kind, key)]
+            self._next[(kind, key)] = (index + 1) % len(targets)
+            target = targets[index]
+        chat_id = target[1]
+        self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+        self.routed[chat_id] = self.routed.get(chat_id, 0) + 1
+        return target
+
+    def release(self, chat_id: int) -> None:
+        """``route`` natijasi ishlatilmadi (buyurtma navbatda bor edi): hisoblagichlar qaytariladi."""
+        if self._pending.get(chat_id, 0) > 0:
+            self._pending[chat_id] -= 1
+        if self.routed.get(chat_id, 0) > 0:
+            self.routed[chat_id] -= 1
+
+    def _refresh(self) -> None:
+        if self._pending_source is None:
+            return
+        now = time.monotonic()
+        if now - self._refreshed < self.refresh_interval:
+            return
+        self._refreshed = now
+        try:
+            self._pending = dict(self._pending_source())
+        except Exception as e:
+            logger.error(f"Chatlar navbatini o'qishda xato: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "delivery_fallback": self.delivery_fallback,
+            "branches": len(self.branches),
+            "routes": len(self._table),
+            "routed": {str(chat_id): count for chat_id, count in self.routed.items()},
+        }
@@ -0,0 +1,446 @@
+"""Savatcha va foydalanuvchi holatini saqlash (state backend).
+
+Gunicorn bir nechta ishchi (worker) jarayon ishga tushiradi. Har bir jarayonning
+o'z lug'ati bo'lsa, bir ishchida yig'ilgan savatchani boshqasi ko'rmaydi. Shu
+sababli holat umumiy backend orqali o'qiladi va yoziladi:
+
+* ``SQLiteBackend`` - lokal SQLite fayl (WAL rejimi), barcha ishchilar uchun umumiy.
+* ``MemoryBackend`` - jarayon ichidagi lug'at, testlar va lokal ishlatish uchun.
+
+Uzoq ishlaganda xotira o'smasligi uchun tegilmagan savatchalar
+``purge_idle_carts()`` bilan tozalanadi (janitor.py uni davriy chaqiradi).
+
+Xabarlarning oxirgi chizilgan ko'rinishi izi (``swap_render``) ham shu yerda:
+xabarni bir ishchi chizib, keyingi tahrir boshqasiga tushishi mumkin.
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class StateBackend:
+    """Holat backendining umumiy interfeysi."""
+
+    # True - metodlar diskka murojaat qiladi, event loop'dan ularni oqimda chaqirish kerak
+    blocking = False
+
+    # --- Savatcha ---
+    def get_cart(self, user_id: int) -> dict:
+        """Foydalanuvchi savatchasini {item_id: count} ko'rinishida qaytaradi (1 ta so'rov)."""
+        raise NotImplementedError
+
+    def incr_item(self, user_id: int, item_id: str, delta: int) -> int:
+        """Mahsulot sonini atomar o'zgartiradi (0 dan pastga tushmaydi) va yangi sonni qaytaradi."""
+        raise NotImplementedError
+
+    def clear_cart(self, user_id: int) -> None:
+        """Savatchani tozalaydi."""
+        raise NotImplementedError
+
+    def active_cart_count(self) -> int:
+        """Bo'sh bo'lmagan savatchalar soni (metrikalar uchun)."""
+        raise NotImplementedError
+
+    def purge_idle_carts(self, idle_seconds: float) -> int:
+        """``idle_seconds`` dan beri o'zgarmagan savatchalarni tozalaydi. Tozalanganlar sonini qaytaradi."""
+        return 0
+
+    def stats(self) -> dict:
+        return {}
+
+    # --- Foydalanuvchilar ---
+    def get_user(self, user_id: int) -> dict | None:
+        """Foydalanuvchi ma'lumotlarini qaytaradi (1 ta so'rov)."""
+        raise NotImplementedError
+
+    def set_user(self, user_id: int, info: dict) -> None:
+        """Foydalanuvchi ma'lumotlarini saqlaydi yoki yangilaydi."""
+        raise NotImplementedError
+
+    def set_users(self, users: dict, replace: bool = True) -> None:
+        """Ko'p foydalanuvchini bitta tranzaksiyada saqlaydi (ishga tushishda).
+
+        ``replace=False`` bo'lsa mavjud foydalanuvchilar o'zgartirilmaydi: fonda
+        yuklash paytida ro'yxatdan o'tganlar fayldagi eski yozuv bilan almashmaydi.
+        """
+        for user_id, info in users.items():
+            if replace or self.get_user(user_id) is None:
+                self.set_user(user_id, info)
+
+    def user_count(self) -> int:
+        raise NotImplementedError
+
+    def user_ids_after(self, after: int, limit: int) -> list:
+        """``after`` dan katta ``limit`` ta user_id, o'sish tartibida (keyset sahifalash)."""
+        raise NotImplementedError
+
+    # --- Xizmat yozuvlari ---
+    def get_meta(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    def swap_meta(self, key: str, value: str) -> bool:
+        """Qiymatni yozadi. Avvalgisidan farq qilsa ``True`` qaytaradi (atomar)."""
+        raise NotImplementedError
+
+    # --- Xabar ko'rinishi izlari (edits.py) ---
+    def swap_render(self, chat_id: int, message_id: int, fingerprint: int) -> bool:
+        """Xabarning oxirgi ko'rinish izini yozadi. Avvalgisidan farq qilsa (yoki yo'q bo'lsa) ``True``."""
+        raise NotImplementedError
+
+    def forget_render(self, chat_id: int, message_id: int) -> None:
+        """Izni o'chiradi (tahrir yetib bormagan bo'lsa)."""
+        raise NotImplementedError
+
+    def purge_renders(self, idle_seconds: float) -> int:
+        """``idle_seconds`` dan beri o'zgarmagan izlarni o'chiradi."""
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """Jarayon ichidagi backend. Faqat bitta ishchi yoki testlar uchun.
+
+    Xotirada ko'pi bilan ``max_carts`` ta savatcha turadi (eng kam ishlatilgani
+    chiqariladi). ``spill_path`` berilsa chiqarilgan savatchalar SQLite faylga
+    yoziladi va foydalanuvchi qaytganda o'sha yerdan tiklanadi; aks holda ular
+    tashlab yuboriladi.
+    """
+
+    def __init__(self, max_carts: int = 100000, spill_path: str | None = None):
+        # {user_id: [oxirgi murojaat vaqti, {item_id: count}]} - eng eskisi boshida
+        self._carts = OrderedDict()
+        self._users = {}
+        self._meta = {}
+        # {(chat_id, message_id): (iz, vaqt)}
+        self._renders = {}
+        self._lock = threading.Lock()
+        self.max_carts = max_carts
+        self.spill_path = spill_path
+        self._spill = None
+        if spill_path:
+            self._spill = sqlite3.connect(spill_path, isolation_level=None, check_same_thread=False)
+            self._spill.execute("PRAGMA journal_mode=WAL")
+            self._spill.execute("CREATE TABLE IF NOT EXISTS spilled_carts (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        self.evicted = 0
+        self.spilled = 0
+        self.restored = 0
+
+    def _entry(self, user_id, create: bool = False):
+        # self._lock ostida chaqiriladi
+        entry = self._carts.get(user_id)
+        if entry is None and self._spill is not None:
+            row = self._spill.execute("DELETE FROM spilled_carts WHERE user_id = ? RETURNING data", (user_id,)).fetchone()
+            if row:
+                entry = self._carts[user_id] = [time.monotonic(), json.loads(row[0])]
+                self.restored += 1
+        if entry is None and create:
+            entry = self._carts[user_id] = [time.monotonic(), {}]
+        if entry is not None:
+            entry[0] = time.monotonic()
+            self._carts.move_to_end(user_id)
+        return entry
+
+    def _evict_oldest(self) -> None:
+        user_id, (_, cart) = self._carts.popitem(last=False)
+        self.evicted += 1
+        if self._spill is not None and cart:
+            self._spill.execute(
+                "INSERT OR REPLACE INTO spilled_carts (user_id, data) VALUES (?, ?)", (user_id, json.dumps(cart))
+            )
+            self.spilled += 1
+
+    def get_cart(self, user_id):
+        with self._lock:
+            entry = self._entry(user_id)
+            return dict(entry[1]) if entry is not None else {}
+
+    def incr_item(self, user_id, item_id, delta):
+        with self._lock:
+            cart = self._entry(user_id, create=True)[1]
+            new_count = max(0, cart.get(item_id, 0) + delta)
+            if new_count:
+                cart[item_id] = new_count
+            else:
+                cart.pop(item_id, None)
+            while len(self._carts) > self.max_carts:
+                self._evict_oldest()
+            return new_count
+
+    def clear_cart(self, user_id):
+        with self._lock:
+            self._carts.pop(user_id, None)
+            if self._spill is not None:
+                self._spill.execute("DELETE FROM spilled_carts WHERE user_id = ?", (user_id,))
+
+    def active_cart_count(self):
+        # Janitor oqimi bir vaqtda savatchalarni o'chirishi mumkin
+        with self._lock:
+            count = sum(1 for _, cart in self._carts.values() if cart)
+            if self._spill is not None:
+                count += self._spill.execute("SELECT COUNT(*) FROM spilled_carts").fetchone()[0]
+        return count
+
+    def purge_idle_carts(self, idle_seconds):
+        deadline = time.monotonic() - idle_seconds
+        purged = 0
+        with self._lock:
+            # Murojaat tartibida saqlangani uchun faqat boshidan tekshiriladi
+            while self._carts and next(iter(self._carts.values()))[0] < deadline:
+                self._evict_oldest()
+                purged += 1
+        return purged
+
+    def stats(self):
+        return {
+            "carts_in_memory": len(self._carts),
+            "max_carts": self.max_carts,
+            "users": len(self._users),
+            "evicted": self.evicted,
+            "spilled": self.spilled,
+            "restored": self.restored,
+        }
+
+    # Tarqatish user_ids_after ni oqimda chaqiradi, yozishlar esa loopda - hammasi qulf ostida
+    def get_user(self, user_id):
+        with self._lock:
+            return self._users.get(user_id)
+
+    def set_user(self, user_id, info):
+        with self._lock:
+            self._users[user_id] = dict(info)
+
+    def set_users(self, users, replace=True):
+        with self._lock:
+            for user_id, info in users.items():
+                if replace or user_id not in self._users:
+                    self._users[user_id] = dict(info)
+
+    def user_count(self):
+        with self._lock:
+            return len(self._users)
+
+    def user_ids_after(self, after, limit):
+        with self._lock:
+            return heapq.nsmallest(limit, (user_id for user_id in self._users if user_id > after))
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def get_meta(self, key):
+        return self._meta.get(key)
+
+    def swap_meta(self, key, value):
+        with self._lock:
+            changed = self._meta.get(key) != value
+            self._meta[key] = value
+            return changed
+
+    def swap_render(self, chat_id, message_id, fingerprint):
+        key = (chat_id, message_id)
+        with self._lock:
+            previous = self._renders.get(key)
+            if previous is not None and previous[0] == fingerprint:
+                return False
+            self._renders[key] = (fingerprint, time.monotonic())
+            return True
+
+    def forget_render(self, chat_id, message_id):
+        with self._lock:
+            self._renders.pop((chat_id, message_id), None)
+
+    def purge_renders(self, idle_seconds):
+        # Janitor oqimida ishlaydi - tahrirlar esa loopda lug'atni o'zgartiradi
+        deadline = time.monotonic() - idle_seconds
+        with self._lock:
+            stale = [key for key, (_, ts) in self._renders.items() if ts < deadline]
+            for key in stale:
+                del self._renders[key]
+        return len(stale)
+
+
+class SQLiteBackend(StateBackend):
+    """SQLite (WAL) asosidagi umumiy backend.
+
+    Har bir ishchi jarayon faylga o'z ulanishi bilan kiradi. WAL rejimi
+    o'qishlarni yozishlar bilan bloklamaydi, savatcha o'zgarishlari esa
+    bitta ``UPSERT ... RETURNING`` so'rovida atomar bajariladi.
+    """
+
+    blocking = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cart_items (
+        user_id INTEGER NOT NULL,
+        item_id TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        updated_at REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, item_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS message_renders (
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        fingerprint INTEGER NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (chat_id, message_id)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._pid = None
+        # Jadval yaratish bir marta, asosiy ulanishda
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        # Eski bazalarda updated_at ustuni yo'q
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cart_items)")}
+        if "updated_at" not in columns:
+            conn.execute("ALTER TABLE cart_items ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+
+    def _conn(self) -> sqlite3.Connection:
+        # Gunicorn fork qilgandan keyin ulanishni qayta ochamiz
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    def get_cart(self, user_id):
+        rows = self._conn().execute(
+            "SELECT item_id, count FROM cart_items WHERE user_id = ? AND count > 0", (user_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def incr_item(self, user_id, item_id, delta):
+        row = self._conn().execute(
+            """
+            INSERT INTO cart_items (user_id, item_id, count, updated_at) VALUES (?, ?, MAX(0, ?), ?)
+            ON CONFLICT (user_id, item_id) DO UPDATE SET count = MAX(0, count + ?), updated_at = excluded.updated_at
+            RETURNING count
+            """,
+            (user_id, item_id, delta, time.time(), delta),
+        ).fetchone()
+        return row[0]
+
+    def clear_cart(self, user_id):
+        self._conn().execute("DELETE FROM cart_items WHERE user_id = ?", (user_id,))
+
+    def active_cart_count(self):
+        return self._conn().execute("SELECT COUNT(DISTINCT user_id) FROM cart_items WHERE count > 0").fetchone()[0]
+
+    def purge_idle_carts(self, idle_seconds):
+        """Tashlab ketilgan savatchalarni va 0 ga tushgan qatorlarni o'chiradi."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            idle = conn.execute(
+                "SELECT user_id FROM cart_items GROUP BY user_id HAVING MAX(updated_at) < ?",
+                (time.time() - idle_seconds,),
+            ).fetchall()
+            conn.executemany("DELETE FROM cart_items WHERE user_id = ?", idle)
+            conn.execute("DELETE FROM cart_items WHERE count = 0")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(idle)
+
+    def get_user(self, user_id):
+        row = self._conn().execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_user(self, user_id, info):
+        self._conn().execute(
+            "INSERT INTO users (user_id, data) VALUES (?, ?) ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+            (user_id, json.dumps(info, ensure_ascii=False)),
+        )
+
+    def set_users(self, users, replace=True):
+        conflict = "DO UPDATE SET data = excluded.data" if replace else "DO NOTHING"
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"INSERT INTO users (user_id, data) VALUES (?, ?) ON CONFLICT (user_id) {conflict}",
+                ((user_id, json.dumps(info, ensure_ascii=False)) for user_id, info in users.items()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def user_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def user_ids_after(self, after, limit):
+        rows = self._conn().execute(
+            "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def swap_meta(self, key, value):
+        cur = self._conn().execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value WHERE value != excluded.value",
+            (key, value),
+        )
+        return cur.rowcount > 0
+
+    def swap_render(self, chat_id, message_id, fingerprint):
+        # Iz bir xil bo'lsa WHERE sharti yangilashni o'tkazib yuboradi va rowcount 0 bo'ladi
+        cur = self._conn().execute(
+            "INSERT INTO message_renders (chat_id, message_id, fingerprint, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (chat_id, message_id) DO UPDATE SET fingerprint = excluded.fingerprint, updated_at = excluded.updated_at "
+            "WHERE fingerprint != excluded.fingerprint",
+            (chat_id, message_id, fingerprint, time.time()),
+        )
+        return cur.rowcount > 0
+
+    def forget_render(self, chat_id, message_id):
+        self._conn().execute("DELETE FROM message_renders WHERE chat_id = ? AND message_id = ?", (chat_id, message_id))
+
+    def purge_renders(self, idle_seconds):
+        return self._conn().execute(
+            "DELETE FROM message_renders WHERE updated_at < ?", (time.time() - idle_seconds,)
+        ).rowcount
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend(kind: str, path: str, max_carts: int = 100000, spill_path: str | None = None) -> StateBackend:
+    """Sozlamaga qarab backend yaratadi: "sqlite" yoki "memory"."""
+    if kind == "memory":
+        return MemoryBackend(max_carts=max_carts, spill_path=spill_path)
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"Noma'lum STATE_BACKEND: {kind}")
@@ -0,0 +1,71 @@
+import asyncio
+from collections import Counter
+
+from telegram.error import Forbidden
+
+from broadcast import BroadcastStore, Broadcaster
+from outbox import TokenBucket
+from state import MemoryBackend
+
+USERS = list(range(1, 301))
+BLOCKED = {13, 130, 260}
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = Counter()
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(0.001)
+        if chat_id in BLOCKED:
+            raise Forbidden("bot was blocked by the user")
+        self.calls[chat_id] += 1
+
+
+def broadcaster(store, backend, bot) -> Broadcaster:
+    return Broadcaster(store, backend, bot, TokenBucket(10000), concurrency=5, page_size=50,
+                       checkpoint_interval=0, poll_interval=0.05)
+
+
+async def wait_for(condition, timeout: float = 10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+
+def test_broadcast_resumes_from_checkpointed_cursor(tmp_path):
+    store = BroadcastStore(str(tmp_path / "broadcast.db"))
+    backend = MemoryBackend()
+    backend.set_users({user_id: {"id": user_id} for user_id in USERS})
+    bot = FakeBot()
+    broadcast_id = store.create("Yangi menyu!", backend.user_count())
+
+    async def first_run():
+        worker = broadcaster(store, backend, bot)
+        worker.start()
+        await wait_for(lambda: sum(bot.calls.values()) >= 120)
+        # Yetakchi o'ldi: oxirgi uzluksiz ishlangan joy bazada qoladi
+        await worker.stop()
+
+    asyncio.run(first_run())
+    job = store.get(broadcast_id)
+    assert job["status"] == "running"
+    assert 100 <= job["cursor"] < USERS[-1]
+    assert all(bot.calls[user_id] for user_id in USERS if user_id <= job["cursor"] and user_id not in BLOCKED)
+
+    async def second_run():
+        worker = broadcaster(store, backend, bot)
+        worker.start()
+        await wait_for(lambda: store.status(broadcast_id) == "done")
+        await worker.stop()
+
+    asyncio.run(second_run())
+    job = store.get(broadcast_id)
+    delivered = set(USERS) - BLOCKED
+    assert set(bot.calls) == delivered
+    # Takrorlar faqat to'xtash paytida navbatda yoki yo'lda bo'lgan xabarlar
+    duplicates = sum(count - 1 for count in bot.calls.values())
+    assert duplicates <= 5 * 3
+    assert job["cursor"] == USERS[-1]
+    assert job["blocked"] >= len(BLOCKED)
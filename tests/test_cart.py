@@ -0,0 +1,89 @@
+import asyncio
+
+from cart import EMPTY_SUMMARY, Cart, CartBook
+from state import MemoryBackend
+
+ITEMS = [
+    ("item_h", "Hotdog", 15000, "🍔 Fast Food"),
+    ("item_b", "Burger", 30000, "🍔 Fast Food"),
+    ("item_p", "Pepsi", 8000, "🥤 Ichimliklar"),
+]
+
+
+def test_cart_total_and_incremental_updates():
+    cart = Cart({0: 2, 2: 1}, ITEMS)
+    assert cart.total == 2 * 15000 + 8000
+    cart.set_count(1, 3, ITEMS)
+    assert cart.total == 2 * 15000 + 8000 + 3 * 30000
+    cart.set_count(0, 0, ITEMS)
+    assert cart.counts == {1: 3, 2: 1}
+    assert cart.total == 3 * 30000 + 8000
+
+
+def test_cart_summary_is_cached_until_changed():
+    cart = Cart({}, ITEMS)
+    assert cart.summary(ITEMS) == EMPTY_SUMMARY
+    cart.set_count(1, 2, ITEMS)
+    summary = cart.summary(ITEMS)
+    assert "Burger (2x) = 60 000 so'm" in summary
+    assert summary.endswith("💰 Jami: 60 000 so'm")
+    assert cart.summary(ITEMS) is summary
+    cart.set_count(1, 2, ITEMS)
+    assert cart.summary(ITEMS) is summary
+
+
+def test_cartbook_totals_follow_backend():
+    backend = MemoryBackend()
+    carts = CartBook(backend, ITEMS)
+    asyncio.run(carts.incr(1, "item_h", 1))
+    asyncio.run(carts.incr(1, "item_p", 2))
+    assert carts.get(1).total == 15000 + 2 * 8000
+    # Boshqa ishchi o'zgartirgan: keyingi o'qish backenddagi holatni ko'radi
+    backend.incr_item(1, "item_b", 1)
+    cart = carts.get(1)
+    assert cart.counts == {0: 1, 1: 1, 2: 2}
+    assert cart.total == 15000 + 30000 + 2 * 8000
+    assert carts.get(1) is cart
+
+
+def test_cartbook_incr_keeps_cached_cart_warm():
+    carts = CartBook(MemoryBackend(), ITEMS)
+    cart = carts.get(1)
+    assert asyncio.run(carts.incr(1, "item_b", 1)) == 1
+    assert cart.total == 30000
+    assert asyncio.run(carts.incr(1, "item_b", -1)) == 0
+    assert cart.total == 0 and cart.counts == {}
+
+
+def test_cartbook_skips_items_removed_from_menu():
+    backend = MemoryBackend()
+    carts = CartBook(backend, ITEMS)
+    asyncio.run(carts.incr(1, "item_h", 1))
+    asyncio.run(carts.incr(1, "item_p", 1))
+    carts.set_items([item for item in ITEMS if item[0] != "item_h"])
+    cart = carts.get(1)
+    assert cart.total == 8000
+    assert backend.get_cart(1) == {"item_h": 1, "item_p": 1}
+
+
+def test_cartbook_clear(backend):
+    # SQLite backendda yozish oqimda bajariladi
+    carts = CartBook(backend, ITEMS)
+    asyncio.run(carts.incr(1, "item_h", 3))
+    asyncio.run(carts.clear(1))
+    assert carts.get(1).total == 0
+    assert backend.get_cart(1) == {}
+
+
+def test_cartbook_cache_is_bounded():
+    carts = CartBook(MemoryBackend(), ITEMS, max_size=2, ttl=3600)
+    for user_id in (1, 2, 3):
+        asyncio.run(carts.incr(user_id, "item_h", 1))
+        carts.get(user_id)
+    assert len(carts) == 2
+    assert carts.stats()["evicted_lru"] == 1
+    assert carts.evict_idle() == 0
+    carts.ttl = -1
+    assert carts.evict_idle() == 2
+    # Keshdan chiqqan savatcha backenddan qayta o'qiladi
+    assert carts.get(1).total == 15000
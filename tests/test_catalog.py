@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from catalog import Catalog, CatalogWatcher
+
+MENU = {
+    "🍔 Fast Food": {"item_h": {"name": "Hotdog", "price": 15000}, "item_b": {"name": "Burger", "price": 30000}},
+    "🥤 Ichimliklar": {"item_p": {"name": "Pepsi", "price": 8000}},
+}
+
+
+def write_menu(path, menu, mtime_ns=None):
+    path.write_text(json.dumps(menu, ensure_ascii=False), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_catalog_index_follows_file_order(tmp_path):
+    write_menu(tmp_path / "menu.json", MENU)
+    catalog = Catalog.from_file(str(tmp_path / "menu.json"))
+    assert len(catalog) == 3
+    assert catalog.index == {"item_h": 0, "item_b": 1, "item_p": 2}
+    assert catalog.items[2] == ("item_p", "Pepsi", 8000, "🥤 Ichimliklar")
+    assert catalog.menu["🍔 Fast Food"]["item_b"] == ("Burger", 30000)
+
+
+@pytest.mark.parametrize("menu", [
+    {"A": {"x": ("Nom", 1000)}, "B": {"x": ("Nom", 1000)}},
+    {"A": {"x": ("", 1000)}},
+    {"A": {"x": ("Nom", 0)}},
+    {"A": {"x": ("Nom", "1000")}},
+    {"A": {"x": ("Nom", True)}},
+    {"A": {"x" * 60: ("Nom", 1000)}},
+    {"K" * 70: {"x": ("Nom", 1000)}},
+])
+def test_invalid_menus_are_rejected(menu):
+    with pytest.raises(ValueError):
+        Catalog(menu)
+
+
+def test_changed_categories():
+    old = Catalog({"A": {"x": ("X", 1000)}, "B": {"y": ("Y", 2000)}})
+    assert old.changed_categories(Catalog({"A": {"x": ("X", 1000)}, "B": {"y": ("Y", 2500)}})) == ["B"]
+    assert old.changed_categories(Catalog({"A": {"x": ("X", 1000)}, "B": {"y": ("Y", 2000)}, "C": {"z": ("Z", 1)}})) == ["C"]
+    # Indekslar surilsa keyingi kategoriyalar ham qayta chiziladi
+    assert old.changed_categories(Catalog({"A": {"w": ("W", 500), "x": ("X", 1000)}, "B": {"y": ("Y", 2000)}})) == ["A", "B"]
+
+
+def test_watcher_swaps_catalog_and_keeps_old_one_on_error(tmp_path):
+    path = tmp_path / "menu.json"
+    write_menu(path, MENU, mtime_ns=1_000_000_000)
+    loaded = []
+    watcher = CatalogWatcher(str(path), loaded.append, interval=0)
+    assert watcher.check() is False
+
+    menu = {**MENU, "🥤 Ichimliklar": {"item_p": {"name": "Pepsi", "price": 9000}}}
+    write_menu(path, menu, mtime_ns=2_000_000_000)
+    assert watcher.check() is True
+    assert loaded[-1].menu["🥤 Ichimliklar"]["item_p"] == ("Pepsi", 9000)
+
+    # Noto'g'ri fayl: on_change chaqirilmaydi, bir xil mtime qayta urinilmaydi
+    path.write_text('{"A": {"x": {"name": "X", "price": -1}}}', encoding="utf-8")
+    os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+    assert watcher.check() is False
+    assert watcher.check() is False
+    path.write_text("{", encoding="utf-8")
+    os.utime(path, ns=(4_000_000_000, 4_000_000_000))
+    assert watcher.reload() is None
+    assert len(loaded) == 1
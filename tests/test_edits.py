@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+from edits import EditCoalescer, EditGuard, render_fingerprint
+
+
+async def _record(rendered, item):
+    rendered.append(item)
+
+
+def test_rapid_taps_coalesce_into_last_state():
+    rendered = []
+
+    async def scenario():
+        coalescer = EditCoalescer(window=0.02)
+        for count in range(1, 6):
+            await coalescer.schedule(("chat", "a"), lambda count=count: _record(rendered, ("a", count)))
+        await coalescer.schedule(("chat", "b"), lambda: _record(rendered, ("b", 1)))
+        await asyncio.sleep(0.05)
+        return coalescer.stats()
+
+    stats = asyncio.run(scenario())
+    assert sorted(rendered) == [("a", 5), ("b", 1)]
+    assert (stats["scheduled"], stats["flushed"], stats["coalesced"]) == (6, 2, 4)
+
+
+def test_zero_window_renders_immediately():
+    rendered = []
+
+    async def scenario():
+        coalescer = EditCoalescer(window=0)
+        await coalescer.schedule("key", lambda: _record(rendered, 1))
+        assert rendered == [1]
+
+    asyncio.run(scenario())
+
+
+def test_cancel_and_flush_all():
+    rendered = []
+
+    async def scenario():
+        coalescer = EditCoalescer(window=10)
+        await coalescer.schedule("cancelled", lambda: _record(rendered, "cancelled"))
+        await coalescer.schedule("kept", lambda: _record(rendered, "kept"))
+        coalescer.cancel("cancelled")
+        # To'xtashda oyna tugashini kutmasdan yuboriladi
+        await coalescer.flush_all()
+        return coalescer.stats()
+
+    stats = asyncio.run(scenario())
+    assert rendered == ["kept"]
+    assert (stats["cancelled"], stats["pending"]) == (1, 0)
+
+
+def test_render_errors_are_logged_not_raised():
+    async def broken():
+        raise RuntimeError("tarmoq xatosi")
+
+    async def scenario():
+        coalescer = EditCoalescer(window=0.01)
+        await coalescer.schedule("key", broken)
+        await asyncio.sleep(0.03)
+        return coalescer.stats()
+
+    assert asyncio.run(scenario())["flushed"] == 1
+
+
+class FakeMessage:
+    """``edit_text`` chaqiruvlarini yozib boradigan xabar; ``error`` berilsa o'shani ko'taradi."""
+
+    def __init__(self, chat_id=1, message_id=10):
+        self.chat = SimpleNamespace(id=chat_id)
+        self.message_id = message_id
+        self.edits = []
+        self.error = None
+
+    async def edit_text(self, text, reply_markup=None, parse_mode=None):
+        if self.error is not None:
+            raise self.error
+        self.edits.append(text)
+
+
+def test_fingerprint_covers_text_markup_and_parse_mode():
+    assert render_fingerprint("a") == render_fingerprint("a")
+    assert render_fingerprint("a") != render_fingerprint("b")
+    assert render_fingerprint("a") != render_fingerprint("a", parse_mode="Markdown")
+
+
+def test_guard_suppresses_unchanged_edits(backend):
+    guard = EditGuard(backend)
+    message = FakeMessage()
+
+    async def scenario():
+        assert await guard.edit(message, "1 ta") is True
+        assert await guard.edit(message, "1 ta") is False
+        assert await guard.edit(message, "2 ta") is True
+
+    asyncio.run(scenario())
+    assert message.edits == ["1 ta", "2 ta"]
+    assert guard.stats() == {"sent": 2, "suppressed": 1, "not_modified": 0}
+
+
+def test_guard_counts_not_modified(backend):
+    guard = EditGuard(backend)
+    message = FakeMessage()
+    message.error = BadRequest("Message is not modified: specified new message content is the same")
+    assert asyncio.run(guard.edit(message, "1 ta")) is False
+    assert guard.stats()["not_modified"] == 1
+
+
+def test_guard_forgets_render_when_edit_fails(backend):
+    guard = EditGuard(backend)
+    message = FakeMessage()
+    message.error = RuntimeError("tarmoq xatosi")
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await guard.edit(message, "1 ta")
+        # Iz o'chirilgan: xuddi shu ko'rinish qayta yuboriladi
+        message.error = None
+        assert await guard.edit(message, "1 ta") is True
+
+    asyncio.run(scenario())
+    assert message.edits == ["1 ta"]
@@ -0,0 +1,91 @@
+import asyncio
+import os
+
+import pytest
+
+from geo import ReverseGeocoder, Zone, ZoneIndex, haversine_km, point_in_polygon
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "zones.example.json")
+
+
+def square(half: float) -> list:
+    return [(-half, -half), (-half, half), (half, half), (half, -half)]
+
+
+@pytest.fixture
+def index():
+    zones = [
+        Zone("Ichki", square(0.01), 8000),
+        Zone("Tashqi", square(0.1), 12000, per_km=1000, free_km=3),
+    ]
+    return ZoneIndex(zones, (0.0, 0.0), max_distance_km=8)
+
+
+def test_point_in_polygon():
+    triangle = [(0, 0), (0, 10), (10, 0)]
+    assert point_in_polygon(1, 1, triangle) is True
+    assert point_in_polygon(6, 6, triangle) is False
+    assert point_in_polygon(-1, 1, triangle) is False
+
+
+def test_overlapping_zones_prefer_file_order(index):
+    assert index.classify(0.0, 0.005).name == "Ichki"
+    assert index.classify(0.0, 0.05).name == "Tashqi"
+    assert index.classify(0.0, 0.5) is None
+
+
+def test_fee_is_rounded_up_after_free_distance(index):
+    distance = haversine_km(0, 0, 0, 0.05)
+    assert 5.5 < distance < 5.6
+    # 12000 + 1000 * (5.56 - 3) = 14559 -> 15000
+    assert index.quote(0.0, 0.05) == ("Tashqi", 5.6, 15000)
+    assert index.quote(0.0, 0.005)[2] == 8000
+    assert Zone("Z", square(1), 12000, per_km=1000, free_km=3).fee(2.0) == 12000
+
+
+def test_quote_outside_area_or_too_far(index):
+    assert index.quote(0.0, 0.5) is None
+    # Zona ichida, lekin max_distance_km (8) dan uzoq
+    assert index.quote(0.0, 0.09) is None
+
+
+def test_example_zones_file():
+    index = ZoneIndex.from_file(EXAMPLE)
+    assert index.quote(41.3111, 69.2797) == ("Markaz", 0.0, 8000)
+    assert index.quote(0.0, 0.0) is None
+    assert index.stats()["zones"] == len(index.zones)
+
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def reverse(self, lat, lon):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("tarmoq xatosi")
+        return f"{lat},{lon} manzil"
+
+
+def test_geocoder_coalesces_and_caches_on_disk(tmp_path):
+    path = str(tmp_path / "geocode.db")
+
+    async def scenario():
+        provider = FakeProvider()
+        geocoder = ReverseGeocoder(provider, path)
+        results = await asyncio.gather(*(geocoder.lookup(41.31111, 69.27971) for _ in range(5)))
+        assert set(results) == {"41.3111,69.2797 manzil"}
+        assert provider.calls == 1
+        # Xato keshlanmaydi
+        provider.fail = True
+        assert await geocoder.lookup(40.0, 70.0) is None
+        assert await geocoder.cached(40.0, 70.0) is None
+        return provider
+
+    asyncio.run(scenario())
+    # Yangi jarayon (bo'sh xotira keshi) diskdan o'qiydi
+    fresh = ReverseGeocoder(FakeProvider(), path)
+    assert asyncio.run(fresh.cached(41.31114, 69.27968)) == "41.3111,69.2797 manzil"
+    assert fresh.disk_hits == 1
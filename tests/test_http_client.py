@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from http_client import BotHTTPClient, method_class, shared_ssl_context
+
+
+class StubServer:
+    """Keep-alive HTTP/1.1 server: har so'rovga ``delay`` dan keyin ``{"ok": true}``."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                self.requests += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(self.delay)
+                self.in_flight -= 1
+                body = json.dumps({"ok": True, "result": True}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def test_method_classes_and_timeouts():
+    assert method_class("answerCallbackQuery") == "answer"
+    assert method_class("editMessageReplyMarkup") == "edit"
+    assert method_class("sendLocation") == "send"
+    assert method_class("setWebhook") == "default"
+
+    async def scenario():
+        client = BotHTTPClient(timeouts={"send": 12.0})
+        assert client.read_timeout_for("answerCallbackQuery") == 3.0
+        assert client.read_timeout_for("sendMessage") == 12.0
+        assert client.read_timeout_for("getMe") == 5.0
+        await client.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_shared_ssl_context_is_loaded_once():
+    assert shared_ssl_context() is shared_ssl_context()
+
+
+def test_concurrency_is_capped_and_connections_are_reused():
+    stub = StubServer()
+
+    async def scenario():
+        url = await stub.start()
+        client = BotHTTPClient(pool_size=2)
+        await client.initialize()
+        try:
+            results = await asyncio.gather(*(
+                client.post(f"{url}/bot123:abc/answerCallbackQuery", request_data=None) for _ in range(10)
+            ))
+            assert results == [True] * 10
+            return client.stats()
+        finally:
+            await client.shutdown()
+            await stub.stop()
+
+    stats = asyncio.run(scenario())
+    # Hovuzdan ortiq so'rovlar semaforda kutadi, yangi ulanish ochmaydi
+    assert stub.max_in_flight <= 2
+    assert stub.connections <= 2
+    assert stats["connections_opened"] + stats["requests_reused"] == 10
+    assert stats["requests_reused"] >= 8
+    assert stats["waiting"] == 0
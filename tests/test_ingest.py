@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from telegram import Bot, Update
+
+from ingest import CallbackRouter, loads, route_key, trivial_callback_id
+
+BOT = Bot("123:abc")
+
+
+def callback_body(data: str) -> bytes:
+    return json.dumps({
+        "update_id": 1,
+        "callback_query": {
+            "id": "77",
+            "chat_instance": "1",
+            "from": {"id": 5, "is_bot": False, "first_name": "Mijoz"},
+            "data": data,
+        },
+    }).encode()
+
+
+def test_trivial_callbacks_are_answered_before_building_update():
+    assert trivial_callback_id(loads(callback_body("ignore"))) == "77"
+    assert trivial_callback_id(loads(callback_body("qty_inc:item_h"))) is None
+    assert trivial_callback_id({"update_id": 1, "message": {"text": "ignore"}}) is None
+
+
+def test_route_key():
+    assert route_key("qty_inc:item_h") == "qty_inc"
+    assert route_key("cart:view") == "cart"
+    assert route_key("ignore") == "ignore"
+
+
+async def quantity(update, context):
+    return "quantity"
+
+
+async def view_cart(update, context):
+    return "view_cart"
+
+
+async def cart(update, context):
+    return "cart"
+
+
+ROUTER = CallbackRouter({"qty_inc": quantity, "cart:view": view_cart, "cart": cart})
+
+
+def route(data: str):
+    return ROUTER.check_update(Update.de_json(loads(callback_body(data)), BOT))
+
+
+def test_router_prefers_full_value_then_prefix():
+    assert route("qty_inc:item_h") is quantity
+    assert route("cart:view") is view_cart
+    assert route("cart:clear") is cart
+    assert route("checkout:start") is None
+
+
+def test_router_ignores_non_callback_updates():
+    message = Update.de_json({
+        "update_id": 2,
+        "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "cart:view"},
+    }, BOT)
+    assert ROUTER.check_update(message) is None
+    assert ROUTER.check_update("cart:view") is None
+
+
+def test_router_calls_matched_callback():
+    update = Update.de_json(loads(callback_body("qty_inc:item_h")), BOT)
+    check = ROUTER.check_update(update)
+    assert asyncio.run(ROUTER.handle_update(update, None, check, None)) == "quantity"
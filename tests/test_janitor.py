@@ -0,0 +1,44 @@
+import asyncio
+
+from janitor import ActivityTracker, Janitor, rss_bytes
+
+
+def test_activity_tracker_pops_idle_users_oldest_first():
+    tracker = ActivityTracker()
+    for user_id in (1, 2, 3):
+        tracker.touch(user_id)
+    tracker.touch(1)
+    assert tracker.pop_idle(3600) == []
+    assert tracker.pop_idle(-1) == [2, 3, 1]
+    assert len(tracker) == 0
+
+
+def test_janitor_runs_due_jobs_and_survives_errors():
+    calls = []
+
+    def purge():
+        calls.append("purge")
+        return 3
+
+    def broken():
+        raise RuntimeError("disk xatosi")
+
+    async def scenario():
+        janitor = Janitor()
+        janitor.add("purge", purge, 0.01, in_thread=True)
+        janitor.add("broken", broken, 0.01)
+        janitor.add("disabled", purge, 0)
+        await janitor.run_due()
+        assert calls == []
+        await asyncio.sleep(0.02)
+        await janitor.run_due()
+        await janitor.run_due()
+        return janitor
+
+    janitor = asyncio.run(scenario())
+    assert calls == ["purge"]
+    assert janitor.results == {"purge": 3, "broken": 0}
+
+
+def test_rss_bytes():
+    assert rss_bytes() > 0
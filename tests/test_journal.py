@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from journal import BackgroundWriter, UserJournal
+
+
+def user(user_id: int, **extra) -> dict:
+    return {"id": user_id, "name": f"Mijoz {user_id}", **extra}
+
+
+def test_background_writer_batches_and_flushes_on_close():
+    batches = []
+
+    async def scenario():
+        writer = BackgroundWriter(batches.append, max_batch=3, max_delay=10)
+        for i in range(7):
+            writer.submit(i)
+        await writer.close()
+        assert writer.pending() == 0
+
+    asyncio.run(scenario())
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_journal_replays_over_snapshot(tmp_path):
+    journal = UserJournal(str(tmp_path / "users.json"))
+    (tmp_path / "users.json").write_text(json.dumps({"1": user(1), "2": user(2)}), encoding="utf-8")
+
+    async def scenario():
+        journal.append(user(2, phone="+998901112233"))
+        journal.append(user(3))
+        await journal.close()
+
+    asyncio.run(scenario())
+    users = journal.load()
+    assert sorted(users) == [1, 2, 3]
+    assert users[2]["phone"] == "+998901112233"
+
+
+def test_partial_last_line_is_skipped(tmp_path):
+    journal = UserJournal(str(tmp_path / "users.json"))
+    with open(journal.journal_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(user(1)) + "\n" + '{"id": 2, "na')
+    assert list(journal.load()) == [1]
+
+
+def test_compaction_merges_journal_into_snapshot(tmp_path):
+    journal = UserJournal(str(tmp_path / "users.json"), fsync_interval=-1, compact_bytes=200)
+
+    async def scenario():
+        for user_id in range(1, 11):
+            journal.append(user(user_id, name="Ism Familiya " * 3))
+        await journal.close()
+
+    asyncio.run(scenario())
+    # Jurnal chegaradan oshganda snapshotga birlashtirilib, tozalangan
+    assert (tmp_path / "users.json.journal").stat().st_size < 200
+    assert sorted(journal.load()) == list(range(1, 11))
+    # Bo'sh jurnalni boshqa ishchi qayta siqmaydi
+    before = journal.signature()
+    assert journal.compact() == -1
+    assert journal.signature() == before
+    with open(journal.snapshot_path, encoding="utf-8") as f:
+        assert sorted(int(k) for k in json.load(f)) == list(range(1, 11))
@@ -0,0 +1,65 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from keyboards import MenuRenderCache, format_price
+
+MENU = {
+    "🍔 Fast Food": {"item_h": ("Hotdog", 15000), "item_b": ("Burger", 30000)},
+    "🥤 Ichimliklar": {"item_p": ("Pepsi", 8000)},
+}
+INDEX = {"item_h": 0, "item_b": 1, "item_p": 2}
+
+
+def legacy_categories_markup(menu):
+    buttons = [[InlineKeyboardButton(f"🍱 {cat}", callback_data=f"cat:{cat}")] for cat in menu.keys()]
+    buttons.append([InlineKeyboardButton("🛒 Savatcha | Tasdiqlash", callback_data="cart:view")])
+    return InlineKeyboardMarkup(buttons)
+
+
+def legacy_item_markup(menu, category_name, orders):
+    """Keshdan oldingi ``create_item_buttons``: natija baytma-bayt shunday bo'lishi kerak."""
+    buttons = []
+    for item_id, (name, price) in menu[category_name].items():
+        count = orders.get(item_id, 0)
+        row1 = [
+            InlineKeyboardButton("➖", callback_data=f"qty_dec:{item_id}"),
+            InlineKeyboardButton(f" {count} ", callback_data="ignore"),
+            InlineKeyboardButton("➕", callback_data=f"qty_inc:{item_id}")
+        ]
+        row2 = [InlineKeyboardButton(f"{name} - {price:,} so'm".replace(",", " "), callback_data="ignore")]
+        buttons.extend([row2, row1])
+    buttons.append([InlineKeyboardButton("⬅️ Barcha kategoriyalar", callback_data="back:categories")])
+    return InlineKeyboardMarkup(buttons)
+
+
+def by_index(counts):
+    return {INDEX[item_id]: count for item_id, count in counts.items()}
+
+
+def test_format_price():
+    assert format_price(8000) == "8 000"
+    assert format_price(1250000) == "1 250 000"
+
+
+def test_cached_markup_is_byte_identical_to_legacy():
+    cache = MenuRenderCache(MENU, INDEX)
+    assert cache.categories_markup.to_json() == legacy_categories_markup(MENU).to_json()
+    for category in MENU:
+        # Keshdagi (0..99) va keshdan tashqari sonlar
+        for counts in ({}, {"item_h": 2, "item_p": 1}, {item_id: 250 for item_id in MENU[category]}):
+            cached = cache.item_markup(category, by_index(counts))
+            assert cached.to_json() == legacy_item_markup(MENU, category, counts).to_json()
+
+
+def test_update_rebuilds_changed_category_only():
+    cache = MenuRenderCache(MENU, INDEX)
+    drinks = cache._category_rows["🥤 Ichimliklar"]
+    menu = {**MENU, "🍔 Fast Food": {"item_h": ("Hotdog", 16000), "item_b": ("Burger", 30000)}}
+    cache.update(menu, INDEX, ["🍔 Fast Food"])
+    assert cache._category_rows["🥤 Ichimliklar"] is drinks
+    assert cache.item_markup("🍔 Fast Food", {}).to_json() == legacy_item_markup(menu, "🍔 Fast Food", {}).to_json()
+    # Yangi kategoriya qo'shilsa butun kesh qayta quriladi
+    version = cache.version
+    menu = {**menu, "🍟 Sneklar": {"item_f": ("Fri", 12000)}}
+    cache.update(menu, {**INDEX, "item_f": 3}, [])
+    assert cache.version == version + 1
+    assert cache.categories_markup.to_json() == legacy_categories_markup(menu).to_json()
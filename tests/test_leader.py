@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+from leader import LeaderLock, boot_id
+
+
+def test_only_one_worker_becomes_leader(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.try_acquire() is True
+    assert first.try_acquire() is True
+    assert second.try_acquire() is False
+    assert (first.is_leader, second.is_leader) == (True, False)
+    with open(path) as f:
+        assert f.read() == str(os.getpid())
+    asyncio.run(first.release())
+    asyncio.run(second.release())
+
+
+def test_follower_takes_over_when_leader_releases(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    elected = []
+
+    async def scenario():
+        leader, follower = LeaderLock(path), LeaderLock(path, retry_interval=0.01)
+        assert leader.try_acquire()
+
+        async def on_elected():
+            elected.append("follower")
+
+        follower.watch(on_elected)
+        await asyncio.sleep(0.05)
+        assert elected == []
+        # Yetakchi o'ldi: qulf bo'shadi, kutayotgan ishchi o'rnini egallaydi
+        await leader.release()
+        await asyncio.sleep(0.05)
+        assert follower.is_leader
+        await follower.release()
+
+    asyncio.run(scenario())
+    assert elected == ["follower"]
+
+
+def test_stop_watch_cancels_waiting(tmp_path):
+    path = str(tmp_path / "leader.lock")
+
+    async def scenario():
+        leader, follower = LeaderLock(path), LeaderLock(path, retry_interval=0.01)
+        leader.try_acquire()
+        follower.watch(lambda: asyncio.sleep(0))
+        await follower.stop_watch()
+        await leader.release()
+        await asyncio.sleep(0.03)
+        assert follower.is_leader is False
+        await follower.release()
+
+    asyncio.run(scenario())
+
+
+def test_boot_id_prefers_environment(monkeypatch):
+    monkeypatch.setenv("BOT_BOOT_ID", "boot-1")
+    assert boot_id() == "boot-1"
+    monkeypatch.delenv("BOT_BOOT_ID")
+    assert boot_id() == f"ppid-{os.getppid()}"
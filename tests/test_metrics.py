@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from telegram.ext import ApplicationHandlerStop
+
+from metrics import instrument
+
+
+def sample(name: str, handler: str) -> float:
+    return REGISTRY.get_sample_value(name, {"handler": handler}) or 0.0
+
+
+def test_instrument_times_calls_and_counts_errors():
+    async def ok(update, context):
+        return "ok"
+
+    async def broken(update, context):
+        raise RuntimeError("xato")
+
+    before = sample("bot_handler_seconds_count", "test_ok")
+    assert asyncio.run(instrument("test_ok", ok)(None, None)) == "ok"
+    assert sample("bot_handler_seconds_count", "test_ok") == before + 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(instrument("test_broken", broken)(None, None))
+    assert sample("bot_handler_errors_total", "test_broken") == 1
+
+
+def test_handler_stop_is_not_an_error():
+    async def drop(update, context):
+        raise ApplicationHandlerStop
+
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(instrument("test_drop", drop)(None, None))
+    assert sample("bot_handler_seconds_count", "test_drop") == 1
+    assert sample("bot_handler_errors_total", "test_drop") == 0
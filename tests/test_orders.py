@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from orders import OrderHistory, OrderStore, local_timezone
+
+TASHKENT = ZoneInfo("Asia/Tashkent")
+# 2026-03-01 23:30 Toshkent vaqti = 18:30 UTC
+LATE_EVENING = datetime(2026, 3, 1, 23, 30, tzinfo=TASHKENT).timestamp()
+NEXT_MORNING = datetime(2026, 3, 2, 9, 0, tzinfo=TASHKENT).timestamp()
+
+
+def order(key, user_id, created_at, items, delivery_type="delivery"):
+    return {
+        "order_key": key,
+        "user_id": user_id,
+        "created_at": created_at,
+        "total": sum(price * count for _, _, _, price, count in items),
+        "delivery_type": delivery_type,
+        "location": (41.3, 69.2) if delivery_type == "delivery" else None,
+        "items": items,
+    }
+
+
+HOTDOG = ("item_h", "Hotdog", "🍔 Fast Food", 15000)
+BURGER = ("item_b", "Burger", "🍔 Fast Food", 30000)
+PEPSI = ("item_p", "Pepsi", "🥤 Ichimliklar", 8000)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OrderStore(str(tmp_path / "orders.db"), tz=TASHKENT)
+    store.write_batch([
+        order("order:1:1", 1, LATE_EVENING, [(*HOTDOG, 2), (*PEPSI, 1)]),
+        order("order:2:1", 2, NEXT_MORNING, [(*BURGER, 1)], delivery_type="pickup"),
+        order("order:1:2", 1, NEXT_MORNING, [(*HOTDOG, 1), (*PEPSI, 2)]),
+    ])
+    return store
+
+
+def test_days_follow_store_timezone(store):
+    after_midnight = datetime(2026, 3, 2, 2, 0, tzinfo=TASHKENT).timestamp()
+    assert store.day(after_midnight) == "2026-03-02"
+    assert OrderStore(":memory:", tz=timezone.utc).day(after_midnight) == "2026-03-01"
+
+
+def test_daily_rollups_and_duplicates(store):
+    assert store.day_summary("2026-03-01") == (1, 38000)
+    assert store.day_summary("2026-03-02") == (2, 61000)
+    # Takroriy kalit yig'indilarga qo'shilmaydi
+    store.write_batch([order("order:1:1", 1, LATE_EVENING, [(*HOTDOG, 2), (*PEPSI, 1)])])
+    assert store.day_summary("2026-03-01") == (1, 38000)
+    assert store.day_summary("2026-03-03") == (0, 0)
+    assert [row[1] for row in store.orders_for_day("2026-03-02")] == [1, 2]
+
+
+def test_revenue_reports(store):
+    assert store.revenue_by_item("2026-03-01", "2026-03-02") == [
+        ("Hotdog", "🍔 Fast Food", 3, 45000),
+        ("Burger", "🍔 Fast Food", 1, 30000),
+        ("Pepsi", "🥤 Ichimliklar", 3, 24000),
+    ]
+    assert store.revenue_by_item("2026-03-02", "2026-03-02", limit=1) == [("Burger", "🍔 Fast Food", 1, 30000)]
+    assert store.revenue_by_category("2026-03-01", "2026-03-02") == [("🍔 Fast Food", 4, 75000), ("🥤 Ichimliklar", 3, 24000)]
+
+
+def test_user_orders_newest_first(store):
+    orders = store.user_orders(1)
+    assert [total for _, _, total, _, _ in orders] == [31000, 38000]
+    assert orders[0][4] == [list(HOTDOG) + [1], list(PEPSI) + [2]]
+    assert store.user_orders(3) == []
+
+
+def test_history_writes_in_background(tmp_path):
+    store = OrderStore(str(tmp_path / "orders.db"))
+    history = OrderHistory(store, max_delay=0.01)
+
+    async def scenario():
+        for i in range(5):
+            history.record(order(f"order:1:{i}", 1, NEXT_MORNING, [(*PEPSI, 1)]))
+        await history.close()
+
+    asyncio.run(scenario())
+    assert store.day_summary(store.day(NEXT_MORNING)) == (5, 40000)
+
+
+def test_unknown_timezone_falls_back_to_utc():
+    assert local_timezone("Asia/Tashkent") == TASHKENT
+    assert local_timezone("Mars/Olympus") is timezone.utc
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from outbox import Outbox, OutboxSender
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.db"))
+
+
+def order(chat_id=1):
+    return [
+        (chat_id, "send_message", {"text": "Buyurtma"}),
+        (chat_id, "send_location", {"latitude": 41.3, "longitude": 69.2}),
+    ]
+
+
+def test_enqueue_is_idempotent_per_group(outbox):
+    assert outbox.has_group("order:1") is False
+    assert outbox.enqueue("order:1", order()) is True
+    assert outbox.has_group("order:1") is True
+    # Takroriy bosish - boshqa chatga yo'naltirilgan bo'lsa ham qo'shilmaydi
+    assert outbox.enqueue("order:1", order(chat_id=2)) is False
+    assert outbox.counts() == {"pending": 2}
+
+
+def test_group_messages_are_claimed_in_order(outbox):
+    outbox.enqueue("order:1", order())
+    outbox.enqueue("order:2", order())
+    rows = outbox.claim(10, lease=60)
+    # Har guruhdan faqat birinchi xabar: ikkinchisi birinchisi ketmaguncha olinmaydi
+    assert [(row[2], row[3]) for row in rows] == [
+        ("send_message", '{"text": "Buyurtma"}'),
+        ("send_message", '{"text": "Buyurtma"}'),
+    ]
+    assert outbox.claim(10, lease=60) == []
+    outbox.mark_sent(rows[0][0])
+    outbox.mark_failed(rows[1][0], "chat topilmadi")
+    assert [row[2] for row in outbox.claim(10, lease=60)] == ["send_location", "send_location"]
+
+
+def test_retry_later_keeps_order_and_counts_attempts(outbox):
+    outbox.enqueue("order:1", order())
+    (row,) = outbox.claim(10, lease=60)
+    outbox.retry_later(row[0], 0, "tarmoq xatosi")
+    (again,) = outbox.claim(10, lease=60)
+    assert again[0] == row[0]
+    assert again[4] == 1
+
+
+def test_expired_lease_is_reclaimed(outbox):
+    outbox.enqueue("order:1", order())
+    (row,) = outbox.claim(10, lease=0.05)
+    assert outbox.claim(10, lease=60) == []
+    time.sleep(0.1)
+    # Jo'natuvchi ishchi o'lgan: lease tugagach xabar boshqasiga beriladi
+    (reclaimed,) = outbox.claim(10, lease=60)
+    assert reclaimed[0] == row[0]
+
+
+def test_claim_skips_busy_chats(outbox):
+    outbox.enqueue("order:1", order(chat_id=1))
+    outbox.enqueue("order:2", order(chat_id=2))
+    rows = outbox.claim(10, lease=60, skip_chats=(1,))
+    assert [row[1] for row in rows] == [2]
+
+
+def test_pending_by_chat_and_purge_sent(outbox):
+    outbox.enqueue("order:1", order(chat_id=1))
+    outbox.enqueue("order:2", order(chat_id=2))
+    assert outbox.pending_by_chat() == {1: 2, 2: 2}
+    (row, _) = outbox.claim(10, lease=60)
+    outbox.mark_sent(row[0])
+    assert outbox.purge_sent(3600) == 0
+    assert outbox.purge_sent(-1) == 1
+    assert outbox.counts() == {"pending": 2, "sending": 1}
+
+
+class FakeBot:
+    """``send_message`` navbatdagi xatoni ko'taradi, xato qolmasa yuborilgan deb yozadi."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, kwargs))
+
+    async def send_location(self, chat_id, **kwargs):
+        await self.send_message(chat_id, **kwargs)
+
+
+def send_first(outbox, bot, **kwargs):
+    sender = OutboxSender(outbox, bot, **kwargs)
+    (row,) = outbox.claim(1, lease=60)
+    return sender, asyncio.run(sender._send_one(*row)), row
+
+
+def status(outbox, row_id):
+    return outbox._conn().execute("SELECT status, attempts, next_at FROM outbox WHERE id = ?", (row_id,)).fetchone()
+
+
+def test_sender_waits_on_429_without_counting_attempt(outbox):
+    outbox.enqueue("order:1", order())
+    sender, done, row = send_first(outbox, FakeBot(RetryAfter(30)))
+    assert done is False
+    state, attempts, next_at = status(outbox, row[0])
+    assert (state, attempts) == ("pending", 0)
+    assert next_at > time.time() + 20
+    assert sender.bucket.paused_until > time.monotonic() + 20
+    assert sender.retried == 1
+
+
+def test_sender_resends_without_markdown_when_entities_break(outbox):
+    failed = []
+    outbox.enqueue("order:1:5", [(1, "send_message", {"text": "👤 **Mijoz:** Ali_Vali", "parse_mode": "Markdown"})])
+    bot = FakeBot(BadRequest("Bad Request: can't parse entities: can't find end of the entity starting at byte offset 20"))
+    sender, done, row = send_first(outbox, bot, on_failed=lambda *args: failed.append(args))
+    assert done is True
+    assert bot.sent == [(1, {"text": "👤 **Mijoz:** Ali_Vali"})]
+    assert status(outbox, row[0])[0] == "sent"
+    assert failed == [] and sender.failed == 0
+
+
+def test_sender_reports_permanently_failed_rows(outbox):
+    failed = []
+    outbox.enqueue("order:1:5", order())
+    sender, done, row = send_first(outbox, FakeBot(Forbidden("bot was kicked from the group chat")),
+                                   on_failed=lambda *args: failed.append(args))
+    assert done is True
+    assert status(outbox, row[0])[:2] == ("failed", 1)
+    assert failed == [("order:1:5", 1, "bot was kicked from the group chat")]
+    assert sender.failed == 1
+
+
+def test_sender_backs_off_on_network_errors_then_gives_up(outbox):
+    outbox.enqueue("order:1", order())
+    sender, done, row = send_first(outbox, FakeBot(NetworkError("timeout")), max_attempts=2)
+    assert done is False
+    assert status(outbox, row[0])[:2] == ("pending", 1)
+    outbox._conn().execute("UPDATE outbox SET next_at = 0")
+    sender, done, row = send_first(outbox, FakeBot(NetworkError("timeout")), max_attempts=2)
+    assert done is True
+    assert status(outbox, row[0])[:2] == ("failed", 2)
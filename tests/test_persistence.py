@@ -0,0 +1,72 @@
+import asyncio
+
+from persistence import SQLitePersistence
+
+
+def test_user_data_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "user_data.db")
+
+    async def scenario():
+        first, second = SQLitePersistence(path), SQLitePersistence(path)
+        await first.update_user_data(7, {"temp_location": [41.3, 69.2]})
+        await first.flush()
+        # Ikkinchi ishchi: PTB ushlab turgan lug'at joyida yangilanadi
+        user_data = {"current_category": "eski"}
+        await second.refresh_user_data(7, user_data)
+        assert user_data == {"temp_location": [41.3, 69.2]}
+        # O'zgarmagan qator qayta o'qilsa lug'at almashtirilmaydi
+        user_data["local"] = True
+        await second.refresh_user_data(7, user_data)
+        assert user_data["local"] is True
+        assert second.stats()["reads"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_only_changed_user_data_is_written(tmp_path):
+    async def scenario():
+        persistence = SQLitePersistence(str(tmp_path / "user_data.db"))
+        await persistence.update_user_data(1, {"a": 1, "b": 2})
+        await persistence.update_user_data(1, {"b": 2, "a": 1})
+        await persistence.update_user_data(2, {"a": 1})
+        await persistence.flush()
+        return persistence.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["writes"], stats["skipped_unchanged"], stats["dirty"]) == (2, 1, 0)
+
+
+def test_unwritten_local_copy_wins_over_disk(tmp_path):
+    path = str(tmp_path / "user_data.db")
+
+    async def scenario():
+        other, local = SQLitePersistence(path), SQLitePersistence(path)
+        await other.update_user_data(7, {"step": "eski"})
+        await other.flush()
+        await local.update_user_data(7, {"step": "yangi"})
+        # Yozish navbatida turgan qiymat diskdagisidan yangiroq
+        user_data = {"step": "yangi"}
+        await local.refresh_user_data(7, user_data)
+        assert user_data == {"step": "yangi"}
+        await local.drop_user_data(7)
+        assert local.stats()["cached"] == 1
+        await local.flush()
+        await local.drop_user_data(7)
+        assert local.stats()["cached"] == 0
+        user_data = {}
+        await other.refresh_user_data(7, user_data)
+        assert user_data == {"step": "yangi"}
+
+    asyncio.run(scenario())
+
+
+def test_purge_idle_rows(tmp_path):
+    async def scenario():
+        persistence = SQLitePersistence(str(tmp_path / "user_data.db"))
+        await persistence.update_user_data(1, {"a": 1})
+        await persistence.flush()
+        return persistence
+
+    persistence = asyncio.run(scenario())
+    assert persistence.purge_idle(3600) == 0
+    assert persistence.purge_idle(-1) == 1
@@ -0,0 +1,108 @@
+import pytest
+
+import ratelimit
+from ratelimit import RateLimiter, classify, parse_limits
+
+
+class Clock:
+    """``time.time()`` o'rniga: vaqtni test o'zi suradi."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def limiter(tmp_path, spec: str, **kwargs) -> RateLimiter:
+    return RateLimiter(str(tmp_path / "ratelimit.db"), parse_limits(spec), **kwargs)
+
+
+def callback(user_id: int, data: str = "qty_inc:item_h") -> dict:
+    return {"update_id": 1, "callback_query": {"id": "1", "from": {"id": user_id}, "data": data}}
+
+
+def test_parse_limits():
+    assert parse_limits("callback=5:20, global=300") == {"callback": (5.0, 20.0), "global": (300.0, 300.0)}
+    with pytest.raises(ValueError):
+        parse_limits("edited=1:1")
+
+
+def test_classify():
+    assert classify(callback(7)) == ("callback", 7)
+    assert classify({"message": {"from": {"id": 7}, "text": "/start"}}) == ("command", 7)
+    assert classify({"message": {"from": {"id": 7}, "text": "🍔 Menyu"}}) == ("message", 7)
+    assert classify({"update_id": 1, "my_chat_member": {"from": {"id": 7}}}) == ("other", 7)
+    assert classify({"message": {"chat": {"id": -1}}}) is None
+    # Rasmiylashtirishdagi lokatsiya va kontakt cheklanmaydi
+    assert classify({"message": {"from": {"id": 7}, "location": {"latitude": 41.3, "longitude": 69.2}}}) is None
+    assert classify({"message": {"from": {"id": 7}, "contact": {"phone_number": "+998901234567"}}}) is None
+    # Rasmiylashtirish tugmalari cheklanmaydi
+    for data in ("checkout:start", "delivery:yes", "pickup:0", "confirm:yes"):
+        assert classify(callback(7, data)) is None
+
+
+def test_user_bucket_burst_and_refill(tmp_path, clock):
+    rl = limiter(tmp_path, "callback=2:3")
+    assert [rl.allow("callback", 7) for _ in range(4)] == [True, True, True, False]
+    # Boshqa foydalanuvchi va boshqa tur alohida hisoblanadi
+    assert rl.allow("callback", 8) is True
+    assert rl.allow("message", 7) is True
+    clock.now += 0.5
+    assert rl.allow("callback", 7) is True
+    assert rl.allow("callback", 7) is False
+    assert rl.dropped == {"callback": 2}
+
+
+def test_rejected_key_is_dropped_locally_until_refill(tmp_path, clock):
+    rl = limiter(tmp_path, "callback=1:1")
+    assert rl.allow("callback", 7) is True
+    assert rl.allow("callback", 7) is False
+    assert rl.allow("callback", 7) is False
+    assert rl.local_drops == 1
+    clock.now += 1
+    assert rl.allow("callback", 7) is True
+
+
+def test_user_buckets_are_shared_between_workers(tmp_path, clock):
+    first = limiter(tmp_path, "callback=1:4")
+    second = limiter(tmp_path, "callback=1:4")
+    allowed = sum(worker.allow("callback", 7) for _ in range(4) for worker in (first, second))
+    assert allowed == 4
+
+
+def test_exempt_users_are_never_limited(tmp_path, clock):
+    rl = limiter(tmp_path, "command=1:1", exempt=(1,))
+    assert all(rl.allow("command", 1) for _ in range(10))
+
+
+def test_global_bucket_is_split_between_workers(tmp_path, clock):
+    rl = limiter(tmp_path, "global=10:20", workers=4)
+    assert (rl.global_bucket.rate, rl.global_bucket.burst) == (2.5, 5.0)
+    assert [rl.allow("message", user_id) for user_id in range(6)] == [True] * 5 + [False]
+    assert rl.dropped == {"message": 1}
+
+
+def test_user_rejection_refunds_global_token(tmp_path, clock):
+    rl = limiter(tmp_path, "callback=1:1,global=2:2")
+    assert rl.allow("callback", 7) is True
+    # Spamer rad etilganda global token boshqalar uchun qoladi
+    for _ in range(5):
+        assert rl.allow("callback", 7) is False
+    assert rl.allow("callback", 8) is True
+    assert rl.allow("callback", 9) is False
+
+
+def test_purge_removes_full_buckets(tmp_path, clock):
+    rl = limiter(tmp_path, "callback=1:5")
+    rl.allow("callback", 7)
+    assert rl.purge() == 0
+    clock.now += 10
+    assert rl.purge() == 1
@@ -0,0 +1,52 @@
+import asyncio
+import glob
+import json
+import os
+
+from recorder import PATTERN, UpdateRecorder, read_records
+
+
+def update(update_id: int, pretty: bool = False) -> bytes:
+    data = {"update_id": update_id, "message": {"message_id": update_id, "text": "🍔 Menyu"}}
+    return json.dumps(data, ensure_ascii=False, indent=2 if pretty else None).encode()
+
+
+def test_records_round_trip(tmp_path):
+    async def scenario():
+        recorder = UpdateRecorder(str(tmp_path), max_delay=0.01)
+        for update_id in range(5):
+            # Ko'p qatorli JSON ham bitta qatorga yoziladi
+            recorder.record(update(update_id, pretty=update_id == 2))
+        await recorder.close()
+        return recorder.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["recorded"], stats["pending"], stats["files"]) == (5, 0, 1)
+    records = list(read_records([str(tmp_path)]))
+    assert [u["update_id"] for _, u in records] == [0, 1, 2, 3, 4]
+    assert records[2][1]["message"]["text"] == "🍔 Menyu"
+    times = [t for t, _ in records]
+    assert times == sorted(times)
+
+
+def test_rotation_keeps_newest_files(tmp_path):
+    recorder = UpdateRecorder(str(tmp_path), max_bytes=1, keep=2)
+    for update_id in range(4):
+        # Har paketdan keyin fayl hajmi oshadi - keyingisi yangi faylga
+        recorder._write_batch([(float(update_id), update(update_id))])
+    asyncio.run(recorder.close())
+    assert recorder.files == 4
+    assert len(glob.glob(os.path.join(str(tmp_path), PATTERN))) == 2
+    assert [u["update_id"] for _, u in read_records([str(tmp_path)])] == [2, 3]
+
+
+def test_unclosed_file_and_workers_are_merged_by_time(tmp_path):
+    # Bir jarayonda fayl nomlari to'qnashmasin (ishchilarda pid farq qiladi)
+    first, second = UpdateRecorder(str(tmp_path / "a")), UpdateRecorder(str(tmp_path / "b"))
+    first._write_batch([(1.0, update(1)), (3.0, update(3))])
+    second._write_batch([(2.0, update(2))])
+    second._write_batch([(4.0, update(4))])
+    # Ishchilar to'xtatilmagan: gzip oxiri yozilmagan, flush qilingan paketlar o'qiladi
+    assert [u["update_id"] for _, u in read_records([first.path, second.path])] == [1, 2, 3, 4]
+    asyncio.run(first.close())
+    asyncio.run(second.close())
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from routing import Branch, OrderRouter
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "branches.example.json")
+
+
+def test_single_router_sends_everything_to_admin():
+    router = OrderRouter.single(1)
+    assert router.route("delivery", "Markaz") == ("", 1)
+    assert router.route("pickup", 3) == ("", 1)
+    assert router.multi_branch is False
+
+
+def test_delivery_zone_round_robin_between_branch_chats():
+    router = OrderRouter.from_file(EXAMPLE)
+    router.policy = "round_robin"
+    chats = [router.route("delivery", "Markaz")[1] for _ in range(4)]
+    assert chats == [-1001000000001, -1001000000002, -1001000000001, -1001000000002]
+    # Ikki filial yetkazadigan zona
+    names = {router.route("delivery", "Chekka")[0] for _ in range(2)}
+    assert names == {"MakBurgers Chilonzor", "MakBurgers Yunusobod"}
+
+
+def test_unknown_zone_goes_to_fallback_branch():
+    router = OrderRouter.from_file(EXAMPLE)
+    router.policy = "round_robin"
+    fallback = {router.route("delivery", "Sayyora")[1] for _ in range(4)}
+    assert fallback == {-1001000000001, -1001000000002}
+    # Zonalar o'chirilgan (ZONES_FILE bo'sh): har bir yetkazish shu kalit bilan keladi
+    assert {router.route("delivery", None)[0] for _ in range(4)} == {"MakBurgers Markaz"}
+    assert router.route("pickup", 2) == ("MakBurgers Yunusobod", -1001000000004)
+
+
+def test_unknown_zone_without_fallback_goes_to_every_chat():
+    router = OrderRouter([Branch("A", [1, 2]), Branch("B", [3])])
+    assert {router.route("delivery", None)[1] for _ in range(3)} == {1, 2, 3}
+
+
+def test_release_undoes_unused_route():
+    router = OrderRouter([Branch("A", [1, 2])], policy="least_pending")
+    assert router.route("delivery")[1] == 1
+    # Takroriy bosish: tanlov ishlatilmadi, keyingi buyurtma yana o'sha chatga
+    router.release(1)
+    assert router.route("delivery")[1] == 1
+    assert router.stats()["routed"] == {"1": 1}
+
+
+def test_least_pending_uses_outbox_counts_and_local_picks():
+    pending = {-1001000000001: 5, -1001000000002: 1}
+    router = OrderRouter.from_file(EXAMPLE, pending=lambda: pending, refresh_interval=3600)
+    assert router.policy == "least_pending"
+    assert router.route("delivery", "Markaz")[1] == -1001000000002
+    # Bazadan qayta o'qilmaguncha shu ishchi tanlaganlari qo'shib boriladi
+    picks = [router.route("delivery", "Markaz")[1] for _ in range(4)]
+    assert picks == [-1001000000002] * 3 + [-1001000000001]
+
+
+def test_pickup_falls_back_when_no_branch_offers_it():
+    router = OrderRouter([Branch("A", [1], pickup=False), Branch("B", [2], pickup=False)])
+    assert {router.route("pickup")[1] for _ in range(2)} == {1, 2}
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        OrderRouter([Branch("A", [1])], policy="random")
+    with pytest.raises(ValueError):
+        OrderRouter([Branch("A", [1])], delivery_fallback="B")
+    with pytest.raises(ValueError):
+        Branch("A", [])
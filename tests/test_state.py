@@ -0,0 +1,190 @@
+import multiprocessing
+import threading
+
+from state import MemoryBackend, SQLiteBackend
+
+
+def test_incr_item_returns_new_count_and_stops_at_zero(backend):
+    assert backend.incr_item(1, "item_h", 1) == 1
+    assert backend.incr_item(1, "item_h", 2) == 3
+    assert backend.incr_item(1, "item_h", -5) == 0
+    assert backend.incr_item(1, "item_b", -1) == 0
+    assert backend.get_cart(1) == {}
+
+
+def test_clear_cart_and_active_count(backend):
+    backend.incr_item(1, "item_h", 1)
+    backend.incr_item(2, "item_b", 2)
+    assert backend.active_cart_count() == 2
+    backend.clear_cart(1)
+    assert backend.get_cart(1) == {}
+    assert backend.get_cart(2) == {"item_b": 2}
+    assert backend.active_cart_count() == 1
+
+
+def test_concurrent_increments_are_atomic(backend):
+    threads, per_thread = 8, 200
+
+    def tap():
+        for _ in range(per_thread):
+            backend.incr_item(7, "item_h", 1)
+
+    workers = [threading.Thread(target=tap) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert backend.get_cart(7) == {"item_h": threads * per_thread}
+
+
+def _tap_in_process(path, count):
+    backend = SQLiteBackend(path)
+    for _ in range(count):
+        backend.incr_item(7, "item_h", 1)
+
+
+def test_sqlite_increments_are_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "state.db")
+    SQLiteBackend(path)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_tap_in_process, args=(path, 200)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    assert SQLiteBackend(path).get_cart(7) == {"item_h": 800}
+
+
+def test_users_roundtrip(backend):
+    backend.set_users({user_id: {"id": user_id} for user_id in (5, 1, 3, 9)})
+    # Fonda yuklash ro'yxatdan o'tgan foydalanuvchini eski yozuv bilan almashtirmaydi
+    backend.set_user(3, {"id": 3, "phone": "+998901234567"})
+    backend.set_users({3: {"id": 3}}, replace=False)
+    assert backend.get_user(3) == {"id": 3, "phone": "+998901234567"}
+    assert backend.get_user(4) is None
+    assert backend.user_count() == 4
+
+
+def test_memory_backend_evicts_least_recent_and_restores_spilled(tmp_path):
+    backend = MemoryBackend(max_carts=2, spill_path=str(tmp_path / "spill.db"))
+    for user_id in (1, 2):
+        backend.incr_item(user_id, "item_h", user_id)
+    backend.get_cart(1)
+    backend.incr_item(3, "item_b", 1)
+    # 2 eng kam ishlatilgan: diskka chiqarildi, lekin hisobda qoladi
+    assert backend.stats()["carts_in_memory"] == 2
+    assert backend.active_cart_count() == 3
+    assert backend.get_cart(2) == {"item_h": 2}
+    assert (backend.evicted, backend.spilled, backend.restored) == (1, 1, 1)
+    backend.close()
+
+
+def test_memory_backend_without_spill_drops_idle_carts():
+    backend = MemoryBackend()
+    backend.incr_item(1, "item_h", 1)
+    assert backend.purge_idle_carts(3600) == 0
+    assert backend.purge_idle_carts(-1) == 1
+    assert backend.get_cart(1) == {}
+
+
+def test_sqlite_purge_removes_idle_carts_and_zero_rows(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    backend.incr_item(1, "item_h", 1)
+    backend.incr_item(2, "item_h", 1)
+    backend.incr_item(2, "item_b", 1)
+    backend.incr_item(2, "item_b", -1)
+    backend._conn().execute("UPDATE cart_items SET updated_at = 0 WHERE user_id = 1")
+    assert backend.purge_idle_carts(3600) == 1
+    assert backend._conn().execute("SELECT user_id, item_id FROM cart_items").fetchall() == [(2, "item_h")]
+
+
+def test_memory_backend_count_while_purging():
+    backend = MemoryBackend()
+    for user_id in range(2000):
+        backend.incr_item(user_id, "item_h", 1)
+    stop = threading.Event()
+    errors = []
+
+    def count():
+        while not stop.is_set():
+            try:
+                backend.active_cart_count()
+            except RuntimeError as e:
+                errors.append(e)
+
+    counter = threading.Thread(target=count)
+    counter.start()
+    backend.purge_idle_carts(-1)
+    stop.set()
+    counter.join()
+    assert errors == []
+    assert backend.active_cart_count() == 0
+
+
+def test_swap_render_reports_changes_only(backend):
+    assert backend.swap_render(1, 10, 111) is True
+    assert backend.swap_render(1, 10, 111) is False
+    assert backend.swap_render(1, 10, 222) is True
+    backend.forget_render(1, 10)
+    assert backend.swap_render(1, 10, 222) is True
+    assert backend.purge_renders(3600) == 0
+    assert backend.purge_renders(-1) == 1
+
+
+def test_memory_backend_purge_renders_while_editing():
+    backend = MemoryBackend()
+    for message_id in range(50000):
+        backend.swap_render(1, message_id, message_id)
+    stop = threading.Event()
+    errors = []
+
+    def purge():
+        # Janitor oqimi izlarni ko'rib chiqayotganda loop yangilarini qo'shadi
+        while not stop.is_set():
+            try:
+                backend.purge_renders(3600)
+            except RuntimeError as e:
+                errors.append(e)
+
+    janitor = threading.Thread(target=purge)
+    janitor.start()
+    for message_id in range(50000, 100000):
+        backend.swap_render(2, message_id, message_id)
+    stop.set()
+    janitor.join()
+    assert errors == []
+    assert backend.purge_renders(-1) == 100000
+
+
+def test_users_keyset_pagination(backend):
+    backend.set_users({user_id: {"id": user_id} for user_id in (5, 1, 3, 9)})
+    backend.set_users({3: {"id": "yangi"}, 7: {"id": 7}}, replace=False)
+    assert backend.get_user(3) == {"id": 3}
+    assert backend.user_count() == 5
+    assert backend.user_ids_after(0, 2) == [1, 3]
+    assert backend.user_ids_after(3, 10) == [5, 7, 9]
+    assert backend.user_ids_after(9, 10) == []
+
+
+def test_memory_backend_pages_users_while_registering():
+    backend = MemoryBackend()
+    backend.set_users({user_id: {"id": user_id} for user_id in range(50000)})
+    stop = threading.Event()
+    errors = []
+
+    def page():
+        # Tarqatish oqimi: loop bir vaqtda yangi foydalanuvchilarni yozadi
+        while not stop.is_set():
+            try:
+                backend.user_ids_after(0, 1000)
+            except RuntimeError as e:
+                errors.append(e)
+
+    broadcaster = threading.Thread(target=page)
+    broadcaster.start()
+    for user_id in range(50000, 100000):
+        backend.set_user(user_id, {"id": user_id})
+    stop.set()
+    broadcaster.join()
+    assert errors == []
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from workqueue import UpdateQueue, update_chat_key
+
+
+def update(update_id: int, chat_id: int | None = None, user_id: int | None = None):
+    return SimpleNamespace(
+        update_id=update_id,
+        effective_chat=SimpleNamespace(id=chat_id) if chat_id is not None else None,
+        effective_user=SimpleNamespace(id=user_id) if user_id is not None else None,
+    )
+
+
+def test_chat_key_fallbacks():
+    assert update_chat_key(update(1, chat_id=10, user_id=20)) == 10
+    assert update_chat_key(update(1, user_id=20)) == 20
+    assert update_chat_key(update(7)) == 7
+
+
+def test_updates_of_one_chat_keep_their_order():
+    seen = {}
+
+    async def handler(u):
+        # Har xil kechikish: tartib baribir saqlanishi kerak
+        await asyncio.sleep(0.001 * (u.update_id % 3))
+        seen.setdefault(u.effective_chat.id, []).append(u.update_id)
+
+    async def scenario():
+        queue = UpdateQueue(handler, workers=4, maxsize=100)
+        await queue.start()
+        for update_id in range(60):
+            assert await queue.put(update(update_id, chat_id=update_id % 5))
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.processed == 60
+    for chat_id, ids in seen.items():
+        assert ids == sorted(ids)
+        assert len(ids) == 12
+
+
+def test_full_queue_applies_backpressure_then_rejects():
+    release = None
+
+    async def handler(u):
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = UpdateQueue(handler, workers=1, maxsize=2, put_timeout=0.05)
+        await queue.start()
+        # Bittasi iste'molchida, ikkitasi navbatda
+        assert await queue.put(update(1, chat_id=1))
+        await asyncio.sleep(0)
+        assert await queue.put(update(2, chat_id=1))
+        assert await queue.put(update(3, chat_id=1))
+        assert await queue.put(update(4, chat_id=1)) is False
+        assert queue.stats()["rejected"] == 1
+        # Joy bo'shashini kutayotgan put() muvaffaqiyatli tugaydi
+        waiting = asyncio.create_task(queue.put(update(5, chat_id=1)))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await waiting is True
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.processed == 4
+    assert queue.failed == 0
+
+
+def test_handler_errors_do_not_stop_consumer():
+    async def handler(u):
+        if u.update_id == 1:
+            raise RuntimeError("xato")
+
+    async def scenario():
+        queue = UpdateQueue(handler, workers=1, maxsize=10)
+        await queue.start()
+        for update_id in range(3):
+            await queue.put(update(update_id, chat_id=1))
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert (queue.processed, queue.failed) == (3, 1)
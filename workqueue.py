@@ -0,0 +1,108 @@
+"""Webhook yangilanishlari uchun chegaralangan asinxron ish navbati.
+
+Webhook handler yangilanishni navbatga qo'yib, Telegramga darhol 200 qaytaradi.
+Navbat N ta bo'lakka (shard) bo'lingan va har bir bo'lakni bitta iste'molchi
+(consumer) vazifa o'qiydi. Bitta chatning yangilanishlari har doim bitta bo'lakka
+tushadi, shuning uchun ular kelgan tartibda qayta ishlanadi.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def update_chat_key(update) -> int:
+    """Tartibni saqlash uchun kalit: chat, bo'lmasa foydalanuvchi, bo'lmasa update_id."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """Bir nechta iste'molchili, chat bo'yicha tartibni saqlovchi navbat.
+
+    Navbat to'lganda ``put()`` joy bo'shashini ``put_timeout`` soniya kutadi
+    (backpressure) va baribir joy bo'lmasa ``False`` qaytaradi.
+    """
+
+    def __init__(self, handler, workers: int = 4, maxsize: int = 1000, put_timeout: float = 5.0):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.shard_size = max(1, maxsize // self.workers)
+        self.put_timeout = put_timeout
+        self._queues = []
+        self._tasks = []
+        # Statistika
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def start(self):
+        self._queues = [asyncio.Queue(self.shard_size) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._consume(q), name=f"update-consumer-{i}") for i, q in enumerate(self._queues)
+        ]
+        logger.info(f"Yangilanishlar navbati ishga tushdi: {self.workers} ta iste'molchi, bo'lak hajmi {self.shard_size}")
+
+    async def stop(self):
+        """Navbatdagi yangilanishlarni tugatib, iste'molchilarni to'xtatadi."""
+        for q in self._queues:
+            await q.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, update) -> bool:
+        """Yangilanishni navbatga qo'yadi. Navbat to'lib qolsa ``False`` qaytaradi."""
+        queue = self._queues[update_chat_key(update) % self.workers]
+        item = (update, time.monotonic())
+        try:
+            queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(queue.put(item), self.put_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            logger.warning(f"Navbat to'lgan, yangilanish {update.update_id} rad etildi")
+            return False
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            update, enqueued_at = await queue.get()
+            wait = time.monotonic() - enqueued_at
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+            try:
+                await self.handler(update)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Yangilanishni qayta ishlashda xato: {e}")
+            finally:
+                self.processed += 1
+                queue.task_done()
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "shard_depths": [q.qsize() for q in self._queues],
+            "capacity": self.shard_size * self.workers,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "wait_avg_ms": round(self.wait_total / self.processed * 1000, 3) if self.processed else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }